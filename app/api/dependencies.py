@@ -1,9 +1,17 @@
-from app.models.database import SessionLocal
+import hmac
 
-def get_db():
-    db = SessionLocal()
-    try:
+from fastapi import Header, HTTPException
+
+from app.config.config import settings
+from app.models.database import AsyncSessionLocal
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
-        
+
+async def require_admin(x_admin_token: str = Header(None)):
+    """Libera a rota apenas com o cabeçalho X-Admin-Token correto."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Rotas administrativas desativadas (ADMIN_TOKEN não definido)")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Token administrativo inválido")
@@ -1,11 +1,26 @@
+import time
+
+_import_started = time.perf_counter()
+
 from app.config.config import settings
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
-import uvicorn
-from app.models.database import create_tables
-from app.api.routes import automations, sessions, channels, logs
+from app.models.database import dispose_engines, ensure_schema_async
+from app.api.routes import (
+    automations,
+    sessions,
+    channels,
+    logs,
+    metrics,
+    traces,
+    diagnostics,
+    exports,
+)
+from app.utils.log_stream import LogStreamHandler, log_stream
+from app.utils.tracing import tracer
+from app.utils.heap_tracker import heap_tracker
 
 import logging
 
@@ -13,14 +28,30 @@ logging.basicConfig(
     level=logging.INFO,  # Mostra INFO, WARNING e ERROR
     format="%(asctime)s [%(levelname)s] %(message)s",
 )
+# Espelha os logs da aplicação no stream de /ws/logs
+logging.getLogger().addHandler(LogStreamHandler(log_stream))
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    create_tables()
-    print("Startup complete. Database tables created.")
+    lifespan_started = time.perf_counter()
+    schema_changed = await ensure_schema_async()
+    schema_done = time.perf_counter()
+    if settings.HEAP_WATCH_INTERVAL_SECONDS:
+        heap_tracker.start_watch(
+            settings.HEAP_WATCH_INTERVAL_SECONDS, settings.HEAP_WATCH_THRESHOLD_MB
+        )
+    logging.info(
+        f"[STARTUP] imports {(_imports_done - _import_started) * 1000:.0f} ms, "
+        f"schema {(schema_done - lifespan_started) * 1000:.0f} ms"
+        f"{' (atualizado)' if schema_changed else ''}, "
+        f"pronto em {(time.perf_counter() - _import_started) * 1000:.0f} ms"
+    )
     yield
-    print("Shutdown complete.")
+    heap_tracker.stop_watch()
+    await dispose_engines()
+    tracer.shutdown()
+    logging.info("[SHUTDOWN] Encerramento concluído")
 
 
 app = FastAPI(
@@ -48,6 +79,16 @@ app.include_router(automations.router, prefix="/api", tags=["Automations"])
 app.include_router(sessions.router, prefix="/api", tags=["Sessions"])
 app.include_router(channels.router, prefix="/api", tags=["Channels"])
 app.include_router(logs.router, prefix="/api", tags=["Logs"])
+app.include_router(traces.router, prefix="/api", tags=["Traces"])
+app.include_router(diagnostics.router, prefix="/api", tags=["Diagnostics"])
+app.include_router(exports.router, prefix="/api", tags=["Export"])
+# Sem prefixo: caminho padrão esperado pelo Prometheus
+app.include_router(metrics.router, tags=["Metrics"])
+
+# Fim dos imports e da montagem do app (medido no log de [STARTUP])
+_imports_done = time.perf_counter()
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host=settings.HOST, port=settings.PORT)
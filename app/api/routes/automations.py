@@ -1,35 +1,107 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 import logging
+import re
 
 from app.schemas.automation import (
     Automation as AutomationSchema,
+    AutomationBulkRequest,
+    AutomationBulkResponse,
+    AutomationBulkResult,
     AutomationCreate,
+    AutomationPatch,
     AutomationUpdate,
+    RewritePreview,
+    RewriteRule as RewriteRuleSchema,
 )
-from app.models.database import AutomationModel, Chat, UserSession
+from app.models.database import AutomationModel, UserSession
 from app.api.dependencies import get_db
-from app.services.automation_handler import (
-    start_automation_client,
-    stop_automation_client,
-)
 from app.utils.data_base_utils.automation import (
     set_automation_status,
+    set_automations_status,
+    add_automation,
     create_automation,
-    get_automations,
+    list_automations_page,
+    AUTOMATION_LIST_FIELDS,
+    update_automation as update_automation_record,
+    patch_automation,
+    delete_automation as delete_automation_record,
+    delete_automations,
+    get_automation,
+    get_automations_by_ids,
+    set_rewrite_rules,
+)
+from app.utils.text_rewriter import check_regex_rule, compile_rules
+from app.utils.response_cache import (
+    CachedResponse,
+    response_cache,
+    serialize_json,
 )
 
 router = APIRouter()
 
+# Campos de agendamento repassados só quando vieram na requisição, para que
+# "post_at": null desligue o horário e a ausência do campo o mantenha
+_SCHEDULE_FIELDS = {"delivery_delay_seconds", "post_at"}
+
+
+async def _check_send_sessions(db: AsyncSession, session_ids: Optional[List[int]]):
+    """Valida que as sessões do pool de envio existem."""
+    if not session_ids:
+        return
+    result = await db.execute(
+        select(UserSession.id).where(UserSession.id.in_(session_ids))
+    )
+    missing = set(session_ids) - set(result.scalars().all())
+    if missing:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Sessões de envio não encontradas: {sorted(missing)}",
+        )
+
 
 """Lista todas as automações"""
 
 
 @router.get("/automations/", response_model=List[AutomationSchema])
-async def list_automations(db: Session = Depends(get_db)):
-    automations = get_automations(db)
-    return [AutomationSchema.from_orm(automation) for automation in automations]
+async def list_automations(
+    request: Request,
+    after_id: Optional[int] = Query(
+        None, description="Cursor: retorna automações com id maior que este"
+    ),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    fields: Optional[str] = Query(
+        None, description="Campos separados por vírgula (ex: id,name,is_active)"
+    ),
+    db: AsyncSession = Depends(get_db),
+):
+    field_list = None
+    if fields:
+        field_list = [f.strip() for f in fields.split(",") if f.strip()]
+        invalid = set(field_list) - set(AUTOMATION_LIST_FIELDS)
+        if invalid:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Campos inválidos: {', '.join(sorted(invalid))}",
+            )
+
+    async def build():
+        items = await list_automations_page(db, after_id, limit, field_list)
+        headers = {}
+        if limit and len(items) == limit:
+            # Próxima página: GET /automations/?after_id=<X-Next-Cursor>
+            headers["X-Next-Cursor"] = str(items[-1]["id"])
+        if field_list and "id" not in field_list:
+            for item in items:
+                del item["id"]
+        return CachedResponse(serialize_json(items), headers)
+
+    cache_key = (after_id, limit, tuple(field_list) if field_list else None)
+    entry = await response_cache.get_or_build("automations", cache_key, build)
+    return entry.to_response(request)
 
 
 """Cria uma nova automação"""
@@ -37,23 +109,27 @@ async def list_automations(db: Session = Depends(get_db)):
 
 @router.post("/automations/", response_model=AutomationSchema)
 async def create_automation_route(
-    automation: AutomationCreate, db: Session = Depends(get_db)
+    automation: AutomationCreate, db: AsyncSession = Depends(get_db)
 ):
-    db_session = (
-        db.query(UserSession).filter(UserSession.id == automation.session_id).first()
-    )
+    db_session = await db.get(UserSession, automation.session_id)
     if not db_session:
         raise HTTPException(status_code=404, detail="Sessão não encontrada")
+    await _check_send_sessions(db, automation.send_session_ids)
 
     # Criação completa usando o CRUD
-    db_automation = create_automation(
+    db_automation = await create_automation(
         db=db,
         name=automation.name,
         session_id=automation.session_id,
         caption=automation.caption,
         source_chats=automation.source_chats,
         destination_chats=automation.destination_chats,
+        send_session_ids=automation.send_session_ids,
+        delivery_delay_seconds=automation.delivery_delay_seconds,
+        post_at=automation.post_at,
+        dedup_content=automation.dedup_content,
     )
+    response_cache.invalidate("automations")
 
     return AutomationSchema.from_orm(db_automation)
 
@@ -62,12 +138,17 @@ async def create_automation_route(
 
 
 @router.put("/automations/{automation_id}/start")
-async def start_automation_route(automation_id: int, db: Session = Depends(get_db)):
-    automation = set_automation_status(db, automation_id, True)
+async def start_automation_route(
+    automation_id: int, db: AsyncSession = Depends(get_db)
+):
+    automation = await set_automation_status(db, automation_id, True)
     if not automation:
         raise HTTPException(status_code=404, detail="Automação não encontrada")
+    response_cache.invalidate("automations")
 
-    # Inicia o cliente de automação
+    # Inicia o cliente de automação (import tardio: Pyrogram só é carregado
+    # quando uma automação é de fato iniciada ou alterada)
+    from app.services.automation_handler import start_automation_client
 
     await start_automation_client(automation)
 
@@ -78,10 +159,13 @@ async def start_automation_route(automation_id: int, db: Session = Depends(get_d
 
 
 @router.put("/automations/{automation_id}/stop")
-async def stop_automation_route(automation_id: int, db: Session = Depends(get_db)):
-    automation = set_automation_status(db, automation_id, False)
+async def stop_automation_route(automation_id: int, db: AsyncSession = Depends(get_db)):
+    automation = await set_automation_status(db, automation_id, False)
     if not automation:
         raise HTTPException(status_code=404, detail="Automação não encontrada")
+    response_cache.invalidate("automations")
+
+    from app.services.automation_handler import stop_automation_client
 
     await stop_automation_client(automation)
 
@@ -92,45 +176,262 @@ async def stop_automation_route(automation_id: int, db: Session = Depends(get_db
 
 
 @router.delete("/automations/{automation_id}")
-async def delete_automation(automation_id: int, db: Session = Depends(get_db)):
-    automation = (
-        db.query(AutomationModel)
-        .options(
-            joinedload(AutomationModel.source_channels),
-            joinedload(AutomationModel.destination_channels),
-            joinedload(AutomationModel.session),
-        )
-        .filter(AutomationModel.id == automation_id)
-        .first()
-    )
-    if not automation:
+async def delete_automation(automation_id: int, db: AsyncSession = Depends(get_db)):
+    if not await delete_automation_record(db, automation_id):
         raise HTTPException(status_code=404, detail="Automação não encontrada")
-
-    db.delete(automation)
-    db.commit()
+    response_cache.invalidate("automations")
 
     return {"message": f"Automação {automation_id} removida com sucesso"}
 
 
+"""Inicia, para, remove ou cria várias automações de uma vez"""
+
+
+@router.post("/automations/bulk", response_model=AutomationBulkResponse)
+async def bulk_automations_route(
+    bulk: AutomationBulkRequest, db: AsyncSession = Depends(get_db)
+):
+    if bulk.action == "create":
+        results = await _bulk_create(db, bulk.automations)
+    else:
+        results = await _bulk_by_id(db, bulk.action, bulk.automation_ids)
+    response_cache.invalidate("automations")
+
+    succeeded = sum(1 for result in results if result.ok)
+    return AutomationBulkResponse(
+        action=bulk.action,
+        succeeded=succeeded,
+        failed=len(results) - succeeded,
+        results=results,
+    )
+
+
+async def _bulk_by_id(db: AsyncSession, action: str, automation_ids: List[int]):
+    """
+    Um SELECT e um commit para todas as automações; os clientes são
+    iniciados/parados agrupados por sessão, com paralelismo limitado.
+    """
+    from app.services.automation_handler import (
+        start_automation_clients,
+        stop_automation_clients,
+    )
+
+    errors = {}
+    if action == "delete":
+        automations = await get_automations_by_ids(db, automation_ids)
+        # As que estão rodando param antes de sair do banco; se o cliente não
+        # parar, a automação fica (o handler ainda estaria encaminhando)
+        running = [a for a in automations.values() if a.is_active]
+        if running:
+            errors = await stop_automation_clients(running)
+        await delete_automations(
+            db, [a for a in automations.values() if not errors.get(a.id)]
+        )
+    elif action == "stop":
+        automations = await set_automations_status(db, automation_ids, False)
+        errors = await stop_automation_clients(list(automations.values()))
+    else:
+        automations = await set_automations_status(db, automation_ids, True)
+        errors = await start_automation_clients(list(automations.values()))
+        failed = [automations[i] for i, error in errors.items() if error]
+        if failed:
+            # Não ficam marcadas como ativas: desfaz o estado parcial e o status
+            await stop_automation_clients(failed)
+            await set_automations_status(db, [a.id for a in failed], False)
+
+    return [
+        AutomationBulkResult(
+            index=index,
+            automation_id=automation_id,
+            ok=automation_id in automations and not errors.get(automation_id),
+            error=(
+                "Automação não encontrada"
+                if automation_id not in automations
+                else errors.get(automation_id)
+            ),
+        )
+        for index, automation_id in enumerate(automation_ids)
+    ]
+
+
+async def _bulk_create(db: AsyncSession, items: List[AutomationCreate]):
+    """
+    Cria as automações válidas em uma única transação (todas paradas). Cada
+    item tem seu savepoint: o que falhar é desfeito sozinho e reportado.
+    """
+    session_ids = {
+        sid for item in items for sid in [item.session_id, *item.send_session_ids]
+    }
+    result = await db.execute(
+        select(UserSession.id).where(UserSession.id.in_(session_ids))
+    )
+    existing = set(result.scalars().all())
+
+    results = []
+    for index, item in enumerate(items):
+        missing = sorted({item.session_id, *item.send_session_ids} - existing)
+        if missing:
+            results.append(
+                AutomationBulkResult(
+                    index=index,
+                    ok=False,
+                    error=f"Sessões não encontradas: {missing}",
+                )
+            )
+            continue
+        try:
+            async with db.begin_nested():
+                automation_id = await add_automation(db, **item.model_dump())
+        except SQLAlchemyError as e:
+            logging.error(f"[BULK] Falha ao criar a automação {index}: {e}")
+            results.append(
+                AutomationBulkResult(
+                    index=index, ok=False, error=str(getattr(e, "orig", None) or e)
+                )
+            )
+            continue
+        results.append(
+            AutomationBulkResult(index=index, automation_id=automation_id, ok=True)
+        )
+    await db.commit()
+    return results
+
+
 """Atualiza dados de uma autmação"""
 
 
 @router.put("/automations/{automation_id}", response_model=AutomationSchema)
 async def update_automation(
-    automation_id: int, automation_data: AutomationUpdate, db: Session = Depends(get_db)
+    automation_id: int,
+    automation_data: AutomationUpdate,
+    db: AsyncSession = Depends(get_db),
 ):
-    automation = (
-        db.query(AutomationModel).filter(AutomationModel.id == automation_id).first()
+    await _check_send_sessions(db, automation_data.send_session_ids)
+
+    # Atualiza apenas os campos fornecidos
+    automation = await update_automation_record(
+        db,
+        automation_id,
+        name=automation_data.name,
+        caption=automation_data.caption,
+        send_session_ids=automation_data.send_session_ids,
+        dedup_content=automation_data.dedup_content,
+        **automation_data.model_dump(include=_SCHEDULE_FIELDS, exclude_unset=True),
     )
     if not automation:
         raise HTTPException(status_code=404, detail="Automação não encontrada")
+    response_cache.invalidate("automations")
 
-    # Atualiza os campos fornecidos
-    if automation_data.name is not None:
-        automation.name = automation_data.name
-    if automation_data.caption is not None:
-        automation.caption = automation_data.caption
+    # Nova legenda, pool de envio e agendamento passam a valer na automação
+    # em execução
+    if automation.is_active:
+        from app.services.automation_handler import reconfigure_automation_client
+
+        await reconfigure_automation_client(automation)
 
-    db.commit()
-    db.refresh(automation)
     return AutomationSchema.from_orm(automation)
+
+
+"""Altera origens, destinos e legenda de uma automação (inclusive em execução)"""
+
+
+@router.patch("/automations/{automation_id}", response_model=AutomationSchema)
+async def patch_automation_route(
+    automation_id: int,
+    patch: AutomationPatch,
+    db: AsyncSession = Depends(get_db),
+):
+    automation = await patch_automation(
+        db,
+        automation_id,
+        add_source_chats=patch.add_source_chats,
+        remove_source_chats=patch.remove_source_chats,
+        add_destination_chats=patch.add_destination_chats,
+        remove_destination_chats=patch.remove_destination_chats,
+        name=patch.name,
+        caption=patch.caption,
+        dedup_content=patch.dedup_content,
+        **patch.model_dump(include=_SCHEDULE_FIELDS, exclude_unset=True),
+    )
+    if not automation:
+        raise HTTPException(status_code=404, detail="Automação não encontrada")
+    response_cache.invalidate("automations")
+
+    # Aplica no estado em memória sem reiniciar o cliente nem reenviar histórico
+    if automation.is_active:
+        from app.services.automation_handler import reconfigure_automation_client
+
+        await reconfigure_automation_client(automation)
+
+    return AutomationSchema.from_orm(automation)
+
+
+"""Lista as regras de reescrita de texto e legenda de uma automação"""
+
+
+@router.get(
+    "/automations/{automation_id}/rewrite-rules",
+    response_model=List[RewriteRuleSchema],
+)
+async def get_rewrite_rules_route(
+    automation_id: int, db: AsyncSession = Depends(get_db)
+):
+    automation = await get_automation(db, automation_id)
+    if not automation:
+        raise HTTPException(status_code=404, detail="Automação não encontrada")
+    return [RewriteRuleSchema.model_validate(rule) for rule in automation.rewrite_rules]
+
+
+"""Substitui as regras de reescrita (inclusive na automação em execução)"""
+
+
+@router.put(
+    "/automations/{automation_id}/rewrite-rules",
+    response_model=List[RewriteRuleSchema],
+)
+async def set_rewrite_rules_route(
+    automation_id: int,
+    rules: List[RewriteRuleSchema],
+    db: AsyncSession = Depends(get_db),
+):
+    for position, rule in enumerate(rules):
+        if rule.kind != "regex":
+            continue
+        try:
+            check_regex_rule(rule.pattern, rule.replacement)
+        except re.error as e:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Regra {position}: expressão regular inválida ({e})",
+            )
+    if not await db.get(AutomationModel, automation_id):
+        raise HTTPException(status_code=404, detail="Automação não encontrada")
+
+    automation = await set_rewrite_rules(
+        db, automation_id, [rule.model_dump() for rule in rules]
+    )
+
+    # Recompila as regras da automação em execução, sem reiniciar o cliente
+    if automation.is_active:
+        from app.services.automation_handler import reconfigure_automation_client
+
+        await reconfigure_automation_client(automation)
+
+    return rules
+
+
+"""Aplica as regras de reescrita salvas a um texto de exemplo"""
+
+
+@router.post("/automations/{automation_id}/rewrite-rules/preview")
+async def preview_rewrite_rules_route(
+    automation_id: int,
+    preview: RewritePreview,
+    db: AsyncSession = Depends(get_db),
+):
+    automation = await get_automation(db, automation_id)
+    if not automation:
+        raise HTTPException(status_code=404, detail="Automação não encontrada")
+    rewriter = compile_rules(automation.rewrite_rules)
+    text = rewriter.rewrite(preview.text)[0] if rewriter else preview.text
+    return {"text": text, "rules": rewriter.size if rewriter else 0}
@@ -1,8 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from pyrogram import Client
-from pyrogram.errors import FloodWait
 import os
 from datetime import datetime, timedelta
 import asyncio
@@ -11,6 +10,11 @@ from app.schemas.channel import ChannelInfo
 from math import ceil
 from app.api.dependencies import get_db
 from app.utils.logger import db_log
+from app.utils.response_cache import (
+    CachedResponse,
+    response_cache,
+    serialize_json,
+)
 from pydantic import BaseModel
 from app.config.config import settings
 
@@ -22,12 +26,21 @@ router = APIRouter()
 
 @router.get("/sessions/{session_id}/channels", response_model=List[ChannelInfo])
 async def get_user_channels(
+    request: Request,
     session_id: int,
     incremental: bool = False,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        session = db.query(UserSession).filter(UserSession.id == session_id).first()
+        cache_namespace = f"channels:{session_id}"
+        if not incremental:
+            # Resposta já serializada: polls repetidos não tocam no banco
+            entry = response_cache.get(cache_namespace, None)
+            if entry is not None:
+                return entry.to_response(request)
+        generation = response_cache.generation(cache_namespace)
+
+        session = await db.get(UserSession, session_id)
         if not session:
             raise HTTPException(
                 status_code=404, detail=f"Sessão {session_id} não encontrada"
@@ -40,16 +53,18 @@ async def get_user_channels(
             < timedelta(hours=CACHE_DURATION_HOURS)
             and not incremental
         ):
-            cached_channels = (
-                db.query(CachedChannel)
+            result = await db.execute(
+                select(CachedChannel)
                 .filter(CachedChannel.session_id == session_id)
                 .order_by(CachedChannel.title.asc())
-                .all()
             )
+            cached_channels = result.scalars().all()
             if cached_channels:
                 message = f"Retornando {len(cached_channels)} canais do cache para a sessão {session_id}."
-                db_log("INFO", message, f"channels:cache_hit:session_{session_id}")
-                return [
+                await db_log(
+                    "INFO", message, f"channels:cache_hit:session_{session_id}"
+                )
+                channels = [
                     ChannelInfo(
                         id=str(c.channel_id),
                         title=c.title,
@@ -60,9 +75,18 @@ async def get_user_channels(
                     )
                     for c in cached_channels
                 ]
+                # Válida até o cache de canais expirar
+                remaining = timedelta(hours=CACHE_DURATION_HOURS) - (
+                    datetime.utcnow() - session.channels_last_updated
+                )
+                entry = CachedResponse(
+                    serialize_json(channels), ttl=remaining.total_seconds()
+                )
+                response_cache.put(cache_namespace, None, entry, generation)
+                return entry.to_response(request)
 
         message = f"Buscando {'novos ' if incremental else ''}canais no Telegram para a sessão {session_id}"
-        db_log(
+        await db_log(
             "INFO",
             message,
             f"channels:{'incremental_' if incremental else ''}fetch:session_{session_id}",
@@ -73,12 +97,14 @@ async def get_user_channels(
 
 
 async def fetch_and_cache_channels(
-    session: UserSession, db: Session, incremental: bool = False
+    session: UserSession, db: AsyncSession, incremental: bool = False
 ) -> List[ChannelInfo]:
     """
-    Busca canais no Telegram e atualiza o cache de forma segura,
-    com commits parciais para evitar "database is locked".
+    Busca canais no Telegram e depois atualiza o cache em uma única
+    transação, sem manter a conexão de escrita aberta durante a rede.
     """
+    from pyrogram import Client
+    from pyrogram.errors import FloodWait
 
     session_file_path = (
         settings.SESSIONS_DIR
@@ -106,11 +132,17 @@ async def fetch_and_cache_channels(
         )
 
     if incremental:
-        cached = (
-            db.query(CachedChannel).filter(CachedChannel.session_id == session.id).all()
+        result = await db.execute(
+            select(CachedChannel.channel_id).filter(
+                CachedChannel.session_id == session.id
+            )
         )
-        existing_channels = {c.channel_id for c in cached}
+        existing_channels = set(result.scalars().all())
 
+    # Toda a I/O com o Telegram (diálogos e fotos) acontece antes de qualquer
+    # escrita: a conexão única de escrita do SQLite não fica presa esperando
+    # a rede enquanto db_log, o cache de mídia e o agendador aguardam
+    channel_rows = []
     try:
         async with Client(
             name=session_name,
@@ -118,17 +150,6 @@ async def fetch_and_cache_channels(
             api_hash=api_hash,
             workdir=str(settings.SESSIONS_DIR),
         ) as app:
-
-            # Limpa cache antigo apenas se não for incremental
-            if not incremental:
-                db.query(CachedChannel).filter(
-                    CachedChannel.session_id == session.id
-                ).delete()
-                db.commit()
-
-            BATCH_SIZE = 15  # commits parciais a cada N canais
-            batch_counter = 0
-
             async for dialog in app.get_dialogs():
                 chat = dialog.chat
                 if hasattr(chat, "type") and chat.type.value in [
@@ -167,28 +188,29 @@ async def fetch_and_cache_channels(
                             "members_count": getattr(chat, "members_count", None),
                             "photo_url": photo_url,
                         }
-
-                        cached_channel = CachedChannel(
-                            session_id=session.id, **channel_data
-                        )
-                        db.add(cached_channel)
+                        channel_rows.append(channel_data)
                         channels_list.append(
                             ChannelInfo(id=str(chat.id), **channel_data)
                         )
 
-                        batch_counter += 1
-                        if batch_counter >= BATCH_SIZE:
-                            db.flush()
-                            db.commit()
-                            batch_counter = 0
-
                     except Exception as chat_error:
                         print(f"Erro ao processar chat {chat.id}: {chat_error}")
 
-            # Commit final
-            session.channels_last_updated = datetime.utcnow()
-            db.add(session)
-            db.commit()
+        # Uma única transação curta: limpa o cache antigo (se não for
+        # incremental), grava os canais e marca a atualização
+        if not incremental:
+            await db.execute(
+                delete(CachedChannel).filter(CachedChannel.session_id == session.id)
+            )
+        if channel_rows:
+            await db.execute(
+                insert(CachedChannel),
+                [{"session_id": session.id, **row} for row in channel_rows],
+            )
+        session.channels_last_updated = datetime.utcnow()
+        db.add(session)
+        await db.commit()
+        response_cache.invalidate(f"channels:{session.id}")
 
     except FloodWait as e:
         await asyncio.sleep(e.value)
@@ -197,13 +219,13 @@ async def fetch_and_cache_channels(
             detail=f"Muitas requisições. Tente novamente em {e.value} segundos.",
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500, detail=f"Erro ao conectar ao Telegram: {e}"
         )
 
     channels_list.sort(key=lambda x: x.title.lower())
-    db_log(
+    await db_log(
         "INFO",
         f"Sucesso! {len(channels_list)} novos canais adicionados ao cache para a sessão {session.id}.",
         f"channels:fetch_incremental:session_{session.id}",
@@ -0,0 +1,107 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.api.dependencies import require_admin
+from app.utils.heap_tracker import heap_tracker, tasks_by_owner
+from app.utils.profiler import profile_lock, run_profile
+
+# Rotas de diagnóstico do processo em execução (somente administradores)
+router = APIRouter(prefix="/diagnostics", dependencies=[Depends(require_admin)])
+
+
+@router.post("/profile")
+async def profile_process(
+    seconds: float = Query(10, gt=0, le=120),
+    mode: str = Query("sampling", pattern="^(sampling|cprofile)$"),
+    interval_ms: float = Query(5, ge=1, le=100),
+    sort: str = Query("cumulative", pattern="^(cumulative|tottime|ncalls)$"),
+    limit: int = Query(50, ge=1, le=500),
+    format: str = Query("json", pattern="^(json|collapsed|pstats)$"),
+):
+    """
+    Perfila o processo por `seconds` segundos e retorna pstats (modo cprofile),
+    collapsed stacks para flamegraph (modo sampling) e o tempo por corrotina.
+    """
+    if format == "collapsed" and mode != "sampling":
+        raise HTTPException(status_code=400, detail="collapsed requer mode=sampling")
+    if format == "pstats" and mode != "cprofile":
+        raise HTTPException(status_code=400, detail="pstats requer mode=cprofile")
+    if profile_lock.locked():
+        raise HTTPException(status_code=409, detail="Já existe um perfil em execução")
+
+    async with profile_lock:
+        result = await run_profile(seconds, mode, interval_ms / 1000, sort, limit)
+
+    if format == "collapsed":
+        return PlainTextResponse(result["collapsed"])
+    if format == "pstats":
+        return PlainTextResponse(result["pstats"])
+    return result
+
+
+@router.post("/heap/snapshot")
+async def take_heap_snapshot(
+    frames: int = Query(
+        1, ge=1, le=100, description="Frames por alocação (group_by=traceback)"
+    ),
+):
+    """Liga o tracemalloc (se necessário) e grava o snapshot base."""
+    return await heap_tracker.take_baseline(frames)
+
+
+@router.get("/heap/diff")
+async def diff_heap(
+    top: int = Query(20, ge=1, le=200),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    reset: bool = Query(False, description="O snapshot atual vira a nova base"),
+):
+    """
+    Compara o heap com o snapshot base: maiores sítios de alocação, objetos
+    vivos por tipo, tasks pendentes por automação e o estado em memória do
+    handler de automações.
+    """
+    if heap_tracker.baseline is None:
+        raise HTTPException(
+            status_code=409, detail="Nenhum snapshot base; use POST /heap/snapshot"
+        )
+    report = await heap_tracker.diff(top, group_by, reset)
+    from app.services.automation_handler import runtime_state
+
+    report["tasks"] = tasks_by_owner()
+    report["runtime_state"] = runtime_state()
+    return report
+
+
+@router.get("/heap")
+async def heap_status():
+    from app.services.automation_handler import runtime_state
+
+    return {
+        **heap_tracker.status(),
+        "tasks": tasks_by_owner(),
+        "runtime_state": runtime_state(),
+    }
+
+
+@router.delete("/heap")
+async def stop_heap_tracking():
+    """Desliga o tracemalloc, o monitoramento e descarta a base."""
+    heap_tracker.stop()
+    return {"tracing": heap_tracker.tracing}
+
+
+@router.post("/heap/watch")
+async def start_heap_watch(
+    interval_seconds: float = Query(300, ge=5),
+    threshold_mb: float = Query(50, gt=0),
+    top: int = Query(10, ge=1, le=100),
+):
+    """Repete o diff periodicamente e registra um aviso acima do limite."""
+    heap_tracker.start_watch(interval_seconds, threshold_mb, top)
+    return heap_tracker.status()
+
+
+@router.delete("/heap/watch")
+async def stop_heap_watch():
+    heap_tracker.stop_watch()
+    return heap_tracker.status()
@@ -0,0 +1,83 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.api.dependencies import require_admin
+from app.config.config import settings
+from app.models.database import AsyncSessionLocal
+from app.utils.data_base_utils.export import (
+    DATASETS,
+    ImportConflictError,
+    MEDIA_TYPES,
+    dataset_columns,
+    decode,
+    encode,
+    import_records,
+    iter_batches,
+    iter_lines,
+)
+from app.utils.response_cache import response_cache
+
+# Exportação e importação em massa (auditoria e migração; somente administradores)
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+_FORMAT = Query("ndjson", pattern="^(ndjson|csv)$")
+
+
+def _check_dataset(dataset: str):
+    if dataset not in DATASETS:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Dataset desconhecido; use um de: {', '.join(DATASETS)}",
+        )
+
+
+@router.get("/export/{dataset}")
+async def export_dataset(dataset: str, format: str = _FORMAT):
+    """
+    Exporta media (cache de mídia), logs ou automations em NDJSON ou CSV.
+    A resposta é enviada em partes conforme as linhas são lidas do banco,
+    então a memória não cresce com o tamanho da tabela.
+    """
+    _check_dataset(dataset)
+
+    async def body():
+        # Sessão própria: a leitura continua enquanto a resposta é enviada
+        async with AsyncSessionLocal() as db:
+            batches = iter_batches(db, dataset, settings.EXPORT_BATCH_SIZE)
+            async for chunk in encode(batches, format, dataset_columns(dataset)):
+                yield chunk.encode()
+
+    return StreamingResponse(
+        body(),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{dataset}.{format}"'},
+    )
+
+
+@router.post("/import/{dataset}")
+async def import_dataset(request: Request, dataset: str, format: str = _FORMAT):
+    """
+    Importa um arquivo no formato da exportação, lido do corpo da requisição
+    em stream e gravado em lotes. Os ids exportados não são reaproveitados:
+    mídias já existentes (mesmo file_unique_id) são ignoradas, logs são
+    acrescentados e automações são criadas paradas, pulando as já
+    existentes (mesma sessão e nome) e as de sessões inexistentes.
+    """
+    _check_dataset(dataset)
+    records = decode(iter_lines(request.stream()), format)
+    async with AsyncSessionLocal() as db:
+        try:
+            counts = await import_records(
+                db, dataset, records, settings.IMPORT_BATCH_SIZE
+            )
+        except (ValueError, KeyError, TypeError) as e:
+            # Lotes anteriores já gravados continuam no banco
+            raise HTTPException(status_code=400, detail=f"Registro inválido: {e}")
+        except ImportConflictError as e:
+            raise HTTPException(
+                status_code=409, detail={"error": str(e), "imported": e.counts}
+            )
+        finally:
+            if dataset == "automations":
+                response_cache.invalidate("automations")
+    return counts
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+import asyncio
+from fastapi import APIRouter, Depends, Query, WebSocket, WebSocketDisconnect
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
 from app.models.database import Log
 from app.api.dependencies import get_db
+from app.utils.log_stream import log_stream
 
 router = APIRouter()
 
@@ -22,8 +25,8 @@ class LogEntry(BaseModel):
 
 
 @router.get("/logs", response_model=List[LogEntry])
-def get_logs(
-    db: Session = Depends(get_db),
+async def get_logs(
+    db: AsyncSession = Depends(get_db),
     limit: int = Query(100, ge=1, le=1000),
     level: Optional[str] = Query(
         None, description="Filtrar por nível (INFO, WARNING, ERROR)"
@@ -31,7 +34,7 @@ def get_logs(
     source: Optional[str] = Query(None, description="Filtrar pela origem do log"),
 ):
     """Busca os logs do sistema com filtros opcionais."""
-    query = db.query(Log)
+    query = select(Log)
 
     if level:
         query = query.filter(Log.level == level.upper())
@@ -39,5 +42,62 @@ def get_logs(
     if source:
         query = query.filter(Log.source.ilike(f"%{source}%"))
 
-    logs = query.order_by(Log.timestamp.desc()).limit(limit).all()
-    return logs
+    result = await db.execute(query.order_by(Log.timestamp.desc()).limit(limit))
+    return result.scalars().all()
+
+
+@router.websocket("/ws/logs")
+async def stream_logs(
+    websocket: WebSocket,
+    level: Optional[str] = None,
+    source: Optional[str] = None,
+    backlog: int = 100,
+):
+    """
+    Envia as entradas recentes do ring buffer e, em seguida, as novas entradas
+    conforme são produzidas. Filtros de nível e origem aplicados no servidor.
+    """
+    await websocket.accept()
+    # Assina antes de ler o buffer para não perder entradas no intervalo
+    subscriber = log_stream.subscribe(level, source)
+
+    async def watch_disconnect():
+        # Detecta a desconexão do cliente mesmo sem novas entradas
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                log_stream.unsubscribe(subscriber)
+                return
+
+    watcher = asyncio.create_task(watch_disconnect())
+    try:
+        last_seq = 0
+        for seq, payload in log_stream.recent(
+            level, source, max(0, min(backlog, 1000))
+        ):
+            await websocket.send_text(payload)
+            last_seq = seq
+
+        while True:
+            item = await subscriber.get()
+            if item is None:
+                if watcher.done():
+                    break  # Cliente desconectou
+                # Consumidor lento demais: encerrado pelo produtor
+                await websocket.close(code=1013, reason="Consumidor lento demais")
+                break
+            seq, payload = item
+            if seq <= last_seq:
+                continue
+            if subscriber.dropped:
+                await websocket.send_json(
+                    {"type": "dropped", "count": subscriber.dropped}
+                )
+                subscriber.dropped = 0
+            await websocket.send_text(payload)
+            last_seq = seq
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        watcher.cancel()
+        log_stream.unsubscribe(subscriber)
@@ -2,13 +2,12 @@ from fastapi import (
     APIRouter,
     Depends,
     HTTPException,
+    Request,
     WebSocket,
 )
 from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from pyrogram import Client
-from pyrogram.errors import SessionPasswordNeeded, PhoneCodeInvalid, PhoneNumberInvalid
 import os
 import json
 from datetime import datetime
@@ -18,6 +17,11 @@ from app.api.dependencies import get_db
 from app.config.config import settings
 from app.utils.data_base_utils.user_session import *
 from app.utils.file_helpers import remove_file
+from app.utils.response_cache import (
+    CachedResponse,
+    response_cache,
+    serialize_json,
+)
 
 router = APIRouter()
 
@@ -25,8 +29,25 @@ router = APIRouter()
 
 
 @router.get("/sessions/", response_model=List[SessionSchema])
-async def list_sessions(db: Session = Depends(get_db)):
-    return get_user_sessions(db)
+async def list_sessions(request: Request, db: AsyncSession = Depends(get_db)):
+    async def build():
+        sessions = await get_user_sessions(db)
+        return CachedResponse(
+            serialize_json([SessionSchema.model_validate(s) for s in sessions])
+        )
+
+    entry = await response_cache.get_or_build("sessions", None, build)
+    return entry.to_response(request)
+
+
+"""Estado do pool de clientes Telegram (acertos, faltas e despejos)."""
+
+
+@router.get("/sessions/pool")
+async def client_pool_status():
+    from app.services.automation_handler import telegram_service
+
+    return telegram_service.pool_status()
 
 
 """Faz o download de um arquivo de sessão."""
@@ -51,9 +72,9 @@ async def download_session(phone_number: str):
 
 
 @router.delete("/sessions/{session_id}")
-async def delete_session(session_id: int, db: Session = Depends(get_db)):
+async def delete_session(session_id: int, db: AsyncSession = Depends(get_db)):
 
-    session = db.query(UserSession).filter(UserSession.id == session_id).first()
+    session = await db.get(UserSession, session_id)
     session_file = settings.SESSIONS_DIR / session.session_file
 
     if not session:
@@ -63,15 +84,23 @@ async def delete_session(session_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Sessão não encontada no Diretorio")
 
     remove_file(str(session_file))
-    delete_user_session(db, session_id)
+    await delete_user_session(db, session_id)
+    response_cache.invalidate("sessions", f"channels:{session_id}", "automations")
     return {"detail": "Sessão removida com sucesso"}
 
 
 @router.websocket("/ws/generate_session")
 async def generate_session_ws(
     websocket: WebSocket,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
+    from pyrogram import Client
+    from pyrogram.errors import (
+        SessionPasswordNeeded,
+        PhoneCodeInvalid,
+        PhoneNumberInvalid,
+    )
+
     await websocket.accept()
     client = None
     try:
@@ -113,13 +142,14 @@ async def generate_session_ws(
                 # arquivo da sessão
                 session_filename = f"{phone_number}.session"
 
-                session_data = create_user_session(
+                session_data = await create_user_session(
                     session_file=session_filename,
                     phone_number=phone_number,
                     api_id=api_id,
                     api_hash=api_hash,
                     db=db,
                 )
+                response_cache.invalidate("sessions")
 
                 await websocket.send_text(
                     json.dumps(
@@ -149,13 +179,14 @@ async def generate_session_ws(
                 await client.check_password(password)
 
                 session_filename = f"{phone_number}.session"
-                session_data = create_user_session(
+                session_data = await create_user_session(
                     db=db,
                     session_file=session_filename,
                     phone_number=phone_number,
                     api_id=api_id,
                     api_hash=api_hash,
                 )
+                response_cache.invalidate("sessions")
 
                 await websocket.send_text(
                     json.dumps(
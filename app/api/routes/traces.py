@@ -0,0 +1,22 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+
+from app.api.dependencies import require_admin
+from app.utils.tracing import tracer
+
+# Traces trazem ids de chats e mensagens de erro (somente administradores)
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/traces/slowest")
+async def get_slowest_traces(
+    limit: int = Query(20, ge=1, le=500),
+    name: Optional[str] = Query(None, description="Filtra pelo span raiz"),
+):
+    """Traces mais lentos desde o início do processo, com o tempo de cada estágio."""
+    return {
+        "exported": tracer.exported,
+        "late_dropped": tracer.late_dropped,
+        "traces": tracer.slowest(limit, name),
+    }
@@ -0,0 +1,117 @@
+"""
+Exportação e importação de dados pela linha de comando (auditoria e migração).
+
+Usa o mesmo caminho das rotas /api/export e /api/import: leitura do banco
+com cursor em lotes e gravação em lotes, com memória constante.
+
+Uso:
+    python -m app.cli export media --format csv --output media.csv
+    python -m app.cli export automations > automations.ndjson
+    python -m app.cli import logs logs.ndjson
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+
+from app.config.config import settings
+from app.models.database import AsyncSessionLocal, dispose_engines, ensure_schema_async
+from app.utils.data_base_utils.export import (
+    DATASETS,
+    FORMATS,
+    ImportConflictError,
+    dataset_columns,
+    decode,
+    encode,
+    import_records,
+    iter_batches,
+    iter_lines,
+)
+
+_READ_CHUNK_SIZE = 1024 * 1024
+
+
+def _format_for(args) -> str:
+    if args.format:
+        return args.format
+    path = getattr(args, "file", None) or getattr(args, "output", None) or ""
+    return "csv" if path.endswith(".csv") else "ndjson"
+
+
+async def export_command(args):
+    fmt = _format_for(args)
+    out = (
+        open(args.output, "w", encoding="utf-8", newline="")
+        if args.output
+        else sys.stdout
+    )
+    try:
+        await ensure_schema_async()
+        async with AsyncSessionLocal() as db:
+            batches = iter_batches(db, args.dataset, args.batch_size)
+            async for chunk in encode(batches, fmt, dataset_columns(args.dataset)):
+                out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+async def import_command(args):
+    async def chunks():
+        with open(args.file, "rb") as f:
+            while chunk := f.read(_READ_CHUNK_SIZE):
+                yield chunk
+
+    await ensure_schema_async()
+    records = decode(iter_lines(chunks()), _format_for(args))
+    async with AsyncSessionLocal() as db:
+        try:
+            counts = await import_records(db, args.dataset, records, args.batch_size)
+        except ImportConflictError as e:
+            print(f"{e} (já importado: {json.dumps(e.counts)})", file=sys.stderr)
+            raise SystemExit(1)
+    print(json.dumps(counts), file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Exporta um dataset")
+    export_parser.add_argument("dataset", choices=DATASETS)
+    export_parser.add_argument(
+        "--output", "-o", help="Arquivo de saída (padrão: stdout)"
+    )
+    export_parser.add_argument(
+        "--batch-size", type=int, default=settings.EXPORT_BATCH_SIZE
+    )
+
+    import_parser = commands.add_parser("import", help="Importa um dataset")
+    import_parser.add_argument("dataset", choices=DATASETS)
+    import_parser.add_argument("file", help="Arquivo gerado pela exportação")
+    import_parser.add_argument(
+        "--batch-size", type=int, default=settings.IMPORT_BATCH_SIZE
+    )
+
+    for command_parser in (export_parser, import_parser):
+        command_parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="ndjson ou csv (padrão: pela extensão do arquivo, senão ndjson)",
+        )
+
+    args = parser.parse_args(argv)
+    command = export_command if args.command == "export" else import_command
+
+    async def run():
+        try:
+            await command(args)
+        finally:
+            await dispose_engines()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
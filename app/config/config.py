@@ -18,27 +18,164 @@ class Settings:
     DEBUG = os.getenv("DEBUG", "False").lower() == "true"
     HOST_AND_PORT = f"{HOST}:{PORT}"
 
+    # Token das rotas administrativas (/api/diagnostics, /api/traces, export e
+    # import); vazio = desativadas
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
     # Configurações do Telegram
     API_ID = os.getenv("API_ID")
     API_HASH = os.getenv("API_HASH")
     SESSION_EXTENSION_FILE = os.getenv("SESSION_EXTENSION_FILE", ".session")
 
+    # Pool de clientes Pyrogram: clientes ociosos continuam conectados pelo
+    # período de carência; acima dos limites, os menos usados são encerrados
+    CLIENT_IDLE_GRACE_SECONDS = int(os.getenv("CLIENT_IDLE_GRACE_SECONDS", 300))
+    CLIENT_POOL_MAX_CONNECTED = int(os.getenv("CLIENT_POOL_MAX_CONNECTED", 20))
+    CLIENT_POOL_MAX_RSS_MB = int(os.getenv("CLIENT_POOL_MAX_RSS_MB", 0))  # 0 = sem limite
+
+    # Supervisor: verifica clientes, handlers e tarefas de histórico a cada
+    # intervalo e reinicia o que falhou com backoff exponencial com jitter
+    SUPERVISOR_INTERVAL_SECONDS = float(os.getenv("SUPERVISOR_INTERVAL_SECONDS", 5))
+    SUPERVISOR_BACKOFF_BASE_SECONDS = float(
+        os.getenv("SUPERVISOR_BACKOFF_BASE_SECONDS", 1)
+    )
+    SUPERVISOR_BACKOFF_MAX_SECONDS = float(
+        os.getenv("SUPERVISOR_BACKOFF_MAX_SECONDS", 60)
+    )
+    # Falhas seguidas do histórico sem progresso antes de desistir
+    SUPERVISOR_HISTORY_MAX_RESTARTS = int(
+        os.getenv("SUPERVISOR_HISTORY_MAX_RESTARTS", 5)
+    )
+
+    # Fila em memória por automação entre o handler do Pyrogram e o envio.
+    # Cheia, aplica a política: spill (padrão; o excedente vai para disco e
+    # nada se perde), drop_oldest (descarta a mais antiga) ou block (o
+    # handler espera por espaço; não perde mensagens nem usa disco, mas
+    # trava o dispatcher do Pyrogram e atrasa as outras automações do
+    # mesmo cliente enquanto a fila estiver cheia)
+    INGEST_QUEUE_MAXSIZE = int(os.getenv("INGEST_QUEUE_MAXSIZE", 1000))
+    INGEST_QUEUE_OVERFLOW = os.getenv("INGEST_QUEUE_OVERFLOW", "spill").lower()
+
+    # Janela (segundos) em que entregas idênticas — mesma mensagem de origem,
+    # destino e legenda — de automações da mesma sessão viram um só envio;
+    # 0 = desligado
+    SEND_DEDUP_WINDOW_SECONDS = float(os.getenv("SEND_DEDUP_WINDOW_SECONDS", 600))
+    # Espera máxima pelo envio da outra automação; depois disso, envia também
+    SEND_DEDUP_WAIT_SECONDS = float(os.getenv("SEND_DEDUP_WAIT_SECONDS", 60))
+
+    # Deduplicação por conteúdo (automações com dedup_content): o mesmo
+    # arquivo ou texto vindo de outra origem não é publicado de novo no
+    # destino por pelo menos CONTENT_DEDUP_WINDOW_SECONDS. Cada destino tem
+    # um filtro de Bloom de tamanho fixo para CONTENT_DEDUP_CAPACITY itens
+    # por janela com a taxa de falsos positivos CONTENT_DEDUP_ERROR_RATE
+    # (~20 KB por destino nos valores padrão)
+    CONTENT_DEDUP_WINDOW_SECONDS = float(
+        os.getenv("CONTENT_DEDUP_WINDOW_SECONDS", 86400)
+    )
+    CONTENT_DEDUP_CAPACITY = int(os.getenv("CONTENT_DEDUP_CAPACITY", 5000))
+    CONTENT_DEDUP_ERROR_RATE = float(os.getenv("CONTENT_DEDUP_ERROR_RATE", 0.001))
+    CONTENT_DEDUP_MAX_DESTINATIONS = int(
+        os.getenv("CONTENT_DEDUP_MAX_DESTINATIONS", 1000)
+    )
+
+    # Pool de envio (automações com send_session_ids): orçamento por conta em
+    # envios/segundo com rajada, e espera máxima quando todas estão sem orçamento
+    SEND_POOL_RATE_PER_SECOND = float(os.getenv("SEND_POOL_RATE_PER_SECOND", 1))
+    SEND_POOL_BURST = float(os.getenv("SEND_POOL_BURST", 5))
+    SEND_POOL_MAX_WAIT_SECONDS = float(os.getenv("SEND_POOL_MAX_WAIT_SECONDS", 30))
+
+    # Mídia de origens com conteúdo protegido é baixada e enviada de novo;
+    # os arquivos ficam neste cache em disco (LRU por tamanho) e os file_ids
+    # dos uploads são reaproveitados (até MEDIA_RELAY_FILE_IDS por cliente)
+    MEDIA_RELAY_CACHE_MAX_MB = int(os.getenv("MEDIA_RELAY_CACHE_MAX_MB", 2048))
+    MEDIA_RELAY_FILE_IDS = int(os.getenv("MEDIA_RELAY_FILE_IDS", 1000))
+
+    # Entregas agendadas (delivery_delay_seconds / post_at das automações).
+    # post_at é interpretado neste fuso; em memória ficam só as próximas
+    # SCHEDULER_PRELOAD entregas (o resto espera no banco) e as vencidas são
+    # despachadas em lotes de SCHEDULER_BATCH_SIZE
+    SCHEDULE_TIMEZONE = os.getenv("SCHEDULE_TIMEZONE", "UTC")
+    SCHEDULER_PRELOAD = int(os.getenv("SCHEDULER_PRELOAD", 10000))
+    SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", 200))
+    SCHEDULER_FLUSH_INTERVAL_SECONDS = float(
+        os.getenv("SCHEDULER_FLUSH_INTERVAL_SECONDS", 0.5)
+    )
+    SCHEDULER_RETRY_SECONDS = float(os.getenv("SCHEDULER_RETRY_SECONDS", 30))
+
+    # Operações em massa (/api/automations/bulk): sessões iniciadas ou
+    # paradas ao mesmo tempo (as automações de uma sessão vão em sequência)
+    BULK_CLIENT_CONCURRENCY = int(os.getenv("BULK_CLIENT_CONCURRENCY", 8))
+
     # Diretórios
     BASE_DIR = Path(__file__).resolve().parent.parent
     DATABASE_DIR = BASE_DIR / "databases"
     SESSIONS_DIR = BASE_DIR / "sessions"
     PHOTO_GROUP_DIR = BASE_DIR / "static"
+    # Dados gerados em execução (traces, filas, caches) ficam fora do pacote
+    DATA_DIR = Path(os.getenv("DATA_DIR", BASE_DIR.parent / "data"))
+    TRACES_DIR = DATA_DIR / "traces"
+    QUEUE_SPILL_DIR = Path(os.getenv("QUEUE_SPILL_DIR", DATA_DIR / "queue_spill"))
+    MEDIA_RELAY_CACHE_DIR = Path(
+        os.getenv("MEDIA_RELAY_CACHE_DIR", DATA_DIR / "media_cache")
+    )
 
     # Cria os diretórios se não existirem
     DATABASE_DIR.mkdir(parents=True, exist_ok=True)
     SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
     PHOTO_GROUP_DIR.mkdir(parents=True, exist_ok=True)
+    TRACES_DIR.mkdir(parents=True, exist_ok=True)
+    QUEUE_SPILL_DIR.mkdir(parents=True, exist_ok=True)
+    MEDIA_RELAY_CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
     # Configurações do banco de dados
     DATABASE_URL = os.getenv(
         "DATABASE_URL", f"sqlite:///{DATABASE_DIR / 'telegram_automation.db'}"
     )
 
+    # Perfil de produção do SQLite (WAL, escritor único e pool de leitura)
+    SQLITE_PRODUCTION_PROFILE = (
+        os.getenv("SQLITE_PRODUCTION_PROFILE", "True").lower() == "true"
+    )
+    SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 268435456))  # 256 MB
+    SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", -64000))  # 64 MB
+    SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", 5))
+    SQLITE_WRITE_TIMEOUT = int(os.getenv("SQLITE_WRITE_TIMEOUT", 30))
+
+    # Cache de respostas das rotas de listagem (ETag/304)
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 256))
+
+    # Exportação (NDJSON/CSV) e importação em lotes: linhas por lote lido do
+    # cursor do banco e por INSERT (executemany) + commit na importação
+    EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+    IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+
+    # Stream de logs em tempo real (/ws/logs)
+    LOG_STREAM_BUFFER_SIZE = int(os.getenv("LOG_STREAM_BUFFER_SIZE", 1000))
+    LOG_STREAM_QUEUE_SIZE = int(os.getenv("LOG_STREAM_QUEUE_SIZE", 256))
+    # Assinante encerrado ao descartar LOG_STREAM_MAX_DROPPED entradas dentro
+    # de uma mesma janela de LOG_STREAM_DROP_WINDOW_SECONDS
+    LOG_STREAM_MAX_DROPPED = int(os.getenv("LOG_STREAM_MAX_DROPPED", 5000))
+    LOG_STREAM_DROP_WINDOW_SECONDS = float(
+        os.getenv("LOG_STREAM_DROP_WINDOW_SECONDS", 60)
+    )
+
+    # Monitoramento periódico do heap (tracemalloc); 0 = desligado
+    HEAP_WATCH_INTERVAL_SECONDS = int(os.getenv("HEAP_WATCH_INTERVAL_SECONDS", 0))
+    HEAP_WATCH_THRESHOLD_MB = float(os.getenv("HEAP_WATCH_THRESHOLD_MB", 50))
+
+    # Tracing por mensagem (spans exportados em JSON compatível com OTLP).
+    # Desligado por padrão; ligado, só a fração TRACE_SAMPLE_RATE das
+    # mensagens é rastreada (1.0 = todas)
+    TRACING_ENABLED = os.getenv("TRACING_ENABLED", "False").lower() == "true"
+    TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0.1))
+    TRACE_FILE = os.getenv("TRACE_FILE", str(TRACES_DIR / "spans.jsonl"))
+    TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", 10 * 1024 * 1024))
+    TRACE_FILE_BACKUP_COUNT = int(os.getenv("TRACE_FILE_BACKUP_COUNT", 5))
+    TRACE_SLOWEST_KEEP = int(os.getenv("TRACE_SLOWEST_KEEP", 50))
+
 
 # Instância de configuração
 settings = Settings()
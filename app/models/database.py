@@ -1,20 +1,40 @@
 from sqlalchemy import (
     create_engine,
+    event,
     Column,
+    Delete,
+    Insert,
+    Update,
     Integer,
     String,
     Boolean,
     ForeignKey,
     DateTime,
+    Time,
     Table,
     UniqueConstraint,
+    delete,
+    insert,
+    inspect,
+    select,
+    text,
+)
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
 )
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import Session, sessionmaker, relationship
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.schema import CreateColumn
 from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
 from app.config.config import settings
+from app.utils import metrics
+import logging
+import time
 
 load_dotenv()  # .env file is now at the backend root
 
@@ -40,6 +60,16 @@ automation_sources = Table(
     UniqueConstraint("automation_id", "chat_id", name="uix_automation_source_chat"),
 )
 
+# Tabela de associação: sessões extras que dividem os envios de uma automação
+automation_send_sessions = Table(
+    "automation_send_sessions",
+    Base.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("automation_id", Integer, ForeignKey("automations.id", ondelete="CASCADE")),
+    Column("session_id", Integer, ForeignKey("user_sessions.id", ondelete="CASCADE")),
+    UniqueConstraint("automation_id", "session_id", name="uix_automation_send_session"),
+)
+
 
 class UserSession(Base):
     __tablename__ = "user_sessions"
@@ -69,6 +99,13 @@ class AutomationModel(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     caption = Column(String, nullable=True)
+    # Entrega adiada: atraso fixo em segundos e/ou horário diário de
+    # publicação (SCHEDULE_TIMEZONE); nulos = envio imediato
+    delivery_delay_seconds = Column(Integer, nullable=True, default=0)
+    post_at = Column(Time, nullable=True)
+    # Não publica no destino o mesmo conteúdo (arquivo ou texto) já publicado
+    # recentemente, venha de qualquer origem
+    dedup_content = Column(Boolean, nullable=True, default=False)
     session_id = Column(Integer, ForeignKey("user_sessions.id", ondelete="CASCADE"))
     session = relationship("UserSession", back_populates="automations")
 
@@ -86,6 +123,18 @@ class AutomationModel(Base):
         back_populates="destination_automations",
     )
 
+    # Pool de envio: sessões (membros dos destinos) que dividem os envios
+    # com a sessão principal
+    send_sessions = relationship("UserSession", secondary=automation_send_sessions)
+
+    # Regras de reescrita do texto e da legenda, na ordem de prioridade
+    rewrite_rules = relationship(
+        "RewriteRule",
+        order_by="RewriteRule.position",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
 
 class Chat(Base):
     __tablename__ = "chats"
@@ -135,19 +184,191 @@ class CachedChannel(Base):
 
 BASE_DIR = Path(__file__).resolve().parent  # backend/
 
-print(settings.DATABASE_URL)
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+IS_SQLITE = settings.DATABASE_URL.startswith("sqlite")
+USE_SQLITE_PROFILE = IS_SQLITE and settings.SQLITE_PRODUCTION_PROFILE
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Aplica o perfil de produção do SQLite a cada nova conexão:
+    WAL permite leitores concorrentes com um escritor, e o busy_timeout
+    faz o SQLite aguardar o lock em vez de falhar com "database is locked".
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size={settings.SQLITE_CACHE_SIZE}")
+    cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start"].pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement else "OTHER"
+    metrics.db_query_duration.observe(time.perf_counter() - started, (operation,))
+
+
+def _discard_query_start(exception_context):
+    # Instrução com erro não dispara after_cursor_execute
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+def instrument_engine(sync_engine):
+    """Registra a latência de cada instrução em db_query_duration_seconds."""
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _discard_query_start)
+
+
+def get_async_database_url(url: str) -> str:
+    """Converte a URL síncrona para o driver assíncrono equivalente."""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1)
+    if url.startswith("postgres:"):
+        return url.replace("postgres:", "postgresql+asyncpg:", 1)
+    return url
+
+
+ASYNC_DATABASE_URL = get_async_database_url(settings.DATABASE_URL)
+
+# Engines criados no primeiro uso (e não no import), para o boot ser rápido.
+# Continuam acessíveis como atributos do módulo: engine, SessionLocal,
+# async_write_engine, async_read_engine e async_engine.
+_engines = {}
+
+
+def get_sync_engine():
+    """Engine síncrono (scripts, benchmarks e create_tables)."""
+    if "sync" not in _engines:
+        sync_engine = create_engine(settings.DATABASE_URL)
+        if USE_SQLITE_PROFILE:
+            event.listen(sync_engine, "connect", apply_sqlite_pragmas)
+        _engines["sync"] = sync_engine
+        _engines["session_local"] = sessionmaker(
+            autocommit=False, autoflush=False, bind=sync_engine
+        )
+    return _engines["sync"]
+
+
+def get_async_engines():
+    """
+    Retorna (escrita, leitura). Engine assíncrono usado pelas rotas e serviços
+    (não bloqueia o event loop).
+    """
+    if "async_write" not in _engines:
+        if USE_SQLITE_PROFILE:
+            # Uma única conexão de escrita: escritas são serializadas no pool
+            # em vez de disputarem o lock do arquivo
+            write_engine = create_async_engine(
+                ASYNC_DATABASE_URL,
+                poolclass=AsyncAdaptedQueuePool,
+                pool_size=1,
+                max_overflow=0,
+                pool_timeout=settings.SQLITE_WRITE_TIMEOUT,
+            )
+            # Pool de conexões de leitura, que em WAL não bloqueiam o escritor
+            read_engine = create_async_engine(
+                ASYNC_DATABASE_URL,
+                poolclass=AsyncAdaptedQueuePool,
+                pool_size=settings.SQLITE_READ_POOL_SIZE,
+                max_overflow=0,
+            )
+            for _engine in (write_engine, read_engine):
+                event.listen(_engine.sync_engine, "connect", apply_sqlite_pragmas)
+        else:
+            write_engine = read_engine = create_async_engine(ASYNC_DATABASE_URL)
+
+        for _engine in {write_engine, read_engine}:
+            instrument_engine(_engine.sync_engine)
+        _engines["async_read"] = read_engine
+        _engines["async_write"] = write_engine
+    return _engines["async_write"], _engines["async_read"]
+
+
+def __getattr__(name):
+    if name == "engine":
+        return get_sync_engine()
+    if name == "SessionLocal":
+        get_sync_engine()
+        return _engines["session_local"]
+    if name in ("async_write_engine", "async_engine"):
+        return get_async_engines()[0]
+    if name == "async_read_engine":
+        return get_async_engines()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class RoutingSession(Session):
+    """
+    Direciona escritas (flush, INSERT/UPDATE/DELETE) para o engine de escrita
+    e leituras para o pool de leitura. Depois da primeira escrita, o restante
+    da transação continua no escritor para enxergar os próprios dados.
+
+    No SQLite o escritor é uma única conexão, presa até o commit: nenhuma
+    sessão com escrita pendente pode ficar aberta durante I/O com o Telegram
+    (busque os dados primeiro e grave em uma transação curta depois).
+    """
+
+    _uses_writer = False
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        write_engine, read_engine = get_async_engines()
+        if (
+            self._uses_writer
+            or self._flushing
+            or isinstance(clause, (Insert, Update, Delete))
+        ):
+            self._uses_writer = True
+            return write_engine.sync_engine
+        return read_engine.sync_engine
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _reset_writer_routing(session, transaction):
+    if transaction.parent is None:
+        session._uses_writer = False
+
+
+AsyncSessionLocal = async_sessionmaker(
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
 
 
 def get_db():
-    db = SessionLocal()
+    db = __getattr__("SessionLocal")()
     try:
         yield db
     finally:
         db.close()
 
 
+async def dispose_engines():
+    """Fecha as conexões dos pools assíncronos (encerramento da aplicação)."""
+    write_engine = _engines.pop("async_write", None)
+    read_engine = _engines.pop("async_read", None)
+    if write_engine is not None:
+        await write_engine.dispose()
+    if read_engine is not None and read_engine is not write_engine:
+        await read_engine.dispose()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 class Log(Base):
     __tablename__ = "logs"
 
@@ -184,5 +405,107 @@ class CollectedMedia(Base):
     collected_at = Column(DateTime, default=datetime.utcnow)
 
 
+class RewriteRule(Base):
+    __tablename__ = "rewrite_rules"
+
+    id = Column(Integer, primary_key=True)
+    automation_id = Column(
+        Integer,
+        ForeignKey("automations.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    position = Column(Integer, nullable=False, default=0)
+    kind = Column(String(20), nullable=False)  # literal ou regex
+    pattern = Column(String, nullable=False)
+    replacement = Column(String, nullable=False, default="")  # Vazio remove
+    ignore_case = Column(Boolean, default=False)
+
+
+class ScheduledDelivery(Base):
+    """Mensagem aguardando o horário de envio de uma automação."""
+
+    __tablename__ = "scheduled_deliveries"
+
+    id = Column(Integer, primary_key=True)
+    automation_id = Column(
+        Integer, ForeignKey("automations.id", ondelete="CASCADE"), nullable=False
+    )
+    # A mensagem é buscada de novo (get_messages) na hora do envio
+    chat_id = Column(String(255), nullable=False)
+    message_id = Column(Integer, nullable=False)
+    due_at = Column(DateTime, nullable=False, index=True)  # UTC
+
+    __table_args__ = (
+        UniqueConstraint(
+            "automation_id", "chat_id", "message_id", name="uix_scheduled_delivery"
+        ),
+    )
+
+
+# Versão do schema declarado acima. Incremente ao adicionar tabelas ou colunas
+# para que o próximo boot aplique a mudança; com a versão em dia, o boot faz
+# apenas um SELECT em vez de inspecionar todas as tabelas (create_all).
+SCHEMA_VERSION = 5
+
+schema_version = Table(
+    "schema_version",
+    Base.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("version", Integer, nullable=False),
+)
+
+
 def create_tables():
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_sync_engine())
+
+
+async def create_tables_async():
+    async with get_async_engines()[0].begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+def _current_schema_version(conn):
+    if not inspect(conn).has_table(schema_version.name):
+        return None
+    return conn.execute(select(schema_version.c.version)).scalar()
+
+
+def _upgrade_schema(conn):
+    """Cria tabelas que faltam e adiciona colunas novas às existentes."""
+    Base.metadata.create_all(conn)
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = CreateColumn(column).compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN {ddl}'))
+            logging.info(f"[SCHEMA] Coluna {table.name}.{column.name} adicionada")
+    conn.execute(delete(schema_version))
+    conn.execute(insert(schema_version).values(id=1, version=SCHEMA_VERSION))
+
+
+def _ensure_schema(conn) -> bool:
+    current = _current_schema_version(conn)
+    if current == SCHEMA_VERSION:
+        return False
+    if current is not None and current > SCHEMA_VERSION:
+        logging.warning(
+            f"[SCHEMA] Banco na versão {current}, mais nova que a do código "
+            f"({SCHEMA_VERSION}); nenhuma alteração aplicada"
+        )
+        return False
+    _upgrade_schema(conn)
+    logging.info(f"[SCHEMA] Schema atualizado de {current} para {SCHEMA_VERSION}")
+    return True
+
+
+async def ensure_schema_async() -> bool:
+    """
+    Verifica a versão do schema no boot e só cria/altera tabelas quando ela
+    estiver desatualizada. Retorna True se o schema foi alterado.
+    """
+    async with get_async_engines()[0].begin() as conn:
+        return await conn.run_sync(_ensure_schema)
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import List
-from datetime import datetime
+from typing import List, Literal
+from datetime import datetime, time
 from typing import Optional
 
 
@@ -10,6 +10,13 @@ class AutomationBase(BaseModel):
     destination_chats: List[str]  # Múltiplos canais de Destino
     session_id: int
     caption: str | None = None
+    # Sessões extras (membros dos destinos) que dividem os envios
+    send_session_ids: List[int] = Field(default_factory=list)
+    # Entrega adiada: atraso em segundos e/ou horário diário de publicação
+    delivery_delay_seconds: int = Field(0, ge=0)
+    post_at: Optional[time] = None
+    # Ignora conteúdo já publicado recentemente no destino (outras origens)
+    dedup_content: bool = False
 
 
 class AutomationCreate(AutomationBase):
@@ -19,6 +26,24 @@ class AutomationCreate(AutomationBase):
 class AutomationUpdate(BaseModel):
     name: Optional[str] = None
     caption: Optional[str] = None
+    send_session_ids: Optional[List[int]] = None  # Substitui o pool de envio
+    delivery_delay_seconds: Optional[int] = Field(None, ge=0)
+    post_at: Optional[time] = None  # null explícito desliga o horário
+    dedup_content: Optional[bool] = None
+
+
+class AutomationPatch(BaseModel):
+    """Alteração parcial, aplicada também à automação em execução."""
+
+    name: Optional[str] = None
+    caption: Optional[str] = None
+    add_source_chats: List[str] = Field(default_factory=list)
+    remove_source_chats: List[str] = Field(default_factory=list)
+    add_destination_chats: List[str] = Field(default_factory=list)
+    remove_destination_chats: List[str] = Field(default_factory=list)
+    delivery_delay_seconds: Optional[int] = Field(None, ge=0)
+    post_at: Optional[time] = None  # null explícito desliga o horário
+    dedup_content: Optional[bool] = None
 
 
 class Automation(BaseModel):
@@ -31,6 +56,10 @@ class Automation(BaseModel):
     created_at: datetime
     updated_at: datetime
     caption: str | None = None
+    send_session_ids: List[int] = Field(default_factory=list)
+    delivery_delay_seconds: int = 0
+    post_at: Optional[time] = None
+    dedup_content: bool = False
 
     class Config:
         from_attributes = True
@@ -52,4 +81,51 @@ class Automation(BaseModel):
             created_at=obj.created_at,
             updated_at=obj.updated_at,
             caption=obj.caption,
+            send_session_ids=[
+                session.id for session in getattr(obj, "send_sessions", [])
+            ],
+            delivery_delay_seconds=obj.delivery_delay_seconds or 0,
+            post_at=obj.post_at,
+            dedup_content=bool(obj.dedup_content),
         )
+
+
+class AutomationBulkRequest(BaseModel):
+    """
+    Operação em massa: start, stop e delete usam automation_ids; create usa
+    automations (criadas paradas).
+    """
+
+    action: Literal["start", "stop", "delete", "create"]
+    automation_ids: List[int] = Field(default_factory=list, max_length=1000)
+    automations: List[AutomationCreate] = Field(default_factory=list, max_length=1000)
+
+
+class AutomationBulkResult(BaseModel):
+    index: int  # Posição do item na requisição
+    automation_id: Optional[int] = None
+    ok: bool
+    error: Optional[str] = None
+
+
+class AutomationBulkResponse(BaseModel):
+    action: str
+    succeeded: int
+    failed: int
+    results: List[AutomationBulkResult]
+
+
+class RewriteRule(BaseModel):
+    """Regra de reescrita de texto/legenda (vazio em replacement remove o trecho)."""
+
+    kind: Literal["literal", "regex"] = "literal"
+    pattern: str = Field(..., min_length=1)
+    replacement: str = ""
+    ignore_case: bool = False
+
+    class Config:
+        from_attributes = True
+
+
+class RewritePreview(BaseModel):
+    text: str
@@ -1,22 +1,404 @@
 import asyncio
 import logging
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
 from pyrogram.handlers import MessageHandler
 from pyrogram import filters
 from app.utils.telegram.verify_and_validate_mensage import (
     VerifyAndValidateMessage,
     process_and_forward_message,
 )
+from app.services.delivery_scheduler import DeliveryScheduler
+from app.services.ingest_queue import IngestQueue, run_worker
+from app.services.media_relay import relay_status
+from app.services.send_pool import PooledClient
+from app.services.supervisor import AutomationSupervisor
 from app.services.telegram_services import TelegramService
 from app.config.config import settings
+from app.utils import metrics
+from app.utils.telegram import content_dedup
+from app.utils.text_rewriter import compile_rules
 
 telegram_service = TelegramService()
 active_clients = telegram_service.active_clients
 automation_stop_flags = {}
 forwarding_tasks = {}
+automation_routes = {}
+history_progress = {}
+ingest_queues = {}
+queue_workers = {}
+send_clients = {}
+
+# Métricas lidas no momento do scrape (sem custo no caminho de envio)
+metrics.Gauge(
+    "telegram_automations_running",
+    "Automações com handler registrado",
+    function=lambda: {(): len(automation_routes)},
+)
+metrics.Gauge(
+    "telegram_history_tasks_pending",
+    "Tarefas de encaminhamento de histórico ainda em execução",
+    function=lambda: {(): sum(1 for t in forwarding_tasks.values() if not t.done())},
+)
+metrics.Gauge(
+    "telegram_client_pool_clients",
+    "Clientes no pool por estado",
+    ("state",),
+    function=lambda: {
+        ("connected",): len(active_clients),
+        ("idle",): sum(
+            1 for d in active_clients.values() if not telegram_service.in_use(d)
+        ),
+    },
+)
+metrics.Gauge(
+    "telegram_client_pool_events_total",
+    "Eventos do pool de clientes (hits, misses, evictions, idle_expired)",
+    ("event",),
+    function=lambda: {(k,): v for k, v in telegram_service.pool_stats.items()},
+    metric_type="counter",
+)
+metrics.Gauge(
+    "telegram_ingest_queue_depth",
+    "Mensagens aguardando envio na fila de entrada, por automação e local",
+    ("automation", "location"),
+    function=lambda: {
+        labels: value
+        for queue in ingest_queues.values()
+        for labels, value in (
+            ((queue.label, "memory"), queue.memory_depth),
+            ((queue.label, "disk"), queue.disk_depth),
+        )
+    },
+)
+metrics.Gauge(
+    "telegram_ingest_queue_oldest_age_seconds",
+    "Idade da mensagem mais antiga na fila de entrada, por automação",
+    ("automation",),
+    function=lambda: {
+        (queue.label,): queue.oldest_age() for queue in ingest_queues.values()
+    },
+)
+
+
+class AutomationRoute:
+    """
+    Estado de roteamento em memória de uma automação em execução.
+    O handler lê este objeto a cada mensagem, então alterações feitas por
+    apply() valem imediatamente, sem reconectar o cliente.
+    """
+
+    def __init__(
+        self,
+        automation_id,
+        source_ids,
+        destination_ids,
+        caption=None,
+        delay_seconds=0,
+        post_at=None,
+        session_name=None,
+        dedup_content=False,
+    ):
+        self.id = automation_id
+        self.session_name = session_name
+        # filters.chat é um set: pode ser alterado com o handler registrado
+        self.source_filter = filters.chat(list(source_ids))
+        self.destination_ids = tuple(destination_ids)
+        self.caption = caption
+        self.delay_seconds = delay_seconds or 0
+        self.post_at = post_at
+        self.dedup_content = bool(dedup_content)
+        self.rewriter = None  # Regras de reescrita compiladas (None = nenhuma)
+        self._rules_key = ()
+
+    def chat_ids(self):
+        return set(self.source_filter) | set(self.destination_ids)
+
+    def apply(
+        self,
+        source_ids,
+        destination_ids,
+        caption,
+        delay_seconds=0,
+        post_at=None,
+        dedup_content=False,
+    ):
+        """Troca origens, destinos e legenda de uma vez (sem await no meio)."""
+        source_ids = set(source_ids)
+        self.source_filter.difference_update(set(self.source_filter) - source_ids)
+        self.source_filter.update(source_ids)
+        self.destination_ids = tuple(destination_ids)
+        self.caption = caption
+        self.delay_seconds = delay_seconds or 0
+        self.post_at = post_at
+        self.dedup_content = bool(dedup_content)
+
+    def set_rewrite_rules(self, rules):
+        """Compila as regras de reescrita; só recompila se elas mudaram."""
+        key = tuple(
+            (rule.kind, rule.pattern, rule.replacement, bool(rule.ignore_case))
+            for rule in rules
+        )
+        if key != self._rules_key:
+            self.rewriter = compile_rules(rules)
+            self._rules_key = key
+
+    def due_at(self, now):
+        """
+        Horário de envio (epoch) de uma mensagem recebida agora, ou None para
+        envio imediato. post_at é o próximo horário diário, no fuso
+        SCHEDULE_TIMEZONE, a partir de agora + delay_seconds.
+        """
+        if not self.delay_seconds and self.post_at is None:
+            return None
+        due_at = now + self.delay_seconds
+        if self.post_at is not None:
+            earliest = datetime.fromtimestamp(
+                due_at, ZoneInfo(settings.SCHEDULE_TIMEZONE)
+            )
+            release = datetime.combine(
+                earliest.date(), self.post_at, tzinfo=earliest.tzinfo
+            )
+            if release < earliest:
+                release += timedelta(days=1)
+            due_at = release.timestamp()
+        return due_at
+
+
+class HistoryProgress:
+    """
+    Progresso do encaminhamento de histórico de uma automação, para que o
+    supervisor retome uma tarefa que morreu a partir da última mensagem
+    processada, em vez de reenviar tudo.
+    """
+
+    def __init__(self, automation, source_chat_ids):
+        self.automation = automation
+        self.pending = list(source_chat_ids)  # Canais ainda não concluídos
+        self.offset_id = 0  # Última mensagem processada do canal atual
+        self.processed = 0
+
+
+def _resume_history(automation_id):
+    """Recria a tarefa de histórico a partir do progresso salvo (supervisor)."""
+    progress = history_progress.get(automation_id)
+    if progress is None or automation_stop_flags.get(automation_id, True):
+        return None
+    session_name = progress.automation.session.session_file.replace(
+        settings.SESSION_EXTENSION_FILE, ""
+    )
+    client_data = active_clients.get(session_name)
+    if client_data is None:
+        return None
+    client = send_clients.get(automation_id, client_data["client"])
+
+    logging.info(
+        f"[FORWARD] Retomando histórico da automação {automation_id} "
+        f"({len(progress.pending)} canais pendentes, offset {progress.offset_id})"
+    )
+    task = asyncio.create_task(
+        forward_history(client, progress.automation, progress),
+        name=f"automation:{automation_id}:forward_history",
+    )
+    forwarding_tasks[automation_id] = task
+    return task
+
+
+def _history_processed(automation_id):
+    progress = history_progress.get(automation_id)
+    return progress.processed if progress else None
+
+
+def _spawn_worker(automation_id, queue, client, route):
+    """Cria a task que drena a fila da automação e envia cada mensagem."""
+
+    async def send_queued(client, message):
+        # Destinos, legenda e pool de envio lidos do estado atual
+        await process_and_forward_message(
+            send_clients.get(automation_id, client),
+            message,
+            list(route.destination_ids),
+            route,
+        )
+
+    task = asyncio.create_task(
+        run_worker(queue, client, send_queued),
+        name=f"automation:{automation_id}:worker",
+    )
+    queue_workers[automation_id] = task
+    return task
+
+
+def _resume_worker(automation_id):
+    """Recria o worker da fila de uma automação em execução (supervisor)."""
+    route = automation_routes.get(automation_id)
+    queue = ingest_queues.get(automation_id)
+    if route is None or queue is None or automation_stop_flags.get(automation_id):
+        return None
+    client_data = active_clients.get(route.session_name)
+    if client_data is None:
+        return None
+    logging.info(f"[QUEUE] Reiniciando o worker da automação {automation_id}")
+    return _spawn_worker(automation_id, queue, client_data["client"], route)
+
+
+supervisor = AutomationSupervisor(
+    telegram_service,
+    forwarding_tasks,
+    _resume_history,
+    _history_processed,
+    queue_workers,
+    _resume_worker,
+)
+
+# Lote máximo de ids por chamada de get_messages no Telegram
+GET_MESSAGES_LIMIT = 200
+
+
+async def _dispatch_scheduled(automation_id, chat_id, message_ids):
+    """
+    Coloca entregas agendadas que venceram na fila da automação, de onde
+    seguem o caminho normal de envio. False se a automação não está rodando.
+    """
+    route = automation_routes.get(automation_id)
+    queue = ingest_queues.get(automation_id)
+    if route is None or queue is None or automation_stop_flags.get(automation_id):
+        return False
+    client_data = active_clients.get(route.session_name)
+    if client_data is None:
+        return False
+
+    for start in range(0, len(message_ids), GET_MESSAGES_LIMIT):
+        messages = await client_data["client"].get_messages(
+            int(chat_id), message_ids[start : start + GET_MESSAGES_LIMIT]
+        )
+        for message in messages:
+            if message is None or getattr(message, "empty", False):
+                continue  # Apagada antes do horário de envio
+            await queue.put(message)
+    return True
+
+
+scheduler = DeliveryScheduler(_dispatch_scheduled, lambda: list(automation_routes))
+metrics.Gauge(
+    "telegram_scheduled_deliveries_in_memory",
+    "Entregas agendadas carregadas na heap do agendador",
+    function=lambda: {(): scheduler.status()["in_memory"]},
+)
+metrics.Gauge(
+    "telegram_content_dedup_bytes",
+    "Memória dos filtros de deduplicação por conteúdo (todos os destinos)",
+    function=lambda: {(): content_dedup.index_status()["bytes"]},
+)
+metrics.Gauge(
+    "telegram_media_relay_cache_bytes",
+    "Tamanho do cache em disco de mídia de origens protegidas",
+    function=lambda: {(): relay_status().get("cache_bytes", 0)},
+)
+
+
+def runtime_state():
+    """Tamanho do estado em memória mantido por este módulo (diagnóstico)."""
+    return {
+        "automation_stop_flags": len(automation_stop_flags),
+        "stopped_flags": sum(
+            1 for stopped in automation_stop_flags.values() if stopped
+        ),
+        "forwarding_tasks": len(forwarding_tasks),
+        "finished_forwarding_tasks": sum(
+            1 for task in forwarding_tasks.values() if task.done()
+        ),
+        "automation_routes": len(automation_routes),
+        "history_progress": len(history_progress),
+        "ingest_queues": {
+            automation_id: queue.status()
+            for automation_id, queue in ingest_queues.items()
+        },
+        "send_pools": {
+            automation_id: pooled.status()
+            for automation_id, pooled in send_clients.items()
+        },
+        "supervisor": supervisor.status(),
+        "scheduler": scheduler.status(),
+        "content_dedup": content_dedup.index_status(),
+        "media_relay": relay_status(),
+        "clients": {
+            session_name: {
+                "handlers": len(data["handlers"]),
+                "message_cache": len(
+                    getattr(getattr(data["client"], "message_cache", None), "store", ())
+                ),
+            }
+            for session_name, data in active_clients.items()
+        },
+    }
+
+
+def _session_name(session):
+    return session.session_file.replace(settings.SESSION_EXTENSION_FILE, "")
 
 
-async def start_automation_client(automation):
-    """Inicia o processo de automação: garante cliente ativo, adiciona handler e inicia."""
+async def _open_send_pool(
+    automation, session_name, client, destination_chat_ids, previous=None
+):
+    """
+    Conecta as contas extras de envio da automação e devolve o cliente que o
+    pipeline deve usar: o próprio cliente, sem contas extras, ou um
+    PooledClient que reparte os envios entre elas. Contas que já estavam em
+    `previous` só verificam os destinos que elas ainda não conhecem.
+    """
+    known = previous.joined if previous is not None else {}
+    members = {}
+    for session in getattr(automation, "send_sessions", None) or ():
+        name = _session_name(session)
+        if name == session_name or name in members:
+            continue
+        try:
+            member = await telegram_service.get_or_create_client(name)
+        except Exception as e:
+            logging.error(
+                f"[SEND_POOL] Automação {automation.id}: falha ao conectar a "
+                f"conta de envio {name}: {e}"
+            )
+            continue
+        active_clients[name]["send_pools"].add(automation.id)
+        # A conta extra precisa ter acesso aos destinos para enviar
+        missing = [c for c in destination_chat_ids if c not in known.get(name, ())]
+        if missing:
+            await telegram_service.verify_and_join_channels(member, missing)
+        members[name] = member
+
+    if not members:
+        return client
+    logging.info(
+        f"[SEND_POOL] Automação {automation.id}: envios repartidos entre "
+        f"{session_name} e {', '.join(members)}"
+    )
+    pooled = PooledClient(session_name, client, members)
+    for name in members:
+        pooled.joined[name].update(destination_chat_ids)
+    return pooled
+
+
+async def _close_send_pool(automation_id, pooled, keep=()):
+    """Tira a automação das contas extras e devolve as ociosas ao pool."""
+    if pooled is None:
+        return
+    for name, _ in pooled.senders[1:]:
+        client_data = active_clients.get(name)
+        if client_data is None or name in keep:
+            continue
+        client_data["send_pools"].discard(automation_id)
+        await telegram_service.release_client(name)
+
+
+async def start_automation_client(automation, verified_chats=None):
+    """
+    Inicia o processo de automação: garante cliente ativo, adiciona handler e inicia.
+    `verified_chats` (conjunto compartilhado entre automações da mesma
+    sessão) evita verificar de novo canais que a sessão já acessou.
+    """
     session_name = automation.session.session_file.replace(
         settings.SESSION_EXTENSION_FILE, ""
     )
@@ -33,70 +415,269 @@ async def start_automation_client(automation):
     source_chat_ids = [int(ch.chat_id) for ch in automation.source_channels]
     destination_chat_ids = [int(ch.chat_id) for ch in automation.destination_channels]
     all_chat_ids = list(set(source_chat_ids + destination_chat_ids))
-    await telegram_service.verify_and_join_channels(client, all_chat_ids)
+    if verified_chats is not None:
+        pending = [chat_id for chat_id in all_chat_ids if chat_id not in verified_chats]
+        verified_chats.update(pending)
+        all_chat_ids = pending
+    if all_chat_ids:
+        await telegram_service.verify_and_join_channels(client, all_chat_ids)
+
+    route = AutomationRoute(
+        automation_id,
+        source_chat_ids,
+        destination_chat_ids,
+        automation.caption,
+        delay_seconds=automation.delivery_delay_seconds,
+        post_at=automation.post_at,
+        session_name=session_name,
+        dedup_content=automation.dedup_content,
+    )
+    route.set_rewrite_rules(automation.rewrite_rules)
+    automation_routes[automation_id] = route
+
+    # Leitura fica com o cliente da sessão; envios podem usar o pool
+    sender = await _open_send_pool(
+        automation, session_name, client, destination_chat_ids
+    )
+    if sender is not client:
+        send_clients[automation_id] = sender
+
+    # O handler só enfileira; o envio fica com o worker da automação
+    queue = IngestQueue(automation_id)
+    ingest_queues[automation_id] = queue
 
     async def message_handler(client, message):
         if automation_stop_flags.get(automation_id, False):
             return
-        await process_and_forward_message(client, message, destination_chat_ids)
+        due_at = route.due_at(time.time())
+        if due_at is not None:
+            # Entrega adiada: volta para a fila quando vencer
+            scheduler.schedule(automation_id, message, due_at)
+            return
+        await queue.put(message)
 
-    handler = MessageHandler(message_handler, filters.chat(source_chat_ids))
-    group = client.add_handler(handler)
-    client_data["handlers"][automation_id] = {"handler": handler, "group": group}
+    _spawn_worker(automation_id, queue, client, route)
 
+    handler = MessageHandler(message_handler, route.source_filter)
+    _, group = client.add_handler(handler)
+    client_data["handlers"][automation_id] = {
+        "handler": handler,
+        "group": group,
+        "added_at": time.monotonic(),
+    }
+
+    # Retoma as entregas agendadas pendentes desta automação
+    scheduler.reload()
+
+    progress = HistoryProgress(automation, source_chat_ids)
+    history_progress[automation_id] = progress
     forwarding_tasks[automation_id] = asyncio.create_task(
-        forward_history(client, automation)
+        forward_history(sender, automation, progress),
+        name=f"automation:{automation_id}:forward_history",
     )
+    supervisor.ensure_running()
     logging.info(f"[START] Automação {automation_id} iniciada na sessão {session_name}")
 
 
 async def stop_automation_client(automation):
-    """Encerra a automação: cancela tasks, remove handlers e para o cliente se necessário."""
+    """Encerra a automação: cancela tasks, remove handlers e libera o cliente para o pool."""
     automation_id = automation.id
     session_name = automation.session.session_file.replace(
         settings.SESSION_EXTENSION_FILE, ""
     )
     client_data = active_clients.get(session_name)
+    await _close_send_pool(automation_id, send_clients.pop(automation_id, None))
     if not client_data:
         return
 
     client = client_data["client"]
     automation_stop_flags[automation_id] = True
+    automation_routes.pop(automation_id, None)
+    history_progress.pop(automation_id, None)
+    supervisor.forget(automation_id)
 
-    task = forwarding_tasks.pop(automation_id, None)
-    if task:
-        task.cancel()
-        try:
-            await asyncio.wait_for(task, timeout=5)
-        except Exception:
-            pass
+    for tasks in (forwarding_tasks, queue_workers):
+        task = tasks.pop(automation_id, None)
+        if task:
+            task.cancel()
+            try:
+                await asyncio.wait_for(task, timeout=5)
+            except (asyncio.CancelledError, Exception):
+                pass  # CancelledError da própria task cancelada
+
+    queue = ingest_queues.pop(automation_id, None)
+    if queue:
+        discarded = await queue.close()
+        if discarded:
+            logging.warning(
+                f"[STOP] Automação {automation_id}: {discarded} mensagens da "
+                f"fila descartadas"
+            )
 
     handler_info = client_data["handlers"].pop(automation_id, None)
     if handler_info:
+        # remove_handler do Pyrogram é síncrono (agenda a remoção no dispatcher)
         remove_handler = getattr(client, "remove_handler", None)
         if callable(remove_handler):
-            await remove_handler(handler_info["handler"], handler_info["group"])
+            remove_handler(handler_info["handler"], handler_info["group"])
+
+    # Mantém o cliente conectado pelo período de carência do pool
+    await telegram_service.release_client(session_name)
+
+
+async def _run_by_session(automations, action):
+    """
+    Executa `action(automation, verified_chats)` em todas as automações:
+    as da mesma sessão em sequência (o cliente é criado uma vez e os canais
+    já verificados não são verificados de novo) e sessões diferentes em
+    paralelo, até BULK_CLIENT_CONCURRENCY ao mesmo tempo.
+    Retorna {automation_id: erro ou None}.
+    """
+    by_session = {}
+    for automation in automations:
+        by_session.setdefault(_session_name(automation.session), []).append(automation)
+
+    semaphore = asyncio.Semaphore(max(1, settings.BULK_CLIENT_CONCURRENCY))
+    errors = {}
 
-    if not client_data["handlers"] and getattr(client, "is_connected", False):
-        await client.stop()
-        active_clients.pop(session_name, None)
+    async def run_session(session_name, group):
+        verified_chats = set()
+        async with semaphore:
+            for automation in group:
+                try:
+                    await action(automation, verified_chats)
+                    errors[automation.id] = None
+                except Exception as e:
+                    logging.error(
+                        f"[BULK] Automação {automation.id} (sessão "
+                        f"{session_name}): {e}"
+                    )
+                    errors[automation.id] = str(e) or type(e).__name__
 
+    await asyncio.gather(
+        *(run_session(name, group) for name, group in by_session.items())
+    )
+    return errors
+
+
+async def start_automation_clients(automations):
+    """Inicia várias automações com paralelismo limitado entre sessões."""
+    return await _run_by_session(automations, start_automation_client)
+
+
+async def stop_automation_clients(automations):
+    """Para várias automações com paralelismo limitado entre sessões."""
+    return await _run_by_session(
+        automations, lambda automation, _: stop_automation_client(automation)
+    )
+
+
+async def reconfigure_automation_client(automation) -> bool:
+    """
+    Aplica origens, destinos e legenda atuais a uma automação em execução,
+    sem reconectar o cliente, sem interromper o encaminhamento ao vivo e sem
+    reenviar o histórico. Retorna False se a automação não estiver rodando.
+    """
+    route = automation_routes.get(automation.id)
+    if route is None:
+        return False
+
+    session_name = automation.session.session_file.replace(
+        settings.SESSION_EXTENSION_FILE, ""
+    )
+    client_data = active_clients.get(session_name)
+    if not client_data:
+        return False
+
+    source_chat_ids = [int(ch.chat_id) for ch in automation.source_channels]
+    destination_chat_ids = [int(ch.chat_id) for ch in automation.destination_channels]
+
+    # Entra nos canais novos antes de passar a usá-los
+    new_chat_ids = set(source_chat_ids + destination_chat_ids) - route.chat_ids()
+    if new_chat_ids:
+        await telegram_service.verify_and_join_channels(
+            client_data["client"], list(new_chat_ids)
+        )
+
+    route.apply(
+        source_chat_ids,
+        destination_chat_ids,
+        automation.caption,
+        automation.delivery_delay_seconds,
+        automation.post_at,
+        automation.dedup_content,
+    )
+    route.set_rewrite_rules(automation.rewrite_rules)
 
-async def forward_history(client, automation):
+    # Pool de envio: conecta as contas novas antes de soltar as removidas.
+    # A fila passa a usar o novo pool na próxima mensagem; o histórico em
+    # andamento segue com o pool com que começou.
+    previous = send_clients.get(automation.id)
+    sender = await _open_send_pool(
+        automation,
+        session_name,
+        client_data["client"],
+        destination_chat_ids,
+        previous,
+    )
+    if sender is client_data["client"]:
+        send_clients.pop(automation.id, None)
+    else:
+        send_clients[automation.id] = sender
+    kept = {name for name, _ in getattr(sender, "senders", ())}
+    await _close_send_pool(automation.id, previous, keep=kept)
+
+    logging.info(
+        f"[RECONFIG] Automação {automation.id}: {len(source_chat_ids)} origens, "
+        f"{len(destination_chat_ids)} destinos"
+    )
+    return True
+
+
+async def forward_history(client, automation, progress=None):
+    if progress is None:
+        progress = HistoryProgress(
+            automation, [ch.chat_id for ch in automation.source_channels]
+        )
     verifier = VerifyAndValidateMessage(client, telegram_service)
     await asyncio.sleep(2)
 
-    for source_channel in automation.source_channels:
+    while progress.pending:
+        source_chat_id = progress.pending[0]
         try:
-            async for message in client.get_chat_history(source_channel.chat_id):
-                if await verifier.should_skip_message(message, automation):
-                    continue
-                destination_ids = [ch.chat_id for ch in automation.destination_channels]
-                await verifier.process_forward_message_safe(
-                    message, destination_ids, automation
-                )
-                await asyncio.sleep(1)
+            async for message in client.get_chat_history(
+                source_chat_id, offset_id=progress.offset_id
+            ):
+                if not await verifier.should_skip_message(message, automation):
+                    route = automation_routes.get(automation.id)
+                    due_at = route.due_at(time.time()) if route is not None else None
+                    if due_at is not None:
+                        # Backlog com atraso ou horário de publicação: agenda
+                        scheduler.schedule(automation.id, message, due_at)
+                    else:
+                        if route is not None:
+                            # Usa a configuração atual, caso tenha sido alterada
+                            destination_ids = list(route.destination_ids)
+                            caption_source = route
+                        else:
+                            destination_ids = [
+                                ch.chat_id for ch in automation.destination_channels
+                            ]
+                            caption_source = automation
+                        await verifier.process_forward_message_safe(
+                            message, destination_ids, caption_source
+                        )
+                        await asyncio.sleep(1)
+                progress.offset_id = message.id
+                progress.processed += 1
         except Exception as e:
+            # A tarefa morre e o supervisor a retoma deste ponto com backoff
             logging.error(
-                f"[FORWARD] Erro ao buscar histórico do canal {source_channel.chat_id}: {e}"
+                f"[FORWARD] Erro ao buscar histórico do canal {source_chat_id}: {e}"
             )
+            raise
+        progress.pending.pop(0)
+        progress.offset_id = 0
+
+    if history_progress.get(automation.id) is progress:
+        del history_progress[automation.id]
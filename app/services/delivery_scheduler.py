@@ -0,0 +1,315 @@
+import asyncio
+import heapq
+import logging
+import math
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.config.config import settings
+from app.models.database import AsyncSessionLocal
+from app.utils import metrics
+from app.utils.data_base_utils.scheduled_delivery import (
+    add_scheduled_deliveries,
+    delete_scheduled_deliveries,
+    get_next_deliveries,
+)
+
+# (vence_em, automation_id, chat_id, message_id); vence_em em epoch (UTC)
+Entry = Tuple[float, int, str, int]
+
+
+def to_datetime(timestamp: float) -> datetime:
+    """Epoch para datetime UTC sem fuso (padrão das colunas do banco)."""
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+def to_timestamp(value: datetime) -> float:
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+class DeliveryScheduler:
+    """
+    Agenda de entregas adiadas de todas as automações: uma única task
+    dorme até a próxima entrega vencer, em vez de uma task por mensagem.
+
+    O banco (scheduled_deliveries) guarda a agenda inteira, então um
+    restart não perde nada. Em memória fica só uma heap com as próximas
+    SCHEDULER_PRELOAD entregas: tudo que vence até `_horizon` está na heap,
+    e quando ela esvazia a próxima janela é lida do banco. Entregas novas
+    são gravadas em lote a cada SCHEDULER_FLUSH_INTERVAL_SECONDS.
+
+    As vencidas saem em lotes agrupados por automação e chat de origem e
+    vão para dispatch(automation_id, chat_id, message_ids), que as coloca na
+    fila da automação. Se dispatch retornar False (automação parada ou sem
+    cliente), as entregas ficam no banco e a automação é ignorada até
+    reload() ou por SCHEDULER_RETRY_SECONDS, o que vier antes.
+    """
+
+    def __init__(
+        self,
+        dispatch: Callable[[int, str, List[int]], Awaitable[bool]],
+        running_ids: Callable[[], Iterable[int]],
+    ):
+        self.dispatch = dispatch
+        self.running_ids = running_ids
+        self._heap: List[Entry] = []
+        self._horizon: Optional[float] = None  # None = recarregar do banco
+        self._buffer: List[Entry] = []  # Ainda não gravadas
+        self._buffer_since = 0.0
+        # Automações cujo dispatch recusou: id -> quando tentar de novo (epoch)
+        self._paused: Dict[int, float] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="delivery-scheduler")
+
+    def schedule(self, automation_id: int, message, due_at: float):
+        entry = (due_at, automation_id, str(message.chat.id), message.id)
+        if not self._buffer:
+            self._buffer_since = time.monotonic()
+            self._wakeup.set()  # Conta o intervalo de gravação a partir daqui
+        self._buffer.append(entry)
+        metrics.scheduled_deliveries.inc(("scheduled",))
+        if (
+            self._horizon is not None
+            and due_at <= self._horizon
+            and automation_id not in self._paused
+        ):
+            self._push(entry)
+            if self._heap[0] is entry:
+                self._wakeup.set()
+        self.ensure_running()
+
+    def reload(self):
+        """Relê a agenda do banco (automação iniciada: retoma as pendentes dela)."""
+        self._paused.clear()
+        self._horizon = None
+        self._wakeup.set()
+        self.ensure_running()
+
+    # =========================
+    # LAÇO
+    # =========================
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                await self._flush()
+                if self._resume_paused():
+                    self._horizon = None
+                if self._horizon is None or (
+                    not self._heap and self._horizon != math.inf
+                ):
+                    await self._load()
+                await self._dispatch_due()
+            except Exception as e:
+                logging.error(f"[SCHEDULER] Erro no agendador: {e}")
+                await asyncio.sleep(settings.SCHEDULER_RETRY_SECONDS)
+                continue
+
+            timeout = self._next_timeout()
+            if timeout is None:
+                break  # Nada em memória nem no banco para as automações ativas
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        logging.info("[SCHEDULER] Nenhuma entrega pendente; encerrando")
+
+    def _next_timeout(self) -> Optional[float]:
+        timeouts = []
+        if self._heap:
+            timeouts.append(self._heap[0][0] - time.time())
+        if self._buffer:
+            timeouts.append(
+                self._buffer_since
+                + settings.SCHEDULER_FLUSH_INTERVAL_SECONDS
+                - time.monotonic()
+            )
+        if self._paused:
+            timeouts.append(min(self._paused.values()) - time.time())
+        if not timeouts:
+            return None if self._horizon == math.inf else 0
+        return max(0.0, min(timeouts))
+
+    def _resume_paused(self) -> bool:
+        """Libera as automações pausadas cujo tempo de espera acabou."""
+        now = time.time()
+        expired = [i for i, retry_at in self._paused.items() if retry_at <= now]
+        for automation_id in expired:
+            del self._paused[automation_id]
+        return bool(expired)
+
+    def _push(self, entry: Entry):
+        heapq.heappush(self._heap, entry)
+        if len(self._heap) > 2 * settings.SCHEDULER_PRELOAD:
+            # Mantém só as mais próximas; as demais continuam no banco
+            self._heap = heapq.nsmallest(settings.SCHEDULER_PRELOAD, self._heap)
+            self._horizon = self._heap[-1][0]
+
+    # =========================
+    # BANCO
+    # =========================
+    async def _flush(self):
+        if not self._buffer:
+            return
+        if (
+            time.monotonic() - self._buffer_since
+            < settings.SCHEDULER_FLUSH_INTERVAL_SECONDS
+        ):
+            return
+        rows, self._buffer = self._buffer, []
+        try:
+            async with AsyncSessionLocal() as db:
+                await add_scheduled_deliveries(
+                    db,
+                    [
+                        {
+                            "automation_id": automation_id,
+                            "chat_id": chat_id,
+                            "message_id": message_id,
+                            "due_at": to_datetime(due_at),
+                        }
+                        for due_at, automation_id, chat_id, message_id in rows
+                    ],
+                )
+        except Exception:
+            self._buffer = rows + self._buffer  # Tenta de novo na próxima volta
+            raise
+
+    async def _load(self):
+        limit = settings.SCHEDULER_PRELOAD
+        async with AsyncSessionLocal() as db:
+            rows = await get_next_deliveries(
+                db,
+                [i for i in self.running_ids() if i not in self._paused],
+                limit,
+            )
+        # Ordenada por vencimento: a lista já é uma heap válida
+        heap = [
+            (to_timestamp(due_at), automation_id, chat_id, message_id)
+            for due_at, automation_id, chat_id, message_id in rows
+        ]
+        horizon = heap[-1][0] if len(heap) >= limit else math.inf
+        # Agendadas durante a leitura ainda não estão no banco
+        for entry in self._buffer:
+            if entry[0] <= horizon and entry[1] not in self._paused:
+                heapq.heappush(heap, entry)
+        self._heap = heap
+        self._horizon = horizon
+
+    # =========================
+    # DESPACHO
+    # =========================
+    async def _dispatch_due(self):
+        now = time.time()
+        groups: Dict[Tuple[int, str], List[Tuple[float, int]]] = defaultdict(list)
+        taken = 0
+        while (
+            self._heap
+            and self._heap[0][0] <= now
+            and taken < settings.SCHEDULER_BATCH_SIZE
+        ):
+            due_at, automation_id, chat_id, message_id = heapq.heappop(self._heap)
+            if automation_id in self._paused:
+                continue  # Continua no banco (ou no buffer) até retomar
+            groups[(automation_id, chat_id)].append((due_at, message_id))
+            taken += 1
+
+        for (automation_id, chat_id), items in groups.items():
+            message_ids = [message_id for _, message_id in items]
+            # Sai do banco antes de ir para a fila: se a remoção falhar, nada
+            # é despachado (e nada é reenviado depois por um reload)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await delete_scheduled_deliveries(
+                        db, automation_id, chat_id, message_ids
+                    )
+            except Exception as e:
+                self._retry_later(automation_id, chat_id, items)
+                logging.error(
+                    f"[SCHEDULER] Automação {automation_id}: falha ao remover "
+                    f"{len(items)} entregas de {chat_id} antes do despacho: {e}"
+                )
+                continue
+            # Ainda não gravadas: saem do buffer para não serem gravadas (e
+            # reenviadas) depois do despacho
+            taken_keys = {(automation_id, chat_id, m) for m in message_ids}
+            if self._buffer:
+                self._buffer = [
+                    entry for entry in self._buffer if entry[1:] not in taken_keys
+                ]
+
+            try:
+                delivered = await self.dispatch(automation_id, chat_id, message_ids)
+            except Exception as e:
+                # Volta para o buffer (e para o banco no próximo flush)
+                self._save_again(
+                    [
+                        (
+                            time.time() + settings.SCHEDULER_RETRY_SECONDS,
+                            automation_id,
+                            chat_id,
+                            message_id,
+                        )
+                        for _, message_id in items
+                    ],
+                    push=True,
+                )
+                metrics.scheduled_deliveries.inc(("retry",), len(items))
+                logging.error(
+                    f"[SCHEDULER] Automação {automation_id}: falha ao despachar "
+                    f"{len(items)} entregas de {chat_id}: {e}"
+                )
+                continue
+            if not delivered:
+                # Automação parada: as entregas voltam para o banco até ela
+                # voltar, sem recarregá-las a cada volta do laço
+                self._save_again(
+                    [
+                        (due_at, automation_id, chat_id, message_id)
+                        for due_at, message_id in items
+                    ],
+                    push=False,
+                )
+                self._paused[automation_id] = (
+                    time.time() + settings.SCHEDULER_RETRY_SECONDS
+                )
+                metrics.scheduled_deliveries.inc(("paused",), len(items))
+                continue
+            for due_at, _ in items:
+                metrics.scheduled_dispatch_delay.observe(max(0.0, now - due_at))
+            metrics.scheduled_deliveries.inc(("dispatched",), len(items))
+
+    def _retry_later(self, automation_id, chat_id, items):
+        """Entregas que continuam no banco: tenta de novo depois do intervalo."""
+        retry_at = time.time() + settings.SCHEDULER_RETRY_SECONDS
+        for _, message_id in items:
+            self._push((retry_at, automation_id, chat_id, message_id))
+        metrics.scheduled_deliveries.inc(("retry",), len(items))
+
+    def _save_again(self, entries: List[Entry], push: bool):
+        """Devolve ao buffer entregas já removidas do banco e não despachadas."""
+        if not self._buffer:
+            self._buffer_since = time.monotonic()
+        self._buffer.extend(entries)
+        if push:
+            for entry in entries:
+                self._push(entry)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "in_memory": len(self._heap),
+            "unsaved": len(self._buffer),
+            "paused_automations": sorted(self._paused),
+            # Tudo em memória quando o banco não tem entregas além da heap
+            "all_in_memory": self._horizon == math.inf,
+            "next_due_in_s": (
+                round(self._heap[0][0] - time.time(), 1) if self._heap else None
+            ),
+        }
@@ -0,0 +1,232 @@
+import asyncio
+import collections
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.config.config import settings
+from app.utils import metrics
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "spill")
+
+
+class QueueItem:
+    __slots__ = ("message", "enqueued_at")
+
+    def __init__(self, message, enqueued_at: float):
+        self.message = message
+        self.enqueued_at = enqueued_at
+
+
+class SpillFile:
+    """
+    Excedente da fila em disco (JSON por linha). Só guarda chat e id da
+    mensagem: o objeto do Pyrogram não é serializável, então a mensagem é
+    buscada de novo (get_messages) quando chega a vez dela.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.count = 0
+        self.head_enqueued_at: Optional[float] = None  # Mais antiga no disco
+        self._writer = None
+        self._reader = None
+        self._next: Optional[Dict[str, Any]] = None
+
+    def append(self, message, enqueued_at: float):
+        if self._writer is None:
+            self._writer = open(self.path, "a", encoding="utf-8")
+        entry = {
+            "chat_id": message.chat.id,
+            "message_id": message.id,
+            "enqueued_at": enqueued_at,
+        }
+        self._writer.write(json.dumps(entry) + "\n")
+        self._writer.flush()
+        if self.count == 0:
+            self.head_enqueued_at = enqueued_at
+        self.count += 1
+
+    def pop(self) -> Dict[str, Any]:
+        if self._reader is None:
+            self._reader = open(self.path, "r", encoding="utf-8")
+            self._next = self._read_line()
+        entry = self._next
+        self.count -= 1
+        if self.count == 0:
+            self.reset()
+        else:
+            self._next = self._read_line()
+            self.head_enqueued_at = self._next["enqueued_at"]
+        return entry
+
+    def _read_line(self) -> Dict[str, Any]:
+        return json.loads(self._reader.readline())
+
+    def reset(self):
+        """Fecha e apaga o arquivo (fila de disco vazia ou descartada)."""
+        for handle in (self._writer, self._reader):
+            if handle is not None:
+                handle.close()
+        self._writer = self._reader = self._next = None
+        self.count = 0
+        self.head_enqueued_at = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class IngestQueue:
+    """
+    Fila limitada entre o handler do Pyrogram e o envio de uma automação.
+    O handler só enfileira; um worker próprio drena a fila e envia, então um
+    destino preso em FloodWait não ocupa os workers de updates do Pyrogram
+    nem atrasa as outras automações da sessão.
+
+    Com a política spill, enquanto houver excedente em disco as novas
+    mensagens também vão para o disco, preservando a ordem de chegada.
+    """
+
+    def __init__(
+        self,
+        automation_id: int,
+        maxsize: int = None,
+        overflow: str = None,
+        spill_dir: Path = None,
+    ):
+        self.automation_id = automation_id
+        self.label = str(automation_id)
+        self.maxsize = maxsize or settings.INGEST_QUEUE_MAXSIZE
+        self.overflow = overflow or settings.INGEST_QUEUE_OVERFLOW
+        if self.overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Política de fila inválida: {self.overflow} "
+                f"(use {', '.join(OVERFLOW_POLICIES)})"
+            )
+        self._items = collections.deque()
+        self._changed = asyncio.Condition()
+        self.closed = False
+        self.spill = (
+            SpillFile(
+                (spill_dir or settings.QUEUE_SPILL_DIR)
+                / f"automation_{automation_id}.jsonl"
+            )
+            if self.overflow == "spill"
+            else None
+        )
+        if self.spill:
+            self.spill.reset()  # Sobras de uma execução anterior não são retomadas
+
+    def __len__(self):
+        return len(self._items) + (self.spill.count if self.spill else 0)
+
+    @property
+    def memory_depth(self) -> int:
+        return len(self._items)
+
+    @property
+    def disk_depth(self) -> int:
+        return self.spill.count if self.spill else 0
+
+    def oldest_age(self, now: float = None) -> float:
+        now = now or time.time()
+        if self._items:
+            return now - self._items[0].enqueued_at
+        if self.spill and self.spill.count:
+            return now - self.spill.head_enqueued_at
+        return 0.0
+
+    async def put(self, message):
+        enqueued_at = time.time()
+        async with self._changed:
+            if self.closed:
+                return
+            if self.spill and self.spill.count:
+                self.spill.append(message, enqueued_at)
+            elif len(self._items) < self.maxsize:
+                self._items.append(QueueItem(message, enqueued_at))
+            elif self.overflow == "block":
+                await self._changed.wait_for(
+                    lambda: self.closed or len(self._items) < self.maxsize
+                )
+                if self.closed:
+                    return
+                self._items.append(QueueItem(message, enqueued_at))
+            elif self.overflow == "drop_oldest":
+                dropped = self._items.popleft()
+                self._items.append(QueueItem(message, enqueued_at))
+                metrics.ingest_queue_dropped.inc((self.label,))
+                logging.warning(
+                    f"[QUEUE] Automação {self.automation_id}: fila cheia, "
+                    f"mensagem {dropped.message.id} descartada"
+                )
+            else:
+                self.spill.append(message, enqueued_at)
+            self._changed.notify_all()
+
+    async def get(self, fetch_message: Callable[[Any, int], Awaitable[Any]]):
+        """
+        Retorna (mensagem, enqueued_at) na ordem de chegada. Mensagens vindas
+        do disco são buscadas de novo com fetch_message(chat_id, message_id).
+        """
+        async with self._changed:
+            await self._changed.wait_for(lambda: len(self) > 0)
+            if self._items:
+                item = self._items.popleft()
+                self._changed.notify_all()
+                return item.message, item.enqueued_at
+            entry = self.spill.pop()
+        message = await fetch_message(entry["chat_id"], entry["message_id"])
+        return message, entry["enqueued_at"]
+
+    async def close(self) -> int:
+        """
+        Descarta o que restou (automação parada) e libera handlers esperando
+        espaço na fila. Retorna o total descartado.
+        """
+        async with self._changed:
+            self.closed = True
+            pending = len(self)
+            self._items.clear()
+            if self.spill:
+                self.spill.reset()
+            self._changed.notify_all()
+        return pending
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "overflow": self.overflow,
+            "maxsize": self.maxsize,
+            "memory": self.memory_depth,
+            "disk": self.disk_depth,
+            "oldest_age_s": round(self.oldest_age(), 3),
+        }
+
+
+async def run_worker(
+    queue: IngestQueue,
+    client,
+    send: Callable[[Any, Any], Awaitable[None]],
+):
+    """Drena a fila de uma automação, uma mensagem por vez, até ser cancelado."""
+
+    async def fetch_message(chat_id, message_id):
+        return await client.get_messages(chat_id, message_id)
+
+    while True:
+        try:
+            message, _ = await queue.get(fetch_message)
+            if message is None or getattr(message, "empty", False):
+                continue  # Apagada antes de sair do disco
+            await send(client, message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(
+                f"[QUEUE] Automação {queue.automation_id}: erro ao processar "
+                f"mensagem da fila: {e}"
+            )
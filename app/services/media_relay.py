@@ -0,0 +1,456 @@
+import asyncio
+import collections
+import io
+import logging
+import math
+import os
+import re
+import weakref
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.config.config import settings
+from app.utils import metrics, tracing
+
+# Tamanho das partes que o save_file do Pyrogram lê do arquivo a cada chamada
+UPLOAD_PART_SIZE = 512 * 1024
+
+# Tentativas de upload por envio; cada uma relê o arquivo desde o início
+UPLOAD_ATTEMPTS = 2
+
+# Atributos da mídia original repassados no upload, por tipo
+_UPLOAD_ATTRIBUTES = {
+    "video": ("duration", "width", "height", "file_name", "supports_streaming"),
+    "animation": ("duration", "width", "height", "file_name"),
+    "audio": ("duration", "performer", "title", "file_name"),
+    "voice": ("duration",),
+    "video_note": ("duration", "length"),
+    "document": ("file_name",),
+}
+
+_UNSAFE_NAME = re.compile(r"[^A-Za-z0-9_-]")
+_PARTIAL_SUFFIX = ".partial"
+
+
+def is_forward_restricted(error: Exception) -> bool:
+    """Erro de conteúdo protegido: a mídia não pode sair por file_id."""
+    return "CHAT_FORWARDS_RESTRICTED" in str(error) or (
+        type(error).__name__ == "ChatForwardsRestricted"
+    )
+
+
+def _is_upload_retryable(error: Exception) -> bool:
+    """Upload interrompido no meio (parte perdida ou leitor já fechado)."""
+    return (
+        type(error).__name__ == "FilePartMissing"
+        or "FILE_PART" in str(error)
+        or (isinstance(error, ValueError) and "closed file" in str(error))
+    )
+
+
+class MediaDiskCache:
+    """
+    Cache em disco dos arquivos baixados de origens protegidas, endereçado
+    pelo file_unique_id (o mesmo arquivo tem o mesmo id em qualquer chat ou
+    conta). Acima de `max_bytes`, os arquivos usados há mais tempo são
+    apagados; os que estão sendo enviados não saem.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "collections.OrderedDict[str, int]" = collections.OrderedDict()
+        self._pinned: Dict[str, int] = {}
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        files = []
+        for path in self.directory.iterdir():
+            if path.name.endswith(_PARTIAL_SUFFIX):
+                path.unlink(missing_ok=True)  # Download interrompido
+            elif path.is_file():
+                stat = path.stat()
+                files.append((stat.st_mtime, path.name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self.size += size
+
+    def path(self, key: str) -> Path:
+        return self.directory / _UNSAFE_NAME.sub("_", key)
+
+    def partial_path(self, key: str) -> Path:
+        return self.path(key).with_name(self.path(key).name + _PARTIAL_SUFFIX)
+
+    def get(self, key: str) -> Optional[Path]:
+        name = self.path(key).name
+        if name not in self._entries:
+            return None
+        path = self.directory / name
+        if not path.exists():
+            self.size -= self._entries.pop(name)
+            return None
+        self._entries.move_to_end(name)
+        return path
+
+    def add(self, key: str, partial_path: Path) -> Path:
+        path = self.path(key)
+        os.replace(partial_path, path)
+        size = path.stat().st_size
+        self.size += size - self._entries.pop(path.name, 0)
+        self._entries[path.name] = size
+        self._evict()
+        return path
+
+    def pin(self, key: str):
+        name = self.path(key).name
+        self._pinned[name] = self._pinned.get(name, 0) + 1
+
+    def unpin(self, key: str):
+        name = self.path(key).name
+        if self._pinned.get(name, 0) <= 1:
+            self._pinned.pop(name, None)
+            self._evict()
+        else:
+            self._pinned[name] -= 1
+
+    def _evict(self):
+        for name in list(self._entries):
+            if self.size <= self.max_bytes:
+                break
+            if name in self._pinned:
+                continue
+            self.size -= self._entries.pop(name)
+            (self.directory / name).unlink(missing_ok=True)
+            metrics.media_relay_evictions.inc()
+
+
+class Download:
+    """Download em andamento: o arquivo parcial cresce a cada chunk recebido."""
+
+    def __init__(self, key: str, path: Path, size: int):
+        self.key = key
+        self.path = path
+        self.size = size  # 0 = desconhecido (só lido depois do fim)
+        self.written = 0
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def advance(self, nbytes: int):
+        self.written += nbytes
+        self._changed.set()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.finished = True
+        self.error = error
+        self._changed.set()
+
+    async def wait_for(self, offset: int):
+        """Espera até `offset` bytes estarem no disco (ou o download acabar)."""
+        while self.written < offset and not self.finished:
+            self._changed.clear()
+            await self._changed.wait()
+        if self.error is not None:
+            raise self.error
+
+    async def wait_done(self):
+        await self.wait_for(math.inf)
+
+
+class StreamReader(io.RawIOBase):
+    """
+    Arquivo entregue ao upload do Pyrogram enquanto o download ainda está em
+    andamento. O save_file lê uma parte por vez de forma síncrona e, entre
+    uma parte e outra, aguarda o callback `progress`; é nele que o leitor
+    espera a próxima parte chegar ao disco. Nada fica em memória além da
+    parte sendo enviada. Cada tentativa de upload abre o seu próprio leitor.
+    """
+
+    def __init__(self, download: Download, name: str):
+        super().__init__()
+        self.download = download
+        self.name = name
+        self._file = open(download.path, "rb")
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_END:
+            self._position = self.download.size + offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        else:
+            self._position = offset
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def read(self, size=-1):
+        end = self.download.size if size < 0 else self._position + size
+        end = min(end, self.download.size, self.download.written)
+        self._file.seek(self._position)
+        data = self._file.read(max(0, end - self._position))
+        self._position += len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+    async def progress(self, current, total):
+        await self.download.wait_for(min(current + UPLOAD_PART_SIZE, total))
+
+
+class MediaRelay:
+    """
+    Envio de mídia de origens com conteúdo protegido, que não pode ser
+    encaminhada nem reenviada por file_id: o arquivo é baixado da origem
+    (stream_media) e enviado de novo como upload.
+
+    O upload começa assim que a primeira parte chega e segue junto com o
+    download. O arquivo fica no cache em disco, então um arquivo que vai
+    para vários destinos (ou automações) é baixado uma vez só; downloads
+    simultâneos do mesmo arquivo são compartilhados. Depois do primeiro
+    upload, os demais destinos do mesmo cliente usam o file_id do arquivo
+    enviado, sem novo upload.
+    """
+
+    def __init__(self, telegram_service, cache: MediaDiskCache, max_file_ids: int):
+        self.telegram_service = telegram_service
+        self.cache = cache
+        self.max_file_ids = max(1, max_file_ids)
+        self._downloads: Dict[str, Download] = {}
+        # file_unique_id original -> file_id enviado, por cliente
+        self._file_ids: "weakref.WeakKeyDictionary[Any, collections.OrderedDict]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    async def send(
+        self,
+        client,
+        message,
+        media_info: Dict[str, Any],
+        dest_id,
+        caption=None,
+        caption_entities=None,
+    ):
+        key = media_info["file_unique_id"]
+        media_type = media_info["media_type"]
+
+        file_id = self._uploaded_file_id(client, key)
+        if file_id is not None:
+            try:
+                await self.telegram_service._send_media(
+                    client, dest_id, file_id, media_type, caption, caption_entities
+                )
+                metrics.media_relay_sends.inc(("file_id",))
+                return
+            except Exception as e:
+                logging.warning(
+                    f"[RELAY] file_id reenviado de {key} recusado ({e}); novo upload"
+                )
+                self._file_ids.get(client, {}).pop(key, None)
+
+        attributes = self._attributes(message, media_type)
+        if "file_name" in _UPLOAD_ATTRIBUTES.get(media_type, ()):
+            attributes.setdefault("file_name", _file_name(media_info))
+        self.cache.pin(key)
+        try:
+            for attempt in range(1, UPLOAD_ATTEMPTS + 1):
+                # Cada tentativa abre a sua fonte: o leitor da anterior pode
+                # ter sido fechado pelo upload que falhou
+                source, upload = await self._upload_source(
+                    client, message, media_info, attributes
+                )
+                if isinstance(upload, StreamReader):
+                    attributes["progress"] = upload.progress
+                else:
+                    attributes.pop("progress", None)
+                with tracing.span("relay_upload", source=source, media_type=media_type):
+                    try:
+                        sent = await self.telegram_service._send_media(
+                            client,
+                            dest_id,
+                            upload,
+                            media_type,
+                            caption,
+                            caption_entities,
+                            **attributes,
+                        )
+                        break
+                    except Exception as e:
+                        if attempt == UPLOAD_ATTEMPTS or not _is_upload_retryable(e):
+                            raise
+                        logging.warning(
+                            f"[RELAY] Upload de {key} interrompido ({e!r}); "
+                            f"tentativa {attempt + 1} com nova leitura"
+                        )
+                    finally:
+                        if isinstance(upload, StreamReader):
+                            upload.close()
+        finally:
+            self.cache.unpin(key)
+
+        metrics.media_relay_sends.inc((source,))
+        self._remember(client, key, sent, media_type)
+
+    async def _upload_source(self, client, message, media_info, attributes):
+        """
+        Fonte do upload: o arquivo em disco se já estiver no cache, senão um
+        leitor novo sobre o download em andamento (iniciado se preciso).
+        """
+        key = media_info["file_unique_id"]
+        for _ in range(UPLOAD_ATTEMPTS):
+            path = self.cache.get(key)
+            if path is not None:
+                return "disk", str(path)
+            download = self._downloads.get(key) or self._start_download(
+                client, message, media_info
+            )
+            if download.size:
+                await download.wait_for(min(UPLOAD_PART_SIZE, download.size))
+                if not download.finished:
+                    return "stream", StreamReader(
+                        download, attributes.get("file_name") or _file_name(media_info)
+                    )
+            else:
+                # Sem tamanho conhecido não há como dividir em partes antes
+                # do fim: espera o download e envia do disco
+                await download.wait_done()
+            # Download concluído: o arquivo já saiu do caminho parcial para o
+            # cache; se não estiver lá (apagado de fora), baixa de novo
+            path = self.cache.get(key)
+            if path is not None:
+                return "disk", str(path)
+            logging.warning(
+                f"[RELAY] {key} ausente do cache após o download; baixando de novo"
+            )
+        raise FileNotFoundError(f"arquivo de {key} ausente do cache após o download")
+
+    # =========================
+    # DOWNLOAD
+    # =========================
+    def _start_download(self, client, message, media_info) -> Download:
+        key = media_info["file_unique_id"]
+        download = self._downloads[key] = Download(
+            key, self.cache.partial_path(key), media_info.get("file_size") or 0
+        )
+        # A leitura da origem fica com o cliente principal (membro da origem)
+        reader = getattr(client, "primary", client)
+        download.task = asyncio.create_task(
+            self._download(reader, message, download), name=f"relay-download-{key}"
+        )
+        return download
+
+    async def _download(self, client, message, download: Download):
+        error = None
+        try:
+            with tracing.span("relay_download", file_unique_id=download.key):
+                with open(download.path, "wb") as f:
+                    async for chunk in client.stream_media(message):
+                        f.write(chunk)
+                        f.flush()
+                        download.advance(len(chunk))
+                        metrics.media_relay_download_bytes.inc(amount=len(chunk))
+            if download.size and download.written != download.size:
+                raise IOError(
+                    f"download incompleto ({download.written} de {download.size} bytes)"
+                )
+            download.size = download.written
+            self.cache.add(download.key, download.path)
+        except BaseException as e:
+            # Quem espera pelo arquivo recebe o erro via Download.wait_for
+            error = e
+            download.path.unlink(missing_ok=True)
+            logging.error(f"[RELAY] Falha ao baixar {download.key}: {e!r}")
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            self._downloads.pop(download.key, None)
+            download.finish(error)
+
+    # =========================
+    # FILE_IDS ENVIADOS
+    # =========================
+    def _uploaded_file_id(self, client, key: str) -> Optional[str]:
+        file_ids = self._file_ids.get(client)
+        if not file_ids or key not in file_ids:
+            return None
+        file_ids.move_to_end(key)
+        return file_ids[key]
+
+    def _remember(self, client, key: str, sent, media_type: str):
+        # Com pool de envio, cada envio pode sair por outra conta: o file_id
+        # de uma conta não vale para as outras
+        if hasattr(client, "primary"):
+            return
+        media = getattr(sent, media_type, None)
+        file_id = getattr(media, "file_id", None)
+        if not file_id:
+            return
+        file_ids = self._file_ids.get(client)
+        if file_ids is None:
+            file_ids = self._file_ids[client] = collections.OrderedDict()
+        file_ids[key] = file_id
+        if len(file_ids) > self.max_file_ids:
+            file_ids.popitem(last=False)
+
+    @staticmethod
+    def _attributes(message, media_type: str) -> Dict[str, Any]:
+        media = getattr(message, media_type, None)
+        attributes = {}
+        for name in _UPLOAD_ATTRIBUTES.get(media_type, ()):
+            value = getattr(media, name, None)
+            if value:
+                attributes[name] = value
+        return attributes
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "cache_files": len(self.cache._entries),
+            "cache_bytes": self.cache.size,
+            "downloads": len(self._downloads),
+            "clients_with_file_ids": len(self._file_ids),
+        }
+
+
+def _file_name(media_info: Dict[str, Any]) -> str:
+    """Nome do arquivo enviado quando a mídia original não tem um."""
+    extension = {
+        "photo": ".jpg",
+        "video": ".mp4",
+        "animation": ".mp4",
+        "voice": ".ogg",
+        "video_note": ".mp4",
+        "sticker": ".webp",
+    }.get(media_info["media_type"], "")
+    return f"{media_info['file_unique_id']}{extension}"
+
+
+_relay: Optional[MediaRelay] = None
+
+
+def media_relay(telegram_service) -> MediaRelay:
+    """Relay do processo, criado no primeiro uso com os valores de settings."""
+    global _relay
+    if _relay is None:
+        _relay = MediaRelay(
+            telegram_service,
+            MediaDiskCache(
+                settings.MEDIA_RELAY_CACHE_DIR,
+                settings.MEDIA_RELAY_CACHE_MAX_MB * 1024 * 1024,
+            ),
+            settings.MEDIA_RELAY_FILE_IDS,
+        )
+    return _relay
+
+
+def relay_status() -> Dict[str, Any]:
+    return _relay.status() if _relay is not None else {}
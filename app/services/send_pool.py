@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pyrogram.errors import FloodWait
+
+from app.config.config import settings
+from app.utils import metrics
+
+SEND_METHODS = {
+    "send_message",
+    "send_photo",
+    "send_video",
+    "send_audio",
+    "send_document",
+    "send_voice",
+    "send_video_note",
+    "send_sticker",
+    "send_animation",
+    "send_media_group",
+}
+
+
+class SendPoolExhausted(Exception):
+    """Todas as contas do pool estão em FloodWait por mais que o limite de espera."""
+
+
+class SendBudget:
+    """
+    Orçamento de envio de uma conta: token bucket (SEND_POOL_RATE_PER_SECOND,
+    rajada de SEND_POOL_BURST) e bloqueio até o fim do último FloodWait.
+    Um por sessão, compartilhado por todos os pools de que ela participa.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+
+    def available(self, now: float) -> float:
+        if now < self.blocked_until:
+            return 0.0
+        return min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+
+    def wait_time(self, now: float) -> float:
+        """Segundos até haver um envio disponível nesta conta."""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        return max(0.0, (1 - self.available(now)) / self.rate)
+
+    def consume(self, now: float):
+        self.tokens = self.available(now) - 1
+        self.updated_at = now
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+budgets: Dict[str, SendBudget] = {}
+
+
+def budget_for(session_name: str) -> SendBudget:
+    budget = budgets.get(session_name)
+    if budget is None:
+        budget = budgets[session_name] = SendBudget(
+            settings.SEND_POOL_RATE_PER_SECOND, settings.SEND_POOL_BURST
+        )
+    return budget
+
+
+class PooledClient:
+    """
+    Cliente usado pelo pipeline de uma automação com pool de envio. Os
+    métodos send_* vão para a conta com mais orçamento disponível; uma conta
+    em FloodWait sai da escolha até o fim da espera e o envio passa para a
+    próxima. O resto (get_messages, get_chat_history...) fica com o cliente
+    principal, que lê as origens.
+    """
+
+    def __init__(self, session_name: str, client, members: Dict[str, object]):
+        self.primary = client
+        self.senders: List[Tuple[str, object]] = [(session_name, client)]
+        self.senders += list(members.items())
+        # Destinos já verificados (get_chat/join) por cada conta extra
+        self.joined: Dict[str, set] = {name: set() for name in members}
+
+    def __getattr__(self, name):
+        if name in SEND_METHODS:
+
+            async def send(*args, **kwargs):
+                return await self._send(name, *args, **kwargs)
+
+            return send
+        return getattr(self.primary, name)
+
+    async def _pick(self) -> Tuple[str, object]:
+        """Conta conectada com mais orçamento; espera se todas estiverem sem."""
+        while True:
+            now = time.monotonic()
+            connected = [
+                (name, client)
+                for name, client in self.senders
+                if getattr(client, "is_connected", True)
+            ]
+            if not connected:
+                raise ConnectionError("Nenhuma conta do pool de envio conectada")
+            name, client = max(
+                connected, key=lambda sender: budget_for(sender[0]).available(now)
+            )
+            budget = budget_for(name)
+            if budget.available(now) >= 1:
+                budget.consume(now)
+                return name, client
+
+            wait = min(budget_for(n).wait_time(now) for n, _ in connected)
+            if wait > settings.SEND_POOL_MAX_WAIT_SECONDS:
+                raise SendPoolExhausted(
+                    f"Pool de envio sem orçamento pelos próximos {wait:.0f}s"
+                )
+            await asyncio.sleep(wait)
+
+    async def _send(self, method: str, *args, **kwargs):
+        while True:
+            name, client = await self._pick()
+            try:
+                result = await getattr(client, method)(*args, **kwargs)
+            except FloodWait as e:
+                budget_for(name).block(e.value)
+                metrics.floodwait_seconds.inc((method,), e.value)
+                metrics.send_pool_failovers.inc((name, "floodwait"))
+                logging.warning(
+                    f"[SEND_POOL] {name} em FloodWait de {e.value}s; "
+                    f"passando o envio para outra conta"
+                )
+                continue
+            except Exception as e:
+                if client is self.primary:
+                    raise
+                # Conta extra sem acesso ao destino ou ao arquivo: usa a principal
+                metrics.send_pool_failovers.inc((name, "error"))
+                budget_for(self.senders[0][0]).consume(time.monotonic())
+                logging.warning(
+                    f"[SEND_POOL] Falha em {name} ({e}); reenviando pela conta principal"
+                )
+                return await getattr(self.primary, method)(*args, **kwargs)
+            metrics.send_pool_sends.inc((name,))
+            return result
+
+    def status(self) -> Dict[str, Dict[str, Optional[float]]]:
+        now = time.monotonic()
+        return {
+            name: {
+                "connected": bool(getattr(client, "is_connected", True)),
+                "available": round(budget_for(name).available(now), 2),
+                "blocked_s": round(max(0.0, budget_for(name).blocked_until - now), 1),
+            }
+            for name, client in self.senders
+        }
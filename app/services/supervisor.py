@@ -0,0 +1,269 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.config.config import settings
+from app.utils import metrics
+
+
+class FailureState:
+    """Falha em aberto de um componente: quando foi vista e quando tentar de novo."""
+
+    __slots__ = ("detected_at", "attempts", "next_attempt_at", "last_error")
+
+    def __init__(self, now: float):
+        self.detected_at = now
+        self.attempts = 0
+        self.next_attempt_at = now  # A primeira tentativa é imediata
+        self.last_error: Optional[str] = None
+
+
+class AutomationSupervisor:
+    """
+    Verifica periodicamente os clientes com automações em execução:
+    conexão do cliente, handlers registrados no dispatcher, workers das filas
+    de entrada e tarefas de histórico. O que falhou é reiniciado com backoff exponencial com jitter,
+    e o tempo entre a detecção e o reinício bem-sucedido vai para
+    telegram_supervisor_recovery_seconds.
+
+    O laço é iniciado com a primeira automação e termina sozinho quando não
+    há mais nada para supervisionar.
+    """
+
+    def __init__(
+        self,
+        telegram_service,
+        forwarding_tasks: Dict[int, asyncio.Task],
+        resume_history: Callable[[int], Optional[asyncio.Task]],
+        history_progress: Callable[[int], Optional[int]],
+        queue_workers: Dict[int, asyncio.Task],
+        resume_worker: Callable[[int], Optional[asyncio.Task]],
+    ):
+        self.telegram_service = telegram_service
+        self.forwarding_tasks = forwarding_tasks
+        self.resume_history = resume_history
+        self.history_progress = history_progress
+        self.queue_workers = queue_workers
+        self.resume_worker = resume_worker
+        self.failures: Dict[Tuple[str, Any], FailureState] = {}
+        self.abandoned: Dict[int, str] = {}  # automation_id -> último erro
+        # automation_id -> (mensagens processadas na última falha, falhas seguidas)
+        self._history_strikes: Dict[int, Tuple[Optional[int], int]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def ensure_running(self):
+        if settings.SUPERVISOR_INTERVAL_SECONDS <= 0:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="automation-supervisor")
+
+    def forget(self, automation_id: int):
+        """Descarta o estado de uma automação parada."""
+        self.abandoned.pop(automation_id, None)
+        self._history_strikes.pop(automation_id, None)
+        for key in [k for k in self.failures if k[1] == automation_id]:
+            del self.failures[key]
+
+    # =========================
+    # LAÇO
+    # =========================
+    async def _run(self):
+        interval = settings.SUPERVISOR_INTERVAL_SECONDS
+        while self._has_work():
+            await asyncio.sleep(interval)
+            try:
+                await self.check_once()
+            except Exception as e:
+                logging.error(f"[SUPERVISOR] Erro na verificação: {e}")
+        logging.info("[SUPERVISOR] Nada para supervisionar; encerrando")
+
+    def _has_work(self) -> bool:
+        return bool(self.failures) or any(
+            self.telegram_service.in_use(data)
+            for data in self.telegram_service.active_clients.values()
+        )
+
+    async def check_once(self):
+        now = time.monotonic()
+        for session_name, data in list(self.telegram_service.active_clients.items()):
+            if not self.telegram_service.in_use(data):
+                continue  # Clientes ociosos ficam por conta do pool
+            client = data["client"]
+            if not getattr(client, "is_connected", False):
+                await self._attempt(
+                    ("client", session_name),
+                    now,
+                    lambda: self._reconnect(session_name),
+                )
+                continue
+            self._recovered(("client", session_name), now)
+            self._check_handlers(session_name, data, now)
+
+        # O worker só termina cancelado (automação parada); se morreu, o
+        # handler continua enchendo uma fila que ninguém drena
+        for automation_id, task in list(self.queue_workers.items()):
+            if not task.done() or task.cancelled():
+                continue
+            await self._attempt(
+                ("worker", automation_id),
+                now,
+                lambda: self._restart_worker(automation_id),
+                error=task.exception(),
+            )
+
+        for automation_id, task in list(self.forwarding_tasks.items()):
+            if automation_id in self.abandoned or not task.done():
+                continue
+            if task.cancelled() or task.exception() is None:
+                continue
+            await self._attempt(
+                ("history", automation_id),
+                now,
+                lambda: self._restart_history(automation_id),
+                error=task.exception(),
+                delay=self._history_delay(automation_id),
+            )
+
+    # =========================
+    # VERIFICAÇÕES
+    # =========================
+    async def _reconnect(self, session_name: str):
+        await self.telegram_service.reconnect_client(session_name)
+        # O stop() do Pyrogram esvazia o dispatcher: registra tudo de novo
+        data = self.telegram_service.active_clients.get(session_name)
+        if data:
+            for handler_info in data["handlers"].values():
+                self._register(data["client"], handler_info)
+
+    def _check_handlers(self, session_name: str, data: Dict[str, Any], now: float):
+        dispatcher = getattr(data["client"], "dispatcher", None)
+        if dispatcher is None:
+            return
+        for automation_id, handler_info in data["handlers"].items():
+            # add_handler é aplicado por uma task: ignora registros recentes
+            if now - handler_info["added_at"] < settings.SUPERVISOR_INTERVAL_SECONDS:
+                continue
+            group = dispatcher.groups.get(handler_info["group"], ())
+            if handler_info["handler"] in group:
+                continue
+            logging.warning(
+                f"[SUPERVISOR] Handler da automação {automation_id} ausente na "
+                f"sessão {session_name}; registrando de novo"
+            )
+            self._register(data["client"], handler_info)
+            metrics.supervisor_restarts.inc(("handler", "success"))
+
+    @staticmethod
+    def _register(client, handler_info: Dict[str, Any]):
+        client.add_handler(handler_info["handler"], handler_info["group"])
+        handler_info["added_at"] = time.monotonic()
+
+    async def _restart_worker(self, automation_id: int):
+        if self.resume_worker(automation_id) is None:
+            # Automação parada nesse meio tempo
+            self.failures.pop(("worker", automation_id), None)
+
+    def _history_delay(self, automation_id: int) -> float:
+        """Backoff entre mortes seguidas da tarefa sem progresso entre elas."""
+        last_processed, strikes = self._history_strikes.get(automation_id, (None, 0))
+        if not strikes or self.history_progress(automation_id) != last_processed:
+            return 0
+        return self._backoff(strikes)
+
+    async def _restart_history(self, automation_id: int):
+        # Falhas seguidas só contam enquanto não houver progresso entre elas
+        processed = self.history_progress(automation_id)
+        last_processed, strikes = self._history_strikes.get(automation_id, (None, 0))
+        strikes = strikes + 1 if processed == last_processed else 1
+        self._history_strikes[automation_id] = (processed, strikes)
+        if strikes > settings.SUPERVISOR_HISTORY_MAX_RESTARTS:
+            state = self.failures.pop(("history", automation_id))
+            self.abandoned[automation_id] = state.last_error
+            metrics.supervisor_restarts.inc(("history", "abandoned"))
+            logging.error(
+                f"[SUPERVISOR] Histórico da automação {automation_id} abandonado "
+                f"após {strikes - 1} falhas seguidas sem progresso: "
+                f"{state.last_error}"
+            )
+            return
+        if self.resume_history(automation_id) is None:
+            # Automação parada nesse meio tempo
+            self.failures.pop(("history", automation_id), None)
+
+    # =========================
+    # BACKOFF
+    # =========================
+    async def _attempt(
+        self,
+        key: Tuple[str, Any],
+        now: float,
+        restart: Callable[[], Awaitable[None]],
+        error: Optional[BaseException] = None,
+        delay: float = 0,
+    ):
+        state = self.failures.get(key)
+        if state is None:
+            state = self.failures[key] = FailureState(now)
+            state.next_attempt_at = now + delay
+            logging.warning(f"[SUPERVISOR] Falha detectada em {key[0]} {key[1]}")
+        if error is not None:
+            state.last_error = str(error)
+        if now < state.next_attempt_at:
+            return
+
+        component = key[0]
+        try:
+            await restart()
+        except Exception as e:
+            state.last_error = str(e)
+            metrics.supervisor_restarts.inc((component, "failure"))
+            logging.error(
+                f"[SUPERVISOR] Falha ao reiniciar {component} {key[1]} "
+                f"(tentativa {state.attempts + 1}): {e}"
+            )
+            state.attempts += 1
+            state.next_attempt_at = time.monotonic() + self._backoff(state.attempts)
+            return
+        state.attempts += 1
+        if key in self.failures:
+            metrics.supervisor_restarts.inc((component, "success"))
+            self._recovered(key, time.monotonic())
+
+    @staticmethod
+    def _backoff(attempts: int) -> float:
+        """Backoff exponencial com jitter (metade fixa, metade aleatória)."""
+        delay = min(
+            settings.SUPERVISOR_BACKOFF_MAX_SECONDS,
+            settings.SUPERVISOR_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1),
+        )
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _recovered(self, key: Tuple[str, Any], now: float):
+        state = self.failures.pop(key, None)
+        if state is None:
+            return
+        elapsed = now - state.detected_at
+        metrics.supervisor_recovery.observe(elapsed, (key[0],))
+        logging.info(
+            f"[SUPERVISOR] {key[0]} {key[1]} recuperado em {elapsed:.1f}s "
+            f"({state.attempts} tentativa(s))"
+        )
+
+    def status(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "failures": [
+                {
+                    "component": key[0],
+                    "id": key[1],
+                    "down_s": round(now - state.detected_at, 1),
+                    "attempts": state.attempts,
+                    "last_error": state.last_error,
+                }
+                for key, state in self.failures.items()
+            ],
+            "abandoned_history": dict(self.abandoned),
+        }
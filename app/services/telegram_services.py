@@ -1,16 +1,26 @@
 import asyncio
 import logging
+import time
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
 from pyrogram import Client
-from app.models.database import CollectedMedia, SessionLocal
+from pyrogram.errors import FloodWait
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from app.models.database import CollectedMedia, AsyncSessionLocal
 from app.config.config import settings
+from app.utils import metrics, tracing
+from app.utils.data_base_utils.automation import _insert_ignoring_conflicts
+from app.utils.process_stats import current_rss_bytes
 
 
 class TelegramService:
     def __init__(self):
         self.active_clients: Dict[str, Dict[str, Any]] = {}
+        self.pool_stats = {"hits": 0, "misses": 0, "evictions": 0, "idle_expired": 0}
+        # Um cliente por sessão mesmo com inícios concorrentes (operações em massa)
+        self._client_locks: Dict[str, asyncio.Lock] = {}
 
     # =========================
     # LEGENDAS
@@ -40,21 +50,39 @@ class TelegramService:
             workdir=settings.SESSIONS_DIR,
         )
         await client.start()
-        self.active_clients[session_name] = {"client": client, "handlers": {}}
+        self.active_clients[session_name] = {
+            "client": client,
+            "handlers": {},
+            "send_pools": set(),  # Automações que usam este cliente para enviar
+            "last_used": time.monotonic(),
+            "idle_task": None,
+        }
         return client
 
     async def get_or_create_client(self, session_name: str) -> Client:
-        """Retorna cliente existente ou cria um novo"""
-        if session_name not in self.active_clients:
-            logging.info(f"Iniciando cliente para a sessão {session_name}...")
-            client = await self.create_client(
-                session_name=session_name,
-                api_id=settings.API_ID,
-                api_hash=settings.API_HASH,
-            )
-        else:
-            client = self.active_clients[session_name]["client"]
-        return client
+        """Retorna cliente existente (inclusive ocioso) ou cria um novo"""
+        client_data = self.active_clients.get(session_name)
+        if client_data is None:
+            lock = self._client_locks.setdefault(session_name, asyncio.Lock())
+            async with lock:
+                if session_name not in self.active_clients:
+                    self.pool_stats["misses"] += 1
+                    await self._ensure_pool_capacity()
+                    logging.info(f"Iniciando cliente para a sessão {session_name}...")
+                    return await self.create_client(
+                        session_name=session_name,
+                        api_id=settings.API_ID,
+                        api_hash=settings.API_HASH,
+                    )
+            # Criado por outra chamada enquanto esta esperava
+            client_data = self.active_clients.get(session_name)
+            if client_data is None:
+                return await self.get_or_create_client(session_name)
+
+        self.pool_stats["hits"] += 1
+        self._cancel_idle_timer(client_data)
+        client_data["last_used"] = time.monotonic()
+        return client_data["client"]
 
     async def get_client_by_session(self, session_name: str) -> Optional[Client]:
         """Retorna cliente ativo para uma sessão"""
@@ -65,9 +93,139 @@ class TelegramService:
         """Para e remove cliente da sessão"""
         client_data = self.active_clients.get(session_name)
         if client_data:
-            await client_data["client"].stop()
+            self._cancel_idle_timer(client_data)
             del self.active_clients[session_name]
+            if getattr(client_data["client"], "is_connected", False):
+                await client_data["client"].stop()
             logging.info(f"Cliente para sessão {session_name} parado e removido.")
+        # Sem cliente, o lock de criação sai junto; se uma criação está em
+        # andamento (lock em uso), ele fica até o próximo stop
+        lock = self._client_locks.get(session_name)
+        if (
+            session_name not in self.active_clients
+            and lock is not None
+            and not lock.locked()
+        ):
+            del self._client_locks[session_name]
+
+    async def reconnect_client(self, session_name: str) -> Client:
+        """
+        Reconecta um cliente do pool que perdeu a conexão. O stop() do
+        Pyrogram esvazia o dispatcher: quem chama registra os handlers de novo.
+        """
+        client = self.active_clients[session_name]["client"]
+        try:
+            await client.stop()
+        except ConnectionError:
+            pass  # Já estava desconectado
+        await client.start()
+        logging.info(f"[POOL] Cliente {session_name} reconectado.")
+        return client
+
+    # =========================
+    # POOL DE CLIENTES
+    # =========================
+    async def release_client(self, session_name: str):
+        """
+        Marca o cliente como ocioso quando não há mais handlers. Ele continua
+        conectado pelo período de carência, para que religar uma automação
+        não repita o handshake completo.
+        """
+        client_data = self.active_clients.get(session_name)
+        if not client_data or self.in_use(client_data):
+            return
+
+        client_data["last_used"] = time.monotonic()
+        grace = settings.CLIENT_IDLE_GRACE_SECONDS
+        if grace <= 0:
+            await self.stop_client(session_name)
+            return
+
+        self._cancel_idle_timer(client_data)
+        client_data["idle_task"] = asyncio.create_task(
+            self._expire_idle_client(session_name, grace)
+        )
+        # Se o pool já está acima do limite, libera espaço imediatamente
+        await self._ensure_pool_capacity(reserve=0)
+
+    async def _expire_idle_client(self, session_name: str, grace: float):
+        await asyncio.sleep(grace)
+        client_data = self.active_clients.get(session_name)
+        if client_data and not self.in_use(client_data):
+            client_data["idle_task"] = None
+            self.pool_stats["idle_expired"] += 1
+            logging.info(f"[POOL] Cliente {session_name} ocioso por {grace}s.")
+            await self.stop_client(session_name)
+
+    @staticmethod
+    def in_use(client_data: Dict[str, Any]) -> bool:
+        """Cliente com handlers ou participando de um pool de envio."""
+        return bool(client_data["handlers"] or client_data["send_pools"])
+
+    @staticmethod
+    def _cancel_idle_timer(client_data: Dict[str, Any]):
+        idle_task = client_data.get("idle_task")
+        if (
+            idle_task
+            and not idle_task.done()
+            and idle_task is not asyncio.current_task()
+        ):
+            idle_task.cancel()
+        client_data["idle_task"] = None
+
+    def _pool_over_limit(self, reserve: int) -> bool:
+        max_connected = settings.CLIENT_POOL_MAX_CONNECTED
+        if max_connected and len(self.active_clients) + reserve > max_connected:
+            return True
+        max_rss_mb = settings.CLIENT_POOL_MAX_RSS_MB
+        if max_rss_mb:
+            rss = current_rss_bytes()
+            if rss is not None and rss > max_rss_mb * 1024 * 1024:
+                return True
+        return False
+
+    async def _ensure_pool_capacity(self, reserve: int = 1):
+        """
+        Encerra clientes ociosos, do menos para o mais recentemente usado,
+        enquanto o pool estiver acima do limite de clientes ou de RSS.
+        """
+        while self._pool_over_limit(reserve):
+            idle = [
+                (data["last_used"], name)
+                for name, data in self.active_clients.items()
+                if not self.in_use(data)
+            ]
+            if not idle:
+                logging.warning(
+                    "[POOL] Limite do pool atingido sem clientes ociosos para encerrar."
+                )
+                return
+            _, session_name = min(idle)
+            self.pool_stats["evictions"] += 1
+            logging.info(f"[POOL] Encerrando cliente ocioso {session_name} (LRU).")
+            await self.stop_client(session_name)
+
+    def pool_status(self) -> Dict[str, Any]:
+        """Métricas do pool: acertos, faltas, despejos e clientes conectados."""
+        now = time.monotonic()
+        return {
+            **self.pool_stats,
+            "connected": len(self.active_clients),
+            "idle": sum(1 for d in self.active_clients.values() if not self.in_use(d)),
+            "rss_bytes": current_rss_bytes(),
+            "clients": {
+                name: {
+                    "handlers": len(data["handlers"]),
+                    "send_pools": len(data["send_pools"]),
+                    "idle_seconds": (
+                        round(now - data["last_used"], 1)
+                        if not self.in_use(data)
+                        else 0
+                    ),
+                }
+                for name, data in self.active_clients.items()
+            },
+        }
 
     # =========================
     # CHAT
@@ -161,6 +319,11 @@ class TelegramService:
                     "original_chat_id": str(message.chat.id),
                     "original_message_id": message.id,
                     "collected_at": getattr(message, "date", datetime.utcnow()),
+                    # Conteúdo protegido não pode ser reenviado por file_id
+                    "protected": bool(
+                        getattr(message, "has_protected_content", False)
+                        or getattr(message.chat, "has_protected_content", False)
+                    ),
                 }
         return None
 
@@ -168,56 +331,97 @@ class TelegramService:
     # CACHE DE MÍDIA
     # =========================
     async def get_cached_media(self, file_unique_id: str) -> Optional[CollectedMedia]:
-        loop = asyncio.get_event_loop()
-
-        def sync_db():
-            with SessionLocal() as db:
-                return (
-                    db.query(CollectedMedia)
-                    .filter_by(file_unique_id=file_unique_id)
-                    .first()
+        with tracing.span("cache.select"):
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    select(CollectedMedia).filter_by(file_unique_id=file_unique_id)
                 )
-
-        return await loop.run_in_executor(None, sync_db)
+                return result.scalars().first()
 
     async def save_media_to_cache(self, media_info: Dict[str, Any]) -> CollectedMedia:
         if not media_info or not media_info.get("file_unique_id"):
             return None
-        loop = asyncio.get_event_loop()
-
-        def sync_db_add():
-            with SessionLocal() as db:
-                # Verifica se a mídia já existe no banco
-                existing_media = (
-                    db.query(CollectedMedia)
-                    .filter_by(file_unique_id=media_info["file_unique_id"])
-                    .first()
+        async with AsyncSessionLocal() as db:
+            # Verifica se a mídia já existe no banco
+            with tracing.span("cache.select"):
+                result = await db.execute(
+                    select(CollectedMedia).filter_by(
+                        file_unique_id=media_info["file_unique_id"]
+                    )
                 )
-                if existing_media:
-                    return existing_media  # Retorna a existente sem inserir duplicata
-                new_media = CollectedMedia(
-                    file_unique_id=media_info["file_unique_id"],
-                    file_id=media_info["file_id"],
-                    media_type=media_info["media_type"],
-                    mime_type=media_info.get("mime_type"),
-                    file_size=media_info.get("file_size"),
-                    original_chat_id=str(media_info["original_chat_id"]),
-                    original_message_id=media_info["original_message_id"],
-                    caption=media_info.get("caption"),
-                    collected_at=media_info.get("collected_at", datetime.utcnow()),
+                existing_media = result.scalars().first()
+            if existing_media:
+                metrics.media_cache_requests.inc(("hit",))
+                return existing_media  # Retorna a existente sem inserir duplicata
+            metrics.media_cache_requests.inc(("miss",))
+            values = {
+                "file_unique_id": media_info["file_unique_id"],
+                "file_id": media_info["file_id"],
+                "media_type": media_info["media_type"],
+                "mime_type": media_info.get("mime_type"),
+                "file_size": media_info.get("file_size"),
+                "original_chat_id": str(media_info["original_chat_id"]),
+                "original_message_id": media_info["original_message_id"],
+                "caption": media_info.get("caption"),
+                "collected_at": media_info.get("collected_at", datetime.utcnow()),
+            }
+            # Workers de filas diferentes podem salvar a mesma mídia ao mesmo
+            # tempo: quem chegar depois não insere e relê a linha gravada
+            with tracing.span("cache.insert"):
+                try:
+                    await db.execute(
+                        _insert_ignoring_conflicts(
+                            db, CollectedMedia.__table__, ["file_unique_id"]
+                        ),
+                        [values],
+                    )
+                    await db.commit()
+                except IntegrityError:
+                    await db.rollback()
+            with tracing.span("cache.select"):
+                result = await db.execute(
+                    select(CollectedMedia).filter_by(
+                        file_unique_id=media_info["file_unique_id"]
+                    )
                 )
-                db.add(new_media)
-                db.commit()
-                db.refresh(new_media)
-                return new_media
-
-        return await loop.run_in_executor(None, sync_db_add)
+                return result.scalars().first()
 
     # =========================
-    # ENVIO DE MÍDIA
+    # ENVIO
     # =========================
-    async def _send_media(self, client, dest_id, file_id, media_type, caption=None):
-        """Função interna para enviar mídia por tipo"""
+    @staticmethod
+    async def _timed_send(method: str, send_func, **kwargs):
+        """Executa a chamada de envio registrando latência e FloodWait."""
+        started = time.perf_counter()
+        try:
+            with tracing.span("send", method=method, destination=kwargs.get("chat_id")):
+                return await send_func(**kwargs)
+        except FloodWait as e:
+            metrics.floodwait_seconds.inc((method,), e.value)
+            raise
+        finally:
+            metrics.send_duration.observe(time.perf_counter() - started, (method,))
+
+    async def send_text(self, client, dest_id, text: str, entities=None):
+        kwargs = {"chat_id": dest_id, "text": text}
+        if entities:
+            kwargs["entities"] = entities
+        await self._timed_send("text", client.send_message, **kwargs)
+
+    async def _send_media(
+        self,
+        client,
+        dest_id,
+        file_id,
+        media_type,
+        caption=None,
+        caption_entities=None,
+        **extra,
+    ):
+        """
+        Função interna para enviar mídia por tipo. `file_id` também pode ser
+        um caminho ou arquivo para upload; `extra` vai direto para o send_*.
+        """
         send_methods = {
             "photo": client.send_photo,
             "video": client.send_video,
@@ -231,27 +435,42 @@ class TelegramService:
         send_func = send_methods.get(media_type)
         if not send_func:
             raise ValueError(f"Tipo de mídia '{media_type}' não suportado")
-        kwargs = {"chat_id": dest_id, media_type: file_id}
+        kwargs = {"chat_id": dest_id, media_type: file_id, **extra}
         if caption:
             kwargs["caption"] = caption
-        await send_func(**kwargs)
+            if caption_entities:
+                kwargs["caption_entities"] = caption_entities
+        return await self._timed_send(media_type, send_func, **kwargs)
 
     async def send_media_by_type(
-        self, client, dest_id, media_info, caption_override=None
+        self, client, dest_id, media_info, caption_override=None, caption_entities=None
     ):
-        final_caption = caption_override or media_info.get("caption")
+        # None usa a legenda original; "" envia sem legenda
+        final_caption = (
+            caption_override
+            if caption_override is not None
+            else media_info.get("caption")
+        )
         await self._send_media(
             client,
             dest_id,
             media_info["file_id"],
             media_info["media_type"],
             final_caption,
+            caption_entities,
         )
 
     async def send_media_from_cache(
-        self, client, cached_media, destination_ids, caption_override=None
+        self,
+        client,
+        cached_media,
+        destination_ids,
+        caption_override=None,
+        caption_entities=None,
     ):
-        final_caption = caption_override or cached_media.caption
+        final_caption = (
+            caption_override if caption_override is not None else cached_media.caption
+        )
         for dest_id in destination_ids:
             await self._send_media(
                 client,
@@ -259,6 +478,7 @@ class TelegramService:
                 cached_media.file_id,
                 cached_media.media_type,
                 final_caption,
+                caption_entities,
             )
 
     # =========================
@@ -273,7 +493,8 @@ class TelegramService:
         msg_id = cached_media.original_message_id
 
         try:
-            orig_msg = await client.get_messages(chat_id, msg_id)
+            with tracing.span("fetch_original_message"):
+                orig_msg = await client.get_messages(chat_id, msg_id)
         except Exception as e:
             logging.error(
                 f"[UPDATE] Não foi possível obter mensagem original {msg_id}: {e}"
@@ -285,28 +506,24 @@ class TelegramService:
             logging.warning(f"[UPDATE] Mensagem {msg_id} não contém mídia válida")
             return None
 
-        loop = asyncio.get_event_loop()
-
-        def sync_db_update(info):
-            with SessionLocal() as db:
-                media = (
-                    db.query(CollectedMedia)
-                    .filter_by(file_unique_id=info["file_unique_id"])
-                    .first()
+        with tracing.span("cache.update"):
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    select(CollectedMedia).filter_by(
+                        file_unique_id=new_info["file_unique_id"]
+                    )
                 )
+                media = result.scalars().first()
                 if media:
-                    media.file_id = info["file_id"]
-                    media.mime_type = info.get("mime_type")
-                    media.file_size = info.get("file_size")
-                    media.caption = info.get("caption")
+                    media.file_id = new_info["file_id"]
+                    media.mime_type = new_info.get("mime_type")
+                    media.file_size = new_info.get("file_size")
+                    media.caption = new_info.get("caption")
                     media.original_message_id = msg_id
                     media.original_chat_id = chat_id
-                    media.collected_at = info.get("collected_at", datetime.utcnow())
-                    db.commit()
-                    db.refresh(media)
+                    media.collected_at = new_info.get("collected_at", datetime.utcnow())
+                    await db.commit()
                     logging.info(
                         f"[UPDATE] file_id atualizado para {media.file_unique_id}"
                     )
-                return media
-
-        return await loop.run_in_executor(None, sync_db_update, new_info)
+        return media
@@ -1,118 +1,424 @@
-from sqlalchemy.orm import Session, joinedload
-from app.models.database import AutomationModel, Chat
+from collections import defaultdict
+from datetime import datetime, time
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from app.models.database import (
+    AutomationModel,
+    Chat,
+    RewriteRule,
+    automation_destinations,
+    automation_send_sessions,
+    automation_sources,
+)
 
 # ---------------------------
 # AUTOMATION
 # ---------------------------
 
 
-def create_automation(
-    db: Session,
+def _with_relationships(query):
+    """Aplica o carregamento antecipado de origens, destinos e sessão."""
+    return query.options(
+        selectinload(AutomationModel.source_channels),
+        selectinload(AutomationModel.destination_channels),
+        selectinload(AutomationModel.send_sessions),
+        selectinload(AutomationModel.rewrite_rules),
+        joinedload(AutomationModel.session),
+    )
+
+
+def _insert_ignoring_conflicts(db: AsyncSession, table, index_elements):
+    """INSERT ... ON CONFLICT DO NOTHING no dialeto do banco em uso."""
+    # Imports tardios: só o dialeto em uso é carregado
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+        return sqlite_insert(table).on_conflict_do_nothing(
+            index_elements=index_elements
+        )
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+        return pg_insert(table).on_conflict_do_nothing(index_elements=index_elements)
+    return insert(table)
+
+
+async def ensure_chats(db: AsyncSession, chat_ids: list[str]):
+    """
+    Garante que todos os chats existem: um único SELECT ... IN para os já
+    cadastrados e um INSERT em lote apenas para os que faltam.
+    """
+    if not chat_ids:
+        return
+    result = await db.execute(select(Chat.chat_id).where(Chat.chat_id.in_(chat_ids)))
+    existing = set(result.scalars().all())
+    missing = [chat_id for chat_id in chat_ids if chat_id not in existing]
+    if missing:
+        await db.execute(
+            _insert_ignoring_conflicts(db, Chat.__table__, ["chat_id"]),
+            [{"chat_id": chat_id} for chat_id in missing],
+        )
+
+
+async def set_send_sessions(
+    db: AsyncSession, automation_id: int, session_ids: list[int], replace: bool
+):
+    """Grava o pool de envio da automação (substituindo o atual com replace)."""
+    if replace:
+        await db.execute(
+            delete(automation_send_sessions).where(
+                automation_send_sessions.c.automation_id == automation_id
+            )
+        )
+    session_ids = list(dict.fromkeys(session_ids))
+    if session_ids:
+        await db.execute(
+            insert(automation_send_sessions),
+            [
+                {"automation_id": automation_id, "session_id": session_id}
+                for session_id in session_ids
+            ],
+        )
+
+
+async def create_automation(db: AsyncSession, name: str, session_id: int, **kwargs):
+    """
+    Cria uma automação e adiciona canais de origem e destino.
+    """
+    automation_id = await add_automation(db, name, session_id, **kwargs)
+    await db.commit()
+    return await get_automation(db, automation_id)
+
+
+async def add_automation(
+    db: AsyncSession,
     name: str,
     session_id: int,
     caption: str = None,
     source_chats: list[str] | None = None,
     destination_chats: list[str] | None = None,
-):
+    send_session_ids: list[int] | None = None,
+    delivery_delay_seconds: int = 0,
+    post_at: time | None = None,
+    dedup_content: bool = False,
+    rewrite_rules: list[dict] | None = None,
+) -> int:
     """
-    Cria uma automação e adiciona canais de origem e destino.
+    Insere a automação com origens, destinos, pool de envio e regras de
+    reescrita sem fazer commit (quem chama decide a transação). Retorna o id.
     """
+    # Remove duplicatas preservando a ordem informada
+    source_chats = list(dict.fromkeys(source_chats or []))
+    destination_chats = list(dict.fromkeys(destination_chats or []))
+
+    await ensure_chats(db, list(dict.fromkeys(source_chats + destination_chats)))
+
     automation = AutomationModel(
         name=name,
         session_id=session_id,
         caption=caption,
+        delivery_delay_seconds=delivery_delay_seconds,
+        post_at=post_at,
+        dedup_content=dedup_content,
         is_active=False,
     )
+    db.add(automation)
+    await db.flush()
 
-    # Adiciona canais de origem
+    # Associações de origem e destino inseridas em lote
     if source_chats:
-        for chat_id in source_chats:
-            chat = db.query(Chat).filter(Chat.chat_id == chat_id).first()
-            if not chat:
-                chat = Chat(chat_id=chat_id)
-                db.add(chat)
-            automation.source_channels.append(chat)
-
-    # Adiciona canais de destino
+        await db.execute(
+            insert(automation_sources),
+            [
+                {"automation_id": automation.id, "chat_id": chat_id}
+                for chat_id in source_chats
+            ],
+        )
     if destination_chats:
-        for chat_id in destination_chats:
-            chat = db.query(Chat).filter(Chat.chat_id == chat_id).first()
-            if not chat:
-                chat = Chat(chat_id=chat_id)
-                db.add(chat)
-            automation.destination_channels.append(chat)
+        await db.execute(
+            insert(automation_destinations),
+            [
+                {"automation_id": automation.id, "chat_id": chat_id}
+                for chat_id in destination_chats
+            ],
+        )
+    await set_send_sessions(
+        db,
+        automation.id,
+        [sid for sid in send_session_ids or [] if sid != session_id],
+        replace=False,
+    )
+    await _insert_rewrite_rules(db, automation.id, rewrite_rules)
+    return automation.id
 
-    db.add(automation)
-    db.commit()
-    db.refresh(automation)
-    return automation
 
+async def get_automations(
+    db: AsyncSession, after_id: int | None = None, limit: int | None = None
+):
+    """
+    Retorna as automações com relacionamentos pré-carregados.
+    Origens e destinos são carregados em consultas IN separadas (selectin),
+    evitando o produto cartesiano origens x destinos de um único JOIN.
+    """
+    query = _with_relationships(select(AutomationModel)).order_by(AutomationModel.id)
+    if after_id is not None:
+        query = query.where(AutomationModel.id > after_id)
+    if limit:
+        query = query.limit(limit)
+    result = await db.execute(query)
+    return result.scalars().all()
+
+
+AUTOMATION_LIST_FIELDS = (
+    "id",
+    "name",
+    "source_chats",
+    "destination_chats",
+    "session_id",
+    "is_active",
+    "created_at",
+    "updated_at",
+    "caption",
+    "send_session_ids",
+    "delivery_delay_seconds",
+    "post_at",
+    "dedup_content",
+)
 
-def get_automations(db: Session):
+# Campos de lista lidos direto das tabelas de associação: (tabela, coluna)
+_CHAT_LIST_TABLES = {
+    "source_chats": (automation_sources, "chat_id"),
+    "destination_chats": (automation_destinations, "chat_id"),
+    "send_session_ids": (automation_send_sessions, "session_id"),
+}
+
+_IN_BATCH_SIZE = 500
+
+# Campos que aceitam None em update/patch (quem chama só os repassa quando
+# vieram na requisição); nos demais, None significa "não alterar"
+NULLABLE_FIELDS = {"post_at"}
+
+
+async def list_automations_page(
+    db: AsyncSession,
+    after_id: int | None = None,
+    limit: int | None = None,
+    fields: list[str] | None = None,
+) -> list[dict]:
     """
-    Retorna todas as automações com relacionamentos pré-carregados.
+    Listagem paginada por chave (id > after_id) com projeção de campos.
+    Retorna dicionários prontos para serialização: as colunas escalares vêm
+    de um único SELECT e os chat_ids de origem/destino são lidos direto das
+    tabelas de associação em lotes IN, sem instanciar objetos ORM.
     """
-    return (
-        db.query(AutomationModel)
-        .options(
-            joinedload(AutomationModel.source_channels),
-            joinedload(AutomationModel.destination_channels),
-            joinedload(AutomationModel.session),
-        )
-        .all()
-    )
+    fields = [f for f in AUTOMATION_LIST_FIELDS if not fields or f in fields]
+    columns = [
+        getattr(AutomationModel, f) for f in fields if f not in _CHAT_LIST_TABLES
+    ]
+    if "id" not in fields:
+        columns.insert(0, AutomationModel.id)  # Necessário para o cursor
+
+    query = select(*columns).order_by(AutomationModel.id)
+    if after_id is not None:
+        query = query.where(AutomationModel.id > after_id)
+    if limit:
+        query = query.limit(limit)
+    items = [dict(row._mapping) for row in await db.execute(query)]
+
+    ids = [item["id"] for item in items]
+    for field, (table, column) in _CHAT_LIST_TABLES.items():
+        if field not in fields:
+            continue
+        chats_by_automation = defaultdict(list)
+        for start in range(0, len(ids), _IN_BATCH_SIZE):
+            result = await db.execute(
+                select(table.c.automation_id, table.c[column])
+                .where(table.c.automation_id.in_(ids[start : start + _IN_BATCH_SIZE]))
+                .order_by(table.c.id)
+            )
+            for automation_id, chat_id in result:
+                chats_by_automation[automation_id].append(chat_id)
+        for item in items:
+            item[field] = chats_by_automation.get(item["id"], [])
 
+    # Mantém a ordem de campos do schema (id sempre presente para o cursor)
+    return [{"id": item["id"], **{f: item[f] for f in fields}} for item in items]
 
-def set_automation_status(db: Session, automation_id: int, is_active: bool):
+
+async def set_automation_status(db: AsyncSession, automation_id: int, is_active: bool):
     """
     Ativa ou desativa a automação e pré-carrega relacionamentos.
     """
-    automation = (
-        db.query(AutomationModel)
-        .options(
-            joinedload(AutomationModel.source_channels),
-            joinedload(AutomationModel.destination_channels),
-            joinedload(AutomationModel.session),
-        )
-        .filter(AutomationModel.id == automation_id)
-        .first()
-    )
+    automation = await get_automation(db, automation_id)
     if not automation:
         return None
 
     automation.is_active = is_active
-    db.commit()
-    db.refresh(automation)
+    await db.commit()
     return automation
 
 
-def get_automation(db: Session, automation_id: int):
-    return db.query(AutomationModel).filter(AutomationModel.id == automation_id).first()
+async def set_automations_status(
+    db: AsyncSession, automation_ids: list[int], is_active: bool
+) -> dict[int, AutomationModel]:
+    """
+    Ativa ou desativa várias automações com um único SELECT ... IN e um único
+    commit. Retorna as encontradas por id (as inexistentes ficam de fora).
+    """
+    automations = await get_automations_by_ids(db, automation_ids)
+    for automation in automations.values():
+        automation.is_active = is_active
+    await db.commit()
+    return automations
 
 
-def update_automation(db: Session, automation_id: int, **kwargs):
-    automation = (
-        db.query(AutomationModel).filter(AutomationModel.id == automation_id).first()
+async def get_automations_by_ids(
+    db: AsyncSession, automation_ids: list[int]
+) -> dict[int, AutomationModel]:
+    """Automações com relacionamentos pré-carregados, indexadas por id."""
+    if not automation_ids:
+        return {}
+    result = await db.execute(
+        _with_relationships(select(AutomationModel))
+        .filter(AutomationModel.id.in_(set(automation_ids)))
+        .execution_options(populate_existing=True)
     )
+    return {automation.id: automation for automation in result.scalars().unique()}
+
+
+async def get_automation(db: AsyncSession, automation_id: int):
+    """
+    Retorna a automação com origens, destinos e sessão pré-carregados.
+    """
+    result = await db.execute(
+        _with_relationships(select(AutomationModel))
+        .filter(AutomationModel.id == automation_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
+
+
+async def update_automation(
+    db: AsyncSession,
+    automation_id: int,
+    send_session_ids: list[int] | None = None,
+    **kwargs,
+):
+    automation = await get_automation(db, automation_id)
     if not automation:
         return None
 
     for key, value in kwargs.items():
-        if hasattr(automation, key) and value is not None:
+        if hasattr(automation, key) and (value is not None or key in NULLABLE_FIELDS):
+            setattr(automation, key, value)
+
+    if send_session_ids is not None:
+        await set_send_sessions(
+            db,
+            automation_id,
+            [sid for sid in send_session_ids if sid != automation.session_id],
+            replace=True,
+        )
+        await db.commit()
+        return await get_automation(db, automation_id)
+
+    await db.commit()
+    return automation
+
+
+async def patch_automation(
+    db: AsyncSession,
+    automation_id: int,
+    add_source_chats: list[str] | None = None,
+    remove_source_chats: list[str] | None = None,
+    add_destination_chats: list[str] | None = None,
+    remove_destination_chats: list[str] | None = None,
+    **kwargs,
+):
+    """
+    Adiciona/remove origens e destinos e atualiza campos simples em uma única
+    transação. Remoções são aplicadas antes das adições.
+    """
+    if not await db.get(AutomationModel, automation_id):
+        return None
+
+    for table, chat_ids in (
+        (automation_sources, remove_source_chats),
+        (automation_destinations, remove_destination_chats),
+    ):
+        if chat_ids:
+            await db.execute(
+                delete(table).where(
+                    table.c.automation_id == automation_id,
+                    table.c.chat_id.in_(chat_ids),
+                )
+            )
+
+    add_source_chats = list(dict.fromkeys(add_source_chats or []))
+    add_destination_chats = list(dict.fromkeys(add_destination_chats or []))
+    await ensure_chats(
+        db, list(dict.fromkeys(add_source_chats + add_destination_chats))
+    )
+    for table, chat_ids in (
+        (automation_sources, add_source_chats),
+        (automation_destinations, add_destination_chats),
+    ):
+        if chat_ids:
+            await db.execute(
+                _insert_ignoring_conflicts(db, table, ["automation_id", "chat_id"]),
+                [
+                    {"automation_id": automation_id, "chat_id": chat_id}
+                    for chat_id in chat_ids
+                ],
+            )
+
+    automation = await get_automation(db, automation_id)
+    for key, value in kwargs.items():
+        if hasattr(automation, key) and (value is not None or key in NULLABLE_FIELDS):
             setattr(automation, key, value)
+    automation.updated_at = datetime.utcnow()
 
-    db.commit()
-    db.refresh(automation)
+    await db.commit()
     return automation
 
 
-def delete_automation(db: Session, automation_id: int):
-    automation = (
-        db.query(AutomationModel).filter(AutomationModel.id == automation_id).first()
+async def _insert_rewrite_rules(
+    db: AsyncSession, automation_id: int, rules: list[dict] | None
+):
+    if rules:
+        await db.execute(
+            insert(RewriteRule),
+            [
+                {**rule, "automation_id": automation_id, "position": position}
+                for position, rule in enumerate(rules)
+            ],
+        )
+
+
+async def set_rewrite_rules(db: AsyncSession, automation_id: int, rules: list[dict]):
+    """Substitui as regras de reescrita da automação, mantendo a ordem informada."""
+    await db.execute(
+        delete(RewriteRule).where(RewriteRule.automation_id == automation_id)
     )
+    await _insert_rewrite_rules(db, automation_id, rules)
+    await db.commit()
+    return await get_automation(db, automation_id)
+
+
+async def delete_automation(db: AsyncSession, automation_id: int):
+    automation = await get_automation(db, automation_id)
     if not automation:
         return False
 
-    db.delete(automation)
-    db.commit()
+    await db.delete(automation)
+    await db.commit()
     return True
+
+
+async def delete_automations(db: AsyncSession, automations: list[AutomationModel]):
+    """Remove as automações (já carregadas) em uma única transação."""
+    for automation in automations:
+        await db.delete(automation)
+    await db.commit()
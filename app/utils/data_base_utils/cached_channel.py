@@ -1,4 +1,5 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.database import CachedChannel
 
 # ---------------------------
@@ -6,8 +7,8 @@ from app.models.database import CachedChannel
 # ---------------------------
 
 
-def create_cached_channel(
-    db: Session,
+async def create_cached_channel(
+    db: AsyncSession,
     session_id: int,
     channel_id: str,
     title: str = None,
@@ -26,21 +27,29 @@ def create_cached_channel(
         photo_url=photo_url,
     )
     db.add(cached)
-    db.commit()
-    db.refresh(cached)
+    await db.commit()
+    await db.refresh(cached)
     return cached
 
 
-def get_cached_channels(db: Session):
-    return db.query(CachedChannel).all()
+async def get_cached_channels(db: AsyncSession):
+    return (await db.execute(select(CachedChannel))).scalars().all()
 
 
-def get_cached_channel(db: Session, cached_id: int):
-    return db.query(CachedChannel).filter(CachedChannel.id == cached_id).first()
+async def get_cached_channel(db: AsyncSession, cached_id: int):
+    return (
+        (await db.execute(select(CachedChannel).filter(CachedChannel.id == cached_id)))
+        .scalars()
+        .first()
+    )
 
 
-def update_cached_channel(db: Session, cached_id: int, **kwargs):
-    cached = db.query(CachedChannel).filter(CachedChannel.id == cached_id).first()
+async def update_cached_channel(db: AsyncSession, cached_id: int, **kwargs):
+    cached = (
+        (await db.execute(select(CachedChannel).filter(CachedChannel.id == cached_id)))
+        .scalars()
+        .first()
+    )
     if not cached:
         return None
 
@@ -48,16 +57,20 @@ def update_cached_channel(db: Session, cached_id: int, **kwargs):
         if hasattr(cached, key) and value is not None:
             setattr(cached, key, value)
 
-    db.commit()
-    db.refresh(cached)
+    await db.commit()
+    await db.refresh(cached)
     return cached
 
 
-def delete_cached_channel(db: Session, cached_id: int):
-    cached = db.query(CachedChannel).filter(CachedChannel.id == cached_id).first()
+async def delete_cached_channel(db: AsyncSession, cached_id: int):
+    cached = (
+        (await db.execute(select(CachedChannel).filter(CachedChannel.id == cached_id)))
+        .scalars()
+        .first()
+    )
     if not cached:
         return False
 
-    db.delete(cached)
-    db.commit()
+    await db.delete(cached)
+    await db.commit()
     return True
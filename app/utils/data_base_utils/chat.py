@@ -1,4 +1,5 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.database import Chat
 
 # ---------------------------
@@ -6,24 +7,26 @@ from app.models.database import Chat
 # ---------------------------
 
 
-def create_chat(db: Session, chat_id: str, title: str = None, is_channel: bool = False):
+async def create_chat(
+    db: AsyncSession, chat_id: str, title: str = None, is_channel: bool = False
+):
     chat = Chat(chat_id=chat_id, title=title, is_channel=is_channel)
     db.add(chat)
-    db.commit()
-    db.refresh(chat)
+    await db.commit()
+    await db.refresh(chat)
     return chat
 
 
-def get_chats(db: Session):
-    return db.query(Chat).all()
+async def get_chats(db: AsyncSession):
+    return (await db.execute(select(Chat))).scalars().all()
 
 
-def get_chat(db: Session, chat_id: int):
-    return db.query(Chat).filter(Chat.id == chat_id).first()
+async def get_chat(db: AsyncSession, chat_id: int):
+    return (await db.execute(select(Chat).filter(Chat.id == chat_id))).scalars().first()
 
 
-def update_chat(db: Session, chat_id: int, **kwargs):
-    chat = db.query(Chat).filter(Chat.id == chat_id).first()
+async def update_chat(db: AsyncSession, chat_id: int, **kwargs):
+    chat = (await db.execute(select(Chat).filter(Chat.id == chat_id))).scalars().first()
     if not chat:
         return None
 
@@ -31,18 +34,16 @@ def update_chat(db: Session, chat_id: int, **kwargs):
         if hasattr(chat, key) and value is not None:
             setattr(chat, key, value)
 
-    db.commit()
-    db.refresh(chat)
+    await db.commit()
+    await db.refresh(chat)
     return chat
 
 
-def delete_chat(db: Session, chat_id: int):
-    chat = db.query(Chat).filter(Chat.id == chat_id).first()
+async def delete_chat(db: AsyncSession, chat_id: int):
+    chat = (await db.execute(select(Chat).filter(Chat.id == chat_id))).scalars().first()
     if not chat:
         return False
 
-    db.delete(chat)
-    db.commit()
+    await db.delete(chat)
+    await db.commit()
     return True
-
-
@@ -1,14 +1,14 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.database import CollectedMedia
 
-
 # ---------------------------
 # COLLECTED MEDIA
 # ---------------------------
 
 
-def create_collected_media(
-    db: Session,
+async def create_collected_media(
+    db: AsyncSession,
     file_unique_id: str,
     file_id: str,
     media_type: str,
@@ -29,21 +29,29 @@ def create_collected_media(
         caption=caption,
     )
     db.add(media)
-    db.commit()
-    db.refresh(media)
+    await db.commit()
+    await db.refresh(media)
     return media
 
 
-def get_collected_media(db: Session):
-    return db.query(CollectedMedia).all()
+async def get_collected_media(db: AsyncSession):
+    return (await db.execute(select(CollectedMedia))).scalars().all()
 
 
-def get_media(db: Session, media_id: int):
-    return db.query(CollectedMedia).filter(CollectedMedia.id == media_id).first()
+async def get_media(db: AsyncSession, media_id: int):
+    return (
+        (await db.execute(select(CollectedMedia).filter(CollectedMedia.id == media_id)))
+        .scalars()
+        .first()
+    )
 
 
-def update_collected_media(db: Session, media_id: int, **kwargs):
-    media = db.query(CollectedMedia).filter(CollectedMedia.id == media_id).first()
+async def update_collected_media(db: AsyncSession, media_id: int, **kwargs):
+    media = (
+        (await db.execute(select(CollectedMedia).filter(CollectedMedia.id == media_id)))
+        .scalars()
+        .first()
+    )
     if not media:
         return None
 
@@ -51,16 +59,20 @@ def update_collected_media(db: Session, media_id: int, **kwargs):
         if hasattr(media, key) and value is not None:
             setattr(media, key, value)
 
-    db.commit()
-    db.refresh(media)
+    await db.commit()
+    await db.refresh(media)
     return media
 
 
-def delete_collected_media(db: Session, media_id: int):
-    media = db.query(CollectedMedia).filter(CollectedMedia.id == media_id).first()
+async def delete_collected_media(db: AsyncSession, media_id: int):
+    media = (
+        (await db.execute(select(CollectedMedia).filter(CollectedMedia.id == media_id)))
+        .scalars()
+        .first()
+    )
     if not media:
         return False
 
-    db.delete(media)
-    db.commit()
+    await db.delete(media)
+    await db.commit()
     return True
@@ -0,0 +1,359 @@
+import csv
+import io
+import json
+from collections import defaultdict
+from datetime import date, datetime, time
+from typing import Any, AsyncIterator, Dict, List
+
+from sqlalchemy import Boolean, Date, DateTime, Integer, Time, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.database import (
+    AutomationModel,
+    CollectedMedia,
+    Log,
+    RewriteRule,
+    UserSession,
+)
+from app.utils.data_base_utils.automation import (
+    AUTOMATION_LIST_FIELDS,
+    _insert_ignoring_conflicts,
+    add_automation,
+    ensure_chats,
+    list_automations_page,
+)
+
+# ---------------------------
+# EXPORT / IMPORT
+# ---------------------------
+
+FORMATS = ("ndjson", "csv")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Tabelas exportadas linha a linha: dataset -> (tabela, colunas de conflito).
+# Na importação o id exportado é descartado (o banco de destino gera o seu,
+# sem colidir com linhas existentes nem atrasar a sequência do PostgreSQL):
+# mídias já existentes são reconhecidas pelo file_unique_id; logs não têm
+# chave natural e são sempre acrescentados
+_TABLES = {
+    "media": (CollectedMedia.__table__, ["file_unique_id"]),
+    "logs": (Log.__table__, None),
+}
+DATASETS = (*_TABLES, "automations")
+
+# Campos da automação que são listas (JSON dentro de uma célula no CSV)
+_AUTOMATION_LIST_FIELDS = {
+    "source_chats",
+    "destination_chats",
+    "send_session_ids",
+    "rewrite_rules",
+}
+_REWRITE_RULE_FIELDS = ("kind", "pattern", "replacement", "ignore_case")
+# Gerados pelo banco na importação (a automação importada começa parada)
+_AUTOMATION_IMPORT_SKIP = {"id", "is_active", "created_at", "updated_at"}
+
+
+class ImportConflictError(Exception):
+    """Lote rejeitado pelo banco (restrição violada); os anteriores ficam gravados."""
+
+    def __init__(self, batch: int, counts: Dict[str, int], error: Exception):
+        super().__init__(f"Lote {batch} rejeitado pelo banco: {error}")
+        self.batch = batch
+        self.counts = counts
+
+
+def dataset_columns(dataset: str) -> List[str]:
+    if dataset == "automations":
+        return [*AUTOMATION_LIST_FIELDS, "rewrite_rules"]
+    return [column.name for column in _TABLES[dataset][0].columns]
+
+
+# =========================
+# LEITURA EM LOTES
+# =========================
+async def iter_batches(
+    db: AsyncSession, dataset: str, batch_size: int
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Linhas do dataset em lotes de `batch_size` dicionários. As tabelas são
+    lidas com cursor do lado do servidor (stream + yield_per), sem carregar
+    a tabela inteira; as automações, por páginas de chave (id > último).
+    """
+    if dataset == "automations":
+        async for batch in _automation_batches(db, batch_size):
+            yield batch
+        return
+
+    table = _TABLES[dataset][0]
+    result = await db.stream(
+        select(table).order_by(table.c.id).execution_options(yield_per=batch_size)
+    )
+    async for rows in result.mappings().partitions():
+        yield [dict(row) for row in rows]
+
+
+async def _automation_batches(db: AsyncSession, batch_size: int):
+    after_id = None
+    while True:
+        items = await list_automations_page(db, after_id, batch_size)
+        if not items:
+            return
+        rules = defaultdict(list)
+        result = await db.execute(
+            select(RewriteRule.automation_id, *_rule_columns())
+            .where(RewriteRule.automation_id.in_([item["id"] for item in items]))
+            .order_by(RewriteRule.automation_id, RewriteRule.position)
+        )
+        for automation_id, *values in result:
+            rules[automation_id].append(dict(zip(_REWRITE_RULE_FIELDS, values)))
+        for item in items:
+            item["rewrite_rules"] = rules.get(item["id"], [])
+        yield items
+        after_id = items[-1]["id"]
+
+
+def _rule_columns():
+    return [getattr(RewriteRule, field) for field in _REWRITE_RULE_FIELDS]
+
+
+# =========================
+# SERIALIZAÇÃO
+# =========================
+def _json_default(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False, default=_json_default)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
+
+
+async def encode(
+    batches: AsyncIterator[List[Dict[str, Any]]], fmt: str, columns: List[str]
+) -> AsyncIterator[str]:
+    """Um pedaço de texto por lote, em NDJSON ou CSV (com cabeçalho)."""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(columns)
+        yield buffer.getvalue()
+        async for batch in batches:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(
+                [_csv_value(row.get(column)) for column in columns] for row in batch
+            )
+            yield buffer.getvalue()
+        return
+
+    async for batch in batches:
+        yield "".join(
+            json.dumps(
+                {column: row.get(column) for column in columns},
+                ensure_ascii=False,
+                default=_json_default,
+            )
+            + "\n"
+            for row in batch
+        )
+
+
+# =========================
+# DESSERIALIZAÇÃO
+# =========================
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Linhas de um stream de bytes em pedaços (corpo da requisição, arquivo)."""
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8") + "\n"
+    if pending:
+        yield pending.decode("utf-8")
+
+
+async def decode(lines: AsyncIterator[str], fmt: str) -> AsyncIterator[Dict]:
+    """Registros de NDJSON ou CSV, um por vez."""
+    if fmt == "ndjson":
+        async for line in lines:
+            if line.strip():
+                yield json.loads(line)
+        return
+
+    header = None
+    record = ""
+    async for line in lines:
+        # Campo entre aspas com quebra de linha: o registro continua na
+        # próxima linha enquanto o número de aspas for ímpar
+        record += line
+        if record.count('"') % 2:
+            continue
+        row = next(csv.reader([record]), None)
+        record = ""
+        if not row:
+            continue
+        if header is None:
+            header = row
+            continue
+        yield {
+            column: value
+            for column, value in zip(header, row)
+            if value != ""  # Célula vazia = nulo
+        }
+
+
+def _converter(column_type):
+    if isinstance(column_type, Boolean):
+        return lambda v: v if isinstance(v, bool) else str(v).lower() in ("true", "1")
+    if isinstance(column_type, Integer):
+        return int
+    if isinstance(column_type, DateTime):
+        return lambda v: v if isinstance(v, datetime) else datetime.fromisoformat(v)
+    if isinstance(column_type, Date):
+        return lambda v: v if isinstance(v, date) else date.fromisoformat(v)
+    if isinstance(column_type, Time):
+        return lambda v: v if isinstance(v, time) else time.fromisoformat(v)
+    return str
+
+
+def _coerce(table, record: Dict[str, Any]) -> Dict[str, Any]:
+    """Converte os valores (texto no CSV, ISO 8601 no NDJSON) para os tipos da tabela."""
+    row = {}
+    for column in table.columns:
+        value = record.get(column.name)
+        if value is not None:
+            value = _converter(column.type)(value)
+        if value is not None or column.name in record:
+            row[column.name] = value
+    return row
+
+
+# =========================
+# IMPORTAÇÃO
+# =========================
+async def import_records(
+    db: AsyncSession, dataset: str, records: AsyncIterator[Dict], batch_size: int
+) -> Dict[str, int]:
+    """
+    Grava os registros em lotes de `batch_size`: um INSERT com executemany e
+    um commit por lote. Mídias já existentes (mesmo file_unique_id) e
+    automações já existentes (mesma sessão e nome) são ignoradas; logs são
+    sempre acrescentados. Um lote que viola restrições do banco é desfeito e
+    interrompe a importação com ImportConflictError.
+    """
+    counts = {"rows": 0, "batches": 0, "skipped": 0}
+    batch = []
+
+    async def flush():
+        try:
+            if dataset == "automations":
+                counts["skipped"] += await _import_automations(db, batch)
+            else:
+                await _import_table_rows(db, dataset, batch)
+            await db.commit()
+        except IntegrityError as e:
+            await db.rollback()
+            raise ImportConflictError(counts["batches"] + 1, dict(counts), e.orig)
+        counts["rows"] += len(batch)
+        counts["batches"] += 1
+        batch.clear()
+
+    async for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+    return counts
+
+
+async def _import_table_rows(db: AsyncSession, dataset: str, records: List[Dict]):
+    table, conflict_columns = _TABLES[dataset]
+    rows = [_coerce(table, record) for record in records]
+    for row in rows:
+        row.pop("id", None)
+    if dataset == "media":
+        # original_chat_id referencia chats: cria os que faltam
+        await ensure_chats(
+            db,
+            list(
+                dict.fromkeys(
+                    row["original_chat_id"]
+                    for row in rows
+                    if row.get("original_chat_id")
+                )
+            ),
+        )
+    # executemany exige as mesmas chaves em todas as linhas
+    keys = {key for row in rows for key in row}
+    statement = (
+        _insert_ignoring_conflicts(db, table, conflict_columns)
+        if conflict_columns
+        else insert(table)
+    )
+    await db.execute(statement, [{key: row.get(key) for key in keys} for row in rows])
+
+
+async def _import_automations(db: AsyncSession, records: List[Dict]) -> int:
+    """
+    Cria as automações do lote. São puladas as de sessões inexistentes e as
+    que já existem (mesma sessão e nome), então reimportar o mesmo arquivo
+    não duplica automações.
+    """
+    table = AutomationModel.__table__
+    items = []
+    for record in records:
+        item = _coerce(table, record)
+        for field in _AUTOMATION_LIST_FIELDS:
+            value = record.get(field) or []
+            item[field] = json.loads(value) if isinstance(value, str) else value
+        items.append(item)
+
+    session_ids = {item.get("session_id") for item in items}
+    session_ids.update(sid for item in items for sid in item["send_session_ids"])
+    result = await db.execute(
+        select(UserSession.id).where(UserSession.id.in_(session_ids))
+    )
+    existing = set(result.scalars().all())
+    result = await db.execute(
+        select(AutomationModel.session_id, AutomationModel.name).where(
+            AutomationModel.session_id.in_(existing),
+            AutomationModel.name.in_({item.get("name") for item in items}),
+        )
+    )
+    seen = set(result.tuples().all())
+
+    skipped = 0
+    for item in items:
+        key = (item.get("session_id"), item.get("name"))
+        if key[0] not in existing or key in seen:
+            skipped += 1
+            continue
+        seen.add(key)
+        fields = {
+            key: value
+            for key, value in item.items()
+            if key not in _AUTOMATION_IMPORT_SKIP and value is not None
+        }
+        fields["source_chats"] = [str(chat) for chat in fields["source_chats"]]
+        fields["destination_chats"] = [
+            str(chat) for chat in fields["destination_chats"]
+        ]
+        fields["send_session_ids"] = [
+            sid for sid in fields["send_session_ids"] if sid in existing
+        ]
+        fields["rewrite_rules"] = [
+            {key: rule[key] for key in _REWRITE_RULE_FIELDS if key in rule}
+            for rule in fields["rewrite_rules"]
+        ]
+        await add_automation(db, **fields)
+    return skipped
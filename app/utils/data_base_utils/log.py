@@ -1,34 +1,36 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.database import Log
 
-
 # ---------------------------
 # LOG
 # ---------------------------
 
 
-def create_log(db: Session, level: str, message: str, source: str = None):
+async def create_log(db: AsyncSession, level: str, message: str, source: str = None):
     log = Log(
         level=level,
         message=message,
         source=source,
     )
     db.add(log)
-    db.commit()
-    db.refresh(log)
+    await db.commit()
+    await db.refresh(log)
     return log
 
 
-def get_logs(db: Session):
-    return db.query(Log).order_by(Log.timestamp.desc()).all()
+async def get_logs(db: AsyncSession):
+    return (
+        (await db.execute(select(Log).order_by(Log.timestamp.desc()))).scalars().all()
+    )
 
 
-def get_log(db: Session, log_id: int):
-    return db.query(Log).filter(Log.id == log_id).first()
+async def get_log(db: AsyncSession, log_id: int):
+    return (await db.execute(select(Log).filter(Log.id == log_id))).scalars().first()
 
 
-def update_log(db: Session, log_id: int, **kwargs):
-    log = db.query(Log).filter(Log.id == log_id).first()
+async def update_log(db: AsyncSession, log_id: int, **kwargs):
+    log = (await db.execute(select(Log).filter(Log.id == log_id))).scalars().first()
     if not log:
         return None
 
@@ -36,16 +38,16 @@ def update_log(db: Session, log_id: int, **kwargs):
         if hasattr(log, key) and value is not None:
             setattr(log, key, value)
 
-    db.commit()
-    db.refresh(log)
+    await db.commit()
+    await db.refresh(log)
     return log
 
 
-def delete_log(db: Session, log_id: int):
-    log = db.query(Log).filter(Log.id == log_id).first()
+async def delete_log(db: AsyncSession, log_id: int):
+    log = (await db.execute(select(Log).filter(Log.id == log_id))).scalars().first()
     if not log:
         return False
 
-    db.delete(log)
-    db.commit()
+    await db.delete(log)
+    await db.commit()
     return True
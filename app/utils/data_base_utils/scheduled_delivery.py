@@ -0,0 +1,70 @@
+from datetime import datetime
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.database import ScheduledDelivery
+from app.utils.data_base_utils.automation import _insert_ignoring_conflicts
+
+# ---------------------------
+# SCHEDULED DELIVERY
+# ---------------------------
+
+
+async def add_scheduled_deliveries(db: AsyncSession, rows: list[dict]):
+    """
+    Grava entregas agendadas em lote (automation_id, chat_id, message_id,
+    due_at). A mesma mensagem agendada de novo para a automação é ignorada.
+    """
+    if not rows:
+        return
+    await db.execute(
+        _insert_ignoring_conflicts(
+            db,
+            ScheduledDelivery.__table__,
+            ["automation_id", "chat_id", "message_id"],
+        ),
+        rows,
+    )
+    await db.commit()
+
+
+async def get_next_deliveries(
+    db: AsyncSession, automation_ids: list[int], limit: int
+) -> list[tuple[datetime, int, str, int]]:
+    """Próximas entregas das automações informadas, da mais antiga à mais nova."""
+    if not automation_ids:
+        return []
+    result = await db.execute(
+        select(
+            ScheduledDelivery.due_at,
+            ScheduledDelivery.automation_id,
+            ScheduledDelivery.chat_id,
+            ScheduledDelivery.message_id,
+        )
+        .where(ScheduledDelivery.automation_id.in_(automation_ids))
+        .order_by(ScheduledDelivery.due_at, ScheduledDelivery.id)
+        .limit(limit)
+    )
+    return [tuple(row) for row in result]
+
+
+async def delete_scheduled_deliveries(
+    db: AsyncSession, automation_id: int, chat_id: str, message_ids: list[int]
+):
+    await db.execute(
+        delete(ScheduledDelivery).where(
+            ScheduledDelivery.automation_id == automation_id,
+            ScheduledDelivery.chat_id == chat_id,
+            ScheduledDelivery.message_id.in_(message_ids),
+        )
+    )
+    await db.commit()
+
+
+async def count_scheduled_deliveries(db: AsyncSession) -> dict[int, int]:
+    """Entregas pendentes por automação."""
+    result = await db.execute(
+        select(ScheduledDelivery.automation_id, func.count()).group_by(
+            ScheduledDelivery.automation_id
+        )
+    )
+    return dict(result.all())
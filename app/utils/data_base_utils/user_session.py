@@ -1,5 +1,6 @@
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.database import UserSession
 
 # ---------------------------
@@ -7,8 +8,8 @@ from app.models.database import UserSession
 # ---------------------------
 
 
-def create_user_session(
-    db: Session,
+async def create_user_session(
+    db: AsyncSession,
     session_file: str,
     phone_number: str = None,
     api_id: str = None,
@@ -22,21 +23,29 @@ def create_user_session(
         created_at=datetime.utcnow(),
     )
     db.add(session_data)
-    db.commit()
-    db.refresh(session_data)
+    await db.commit()
+    await db.refresh(session_data)
     return session_data
 
 
-def get_user_sessions(db: Session):
-    return db.query(UserSession).all()
+async def get_user_sessions(db: AsyncSession):
+    return (await db.execute(select(UserSession))).scalars().all()
 
 
-def get_user_session(db: Session, session_id: int):
-    return db.query(UserSession).filter(UserSession.id == session_id).first()
+async def get_user_session(db: AsyncSession, session_id: int):
+    return (
+        (await db.execute(select(UserSession).filter(UserSession.id == session_id)))
+        .scalars()
+        .first()
+    )
 
 
-def update_user_session(db: Session, session_id: int, **kwargs):
-    session = db.query(UserSession).filter(UserSession.id == session_id).first()
+async def update_user_session(db: AsyncSession, session_id: int, **kwargs):
+    session = (
+        (await db.execute(select(UserSession).filter(UserSession.id == session_id)))
+        .scalars()
+        .first()
+    )
     if not session:
         return None
 
@@ -44,16 +53,20 @@ def update_user_session(db: Session, session_id: int, **kwargs):
         if hasattr(session, key) and value is not None:
             setattr(session, key, value)
 
-    db.commit()
-    db.refresh(session)
+    await db.commit()
+    await db.refresh(session)
     return session
 
 
-def delete_user_session(db: Session, session_id: int):
-    session = db.query(UserSession).filter(UserSession.id == session_id).first()
+async def delete_user_session(db: AsyncSession, session_id: int):
+    session = (
+        (await db.execute(select(UserSession).filter(UserSession.id == session_id)))
+        .scalars()
+        .first()
+    )
     if not session:
         return False
 
-    db.delete(session)
-    db.commit()
+    await db.delete(session)
+    await db.commit()
     return True
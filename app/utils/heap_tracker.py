@@ -0,0 +1,200 @@
+import asyncio
+import gc
+import logging
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from app.utils.process_stats import current_rss_bytes
+
+# Alocações do próprio tracemalloc e do import de módulos não interessam.
+# Filtrar o resultado agrupado é bem mais barato que Snapshot.filter_traces.
+_IGNORED_FILES = {
+    tracemalloc.__file__,
+    "<frozen importlib._bootstrap>",
+    "<frozen importlib._bootstrap_external>",
+    "<unknown>",
+}
+
+
+def object_counts() -> Counter:
+    """Objetos vivos rastreados pelo GC, por tipo."""
+    return Counter(type(obj).__qualname__ for obj in gc.get_objects())
+
+
+def tasks_by_owner() -> Dict[str, Any]:
+    """
+    Tasks pendentes agrupadas por automação (tasks nomeadas
+    "automation:<id>:<tipo>") e, as demais, pela corrotina.
+    """
+    per_automation: Dict[str, Counter] = {}
+    other: Counter = Counter()
+    tasks = asyncio.all_tasks()
+    for task in tasks:
+        parts = task.get_name().split(":")
+        if len(parts) == 3 and parts[0] == "automation":
+            per_automation.setdefault(parts[1], Counter())[parts[2]] += 1
+        else:
+            coro = task.get_coro()
+            other[getattr(coro, "__qualname__", type(coro).__name__)] += 1
+    return {
+        "pending": len(tasks),
+        "per_automation": {
+            automation_id: dict(kinds)
+            for automation_id, kinds in sorted(per_automation.items())
+        },
+        "other": dict(other.most_common(20)),
+    }
+
+
+def _stat_to_dict(stat) -> Dict[str, Any]:
+    return {
+        "site": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+        "size_kb": round(stat.size / 1024, 1),
+        "size_diff_kb": round(stat.size_diff / 1024, 1),
+        "count": stat.count,
+        "count_diff": stat.count_diff,
+    }
+
+
+class HeapSnapshot:
+    __slots__ = ("snapshot", "object_counts", "taken_at", "rss_bytes")
+
+    def __init__(self):
+        self.snapshot = tracemalloc.take_snapshot()
+        self.object_counts = object_counts()
+        self.taken_at = time.time()
+        self.rss_bytes = current_rss_bytes()
+
+
+class HeapTracker:
+    """
+    Snapshots do tracemalloc sob demanda e comparação com uma base.
+    O tracemalloc só é ligado no primeiro snapshot (ele tem custo em cada
+    alocação, proporcional a `frames`) e pode ser desligado com stop().
+    Snapshots e comparações rodam em uma thread para não travar o loop.
+    """
+
+    def __init__(self):
+        self.baseline: Optional[HeapSnapshot] = None
+        self._watch_task: Optional[asyncio.Task] = None
+        self.watch_config: Optional[Dict[str, Any]] = None
+        self.last_watch_report: Optional[Dict[str, Any]] = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    async def take_baseline(self, frames: int = 1) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.baseline = await asyncio.to_thread(HeapSnapshot)
+        return {
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_kb": round(tracemalloc.get_traced_memory()[0] / 1024, 1),
+            "rss_bytes": self.baseline.rss_bytes,
+        }
+
+    def compare(
+        self,
+        previous: HeapSnapshot,
+        current: HeapSnapshot,
+        top: int = 20,
+        group_by: str = "lineno",
+    ) -> Dict[str, Any]:
+        stats = [
+            stat
+            for stat in current.snapshot.compare_to(previous.snapshot, group_by)
+            if stat.traceback[0].filename not in _IGNORED_FILES
+        ]
+        growth = current.object_counts.copy()
+        growth.subtract(previous.object_counts)
+        return {
+            "interval_s": round(current.taken_at - previous.taken_at, 1),
+            "size_diff_kb": round(sum(s.size_diff for s in stats) / 1024, 1),
+            "rss_diff_bytes": (
+                current.rss_bytes - previous.rss_bytes
+                if current.rss_bytes is not None and previous.rss_bytes is not None
+                else None
+            ),
+            "top_sites": [_stat_to_dict(stat) for stat in stats[:top]],
+            "object_growth": {
+                name: diff for name, diff in growth.most_common(top) if diff > 0
+            },
+            "object_counts": dict(current.object_counts.most_common(top)),
+        }
+
+    async def diff(
+        self, top: int = 20, group_by: str = "lineno", reset: bool = False
+    ) -> Dict[str, Any]:
+        """Compara o heap atual com a base; com reset, o atual vira a nova base."""
+        if self.baseline is None:
+            raise RuntimeError("Nenhum snapshot base; chame take_baseline() antes")
+        baseline = self.baseline
+        current = await asyncio.to_thread(HeapSnapshot)
+        report = await asyncio.to_thread(self.compare, baseline, current, top, group_by)
+        if reset:
+            self.baseline = current
+        return report
+
+    def stop(self):
+        """Desliga o tracemalloc e descarta a base."""
+        self.stop_watch()
+        self.baseline = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    # =========================
+    # MONITORAMENTO PERIÓDICO
+    # =========================
+    def start_watch(
+        self, interval: float, threshold_mb: float, top: int = 10, frames: int = 1
+    ):
+        self.stop_watch()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.watch_config = {
+            "interval_s": interval,
+            "threshold_mb": threshold_mb,
+            "top": top,
+        }
+        self._watch_task = asyncio.create_task(
+            self._watch(interval, threshold_mb * 1024 * 1024, top)
+        )
+
+    def stop_watch(self):
+        if self._watch_task and not self._watch_task.done():
+            self._watch_task.cancel()
+        self._watch_task = None
+        self.watch_config = None
+
+    async def _watch(self, interval: float, threshold_bytes: float, top: int):
+        previous = await asyncio.to_thread(HeapSnapshot)
+        while True:
+            await asyncio.sleep(interval)
+            current = await asyncio.to_thread(HeapSnapshot)
+            report = await asyncio.to_thread(self.compare, previous, current, top)
+            self.last_watch_report = report
+            previous = current
+            if report["size_diff_kb"] * 1024 >= threshold_bytes:
+                sites = ", ".join(
+                    f"{s['site'][0]} ({s['size_diff_kb']:+} KB)"
+                    for s in report["top_sites"][:3]
+                    if s["site"]
+                )
+                logging.warning(
+                    f"[HEAP] Crescimento de {report['size_diff_kb'] / 1024:.1f} MB "
+                    f"em {report['interval_s']}s. Maiores: {sites}"
+                )
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "tracing": self.tracing,
+            "baseline_at": self.baseline.taken_at if self.baseline else None,
+            "watch": self.watch_config,
+            "last_watch_report": self.last_watch_report,
+        }
+
+
+heap_tracker = HeapTracker()
@@ -0,0 +1,195 @@
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from app.config.config import settings
+
+
+class LogSubscriber:
+    """Fila limitada de um consumidor do stream de logs (ex: WebSocket)."""
+
+    def __init__(self, level: Optional[str], source: Optional[str], queue_size: int):
+        self.level = level.upper() if level else None
+        self.source = source.lower() if source else None
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0  # Entradas descartadas desde o último envio
+        # Descartes na janela atual (LOG_STREAM_DROP_WINDOW_SECONDS)
+        self._window_started = time.monotonic()
+        self._window_dropped = 0
+        self.closed = False
+
+    def matches(self, level: str, source: Optional[str]) -> bool:
+        """Aplica os filtros de nível e origem no servidor."""
+        if self.level and level != self.level:
+            return False
+        if self.source and (not source or self.source not in source.lower()):
+            return False
+        return True
+
+    def offer(self, item: Tuple[int, str]):
+        """
+        Entrega sem bloquear o produtor: se a fila estiver cheia, descarta a
+        entrada mais antiga (amostragem) e contabiliza o descarte.
+        """
+        if self.closed:
+            return
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            self.dropped += 1
+            now = time.monotonic()
+            if now - self._window_started >= settings.LOG_STREAM_DROP_WINDOW_SECONDS:
+                self._window_started = now
+                self._window_dropped = 0
+            self._window_dropped += 1
+            if self._window_dropped >= settings.LOG_STREAM_MAX_DROPPED:
+                # Lento demais de forma contínua (não só atrasos ocasionais ao
+                # longo de uma conexão longa): encerra a assinatura
+                self.close()
+                return
+        self.queue.put_nowait(item)
+
+    async def get(self) -> Optional[Tuple[int, str]]:
+        """Retorna a próxima entrada ou None se a assinatura foi encerrada."""
+        return await self.queue.get()
+
+    def close(self):
+        """Encerra a assinatura e acorda quem estiver aguardando em get()."""
+        self.closed = True
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class LogStream:
+    """
+    Ring buffer em memória com as entradas de log mais recentes e
+    distribuição das novas entradas para os assinantes conectados.
+    """
+
+    def __init__(self, buffer_size: int, queue_size: int):
+        self._buffer: Deque[Tuple[int, str, Optional[str], str]] = deque(
+            maxlen=buffer_size
+        )
+        self._queue_size = queue_size
+        self._subscribers: Set[LogSubscriber] = set()
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def publish(
+        self,
+        level: str,
+        message: str,
+        source: Optional[str] = None,
+        timestamp: Optional[datetime] = None,
+        log_id: Optional[int] = None,
+    ) -> int:
+        """Registra uma entrada no buffer e notifica os assinantes."""
+        level = level.upper()
+        timestamp = timestamp or datetime.utcnow()
+        with self._lock:
+            seq = next(self._seq)
+            # Serializa uma única vez, independente do número de assinantes
+            payload = json.dumps(
+                {
+                    "seq": seq,
+                    "id": log_id,
+                    "timestamp": timestamp.isoformat(),
+                    "level": level,
+                    "message": message,
+                    "source": source,
+                },
+                ensure_ascii=False,
+            )
+            self._buffer.append((seq, level, source, payload))
+
+        if not self._subscribers or self._loop is None:
+            return seq
+
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if running_loop is self._loop:
+            self._dispatch(seq, level, source, payload)
+        elif not self._loop.is_closed():
+            # Produtor em outra thread (ex: executor): entrega no loop principal
+            self._loop.call_soon_threadsafe(self._dispatch, seq, level, source, payload)
+        return seq
+
+    def _dispatch(self, seq: int, level: str, source: Optional[str], payload: str):
+        for subscriber in list(self._subscribers):
+            if subscriber.matches(level, source):
+                subscriber.offer((seq, payload))
+
+    def recent(
+        self,
+        level: Optional[str] = None,
+        source: Optional[str] = None,
+        limit: int = 100,
+    ) -> List[Tuple[int, str]]:
+        """Retorna as últimas entradas do buffer (mais antigas primeiro)."""
+        probe = LogSubscriber(level, source, 1)
+        with self._lock:
+            snapshot = list(self._buffer)
+        entries = [
+            (seq, payload)
+            for seq, entry_level, entry_source, payload in snapshot
+            if probe.matches(entry_level, entry_source)
+        ]
+        return entries[-limit:] if limit else []
+
+    def subscribe(
+        self, level: Optional[str] = None, source: Optional[str] = None
+    ) -> LogSubscriber:
+        self._loop = asyncio.get_running_loop()
+        subscriber = LogSubscriber(level, source, self._queue_size)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: LogSubscriber):
+        self._subscribers.discard(subscriber)
+        if not subscriber.closed:
+            subscriber.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "buffered": len(self._buffer),
+            "subscribers": len(self._subscribers),
+        }
+
+
+class LogStreamHandler(logging.Handler):
+    """Handler do logging que espelha os registros da aplicação no LogStream."""
+
+    def __init__(self, stream: LogStream, level: int = logging.INFO):
+        super().__init__(level)
+        self.stream = stream
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.stream.publish(
+                record.levelname,
+                record.getMessage(),
+                record.name,
+                datetime.utcfromtimestamp(record.created),
+            )
+        except Exception:
+            self.handleError(record)
+
+
+# Instância global compartilhada por produtores e rotas
+log_stream = LogStream(
+    buffer_size=settings.LOG_STREAM_BUFFER_SIZE,
+    queue_size=settings.LOG_STREAM_QUEUE_SIZE,
+)
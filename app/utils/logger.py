@@ -1,23 +1,27 @@
-from app.models.database import Log, SessionLocal
+from app.models.database import Log, AsyncSessionLocal
+from app.utils.log_stream import log_stream
 from datetime import datetime
 
-def db_log(level: str, message: str, source: str):
+async def db_log(level: str, message: str, source: str):
     """
     Registra uma mensagem de log no banco de dados.
     Níveis: INFO, WARNING, ERROR, DEBUG
     """
-    db = SessionLocal()
-    try:
-        log_entry = Log(
-            timestamp=datetime.utcnow(),
-            level=level.upper(),
-            message=message,
-            source=source
-        )
-        db.add(log_entry)
-        db.commit()
-    except Exception as e:
-        print(f"Falha ao registrar log no banco de dados: {e}")
-        db.rollback()
-    finally:
-        db.close()
+    log_id = None
+    timestamp = datetime.utcnow()
+    async with AsyncSessionLocal() as db:
+        try:
+            log_entry = Log(
+                timestamp=timestamp,
+                level=level.upper(),
+                message=message,
+                source=source
+            )
+            db.add(log_entry)
+            await db.commit()
+            log_id = log_entry.id
+        except Exception as e:
+            print(f"Falha ao registrar log no banco de dados: {e}")
+            await db.rollback()
+    # Publica no ring buffer para os assinantes de /ws/logs
+    log_stream.publish(level, message, source, timestamp, log_id)
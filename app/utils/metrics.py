@@ -0,0 +1,243 @@
+import bisect
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Buckets padrão (segundos) para latências de RPC e banco
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Buckets (segundos) para o atraso fim a fim, de message.date até o envio
+LAG_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 30, 60, 300, 900, 3600)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Contador monotônico. No caminho crítico custa uma soma em dicionário."""
+
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, labels: Tuple = (), amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: Tuple = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def total(self) -> float:
+        """Soma de todas as séries do contador."""
+        return sum(self._values.values())
+
+    def samples(self):
+        for labels, value in list(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Gauge(Metric):
+    """Valor instantâneo, definido diretamente ou lido de uma função no scrape."""
+
+    type = "gauge"
+
+    def __init__(
+        self,
+        name,
+        documentation,
+        labelnames=(),
+        function: Optional[Callable[[], Dict[Tuple, float]]] = None,
+        metric_type: str = "gauge",
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._function = function
+        self.type = metric_type
+
+    def set(self, labels: Tuple = (), value: float = 0):
+        self._values[labels] = value
+
+    def remove(self, labels: Tuple = ()):
+        self._values.pop(labels, None)
+
+    def samples(self):
+        values = dict(self._values)
+        if self._function is not None:
+            values.update(self._function())
+        for labels, value in values.items():
+            if value is None:
+                continue
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    """Histograma com buckets fixos (contagens não cumulativas internamente)."""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, labels: Tuple = ()):
+        series = self._series.get(labels)
+        if series is None:
+            # [contagens por bucket (+Inf no final), soma, total]
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self):
+        for labels, (counts, total_sum, total_count) in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+            label_str = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_str} {_format_value(total_sum)}"
+            yield f"{self.name}_count{label_str} {total_count}"
+
+
+REGISTRY: List[Metric] = []
+
+
+def render_metrics() -> str:
+    """Exposição no formato texto do Prometheus (versão 0.0.4)."""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.header())
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+# =========================
+# PIPELINE DE ENCAMINHAMENTO
+# =========================
+messages_forwarded = Counter(
+    "telegram_messages_forwarded_total",
+    "Mensagens entregues com sucesso por automação e destino",
+    ("automation", "destination"),
+)
+messages_failed = Counter(
+    "telegram_messages_failed_total",
+    "Mensagens que falharam por automação e destino",
+    ("automation", "destination"),
+)
+messages_skipped = Counter(
+    "telegram_messages_skipped_total",
+    "Mensagens ignoradas por automação, destino e motivo",
+    ("automation", "destination", "reason"),
+)
+forward_lag = Histogram(
+    "telegram_forward_lag_seconds",
+    "Atraso entre message.date e o envio confirmado",
+    ("automation",),
+    buckets=LAG_BUCKETS,
+)
+send_duration = Histogram(
+    "telegram_send_duration_seconds",
+    "Latência das chamadas RPC de envio",
+    ("method",),
+)
+floodwait_seconds = Counter(
+    "telegram_floodwait_seconds_total",
+    "Segundos de FloodWait recebidos nas chamadas de envio",
+    ("method",),
+)
+media_cache_requests = Counter(
+    "telegram_media_cache_requests_total",
+    "Consultas ao cache de mídia por resultado (hit/miss)",
+    ("result",),
+)
+db_query_duration = Histogram(
+    "db_query_duration_seconds",
+    "Latência das consultas ao banco por tipo de instrução",
+    ("statement",),
+)
+ingest_queue_dropped = Counter(
+    "telegram_ingest_queue_dropped_total",
+    "Mensagens descartadas pela política drop_oldest da fila de entrada",
+    ("automation",),
+)
+send_pool_sends = Counter(
+    "telegram_send_pool_sends_total",
+    "Envios feitos por cada conta de um pool de envio",
+    ("session",),
+)
+send_pool_failovers = Counter(
+    "telegram_send_pool_failovers_total",
+    "Envios repassados para outra conta do pool, por conta e motivo",
+    ("session", "reason"),
+)
+scheduled_deliveries = Counter(
+    "telegram_scheduled_deliveries_total",
+    "Entregas agendadas por resultado (scheduled, dispatched, paused, retry)",
+    ("result",),
+)
+scheduled_dispatch_delay = Histogram(
+    "telegram_scheduled_dispatch_delay_seconds",
+    "Atraso entre o horário agendado e o despacho para a fila da automação",
+)
+media_relay_sends = Counter(
+    "telegram_media_relay_sends_total",
+    "Envios de mídia protegida por origem do arquivo (stream, disk, file_id)",
+    ("source",),
+)
+media_relay_download_bytes = Counter(
+    "telegram_media_relay_download_bytes_total",
+    "Bytes baixados de origens com conteúdo protegido",
+)
+media_relay_evictions = Counter(
+    "telegram_media_relay_evictions_total",
+    "Arquivos removidos do cache em disco de mídia protegida (LRU)",
+)
+supervisor_restarts = Counter(
+    "telegram_supervisor_restarts_total",
+    "Reinícios feitos pelo supervisor por componente e resultado",
+    ("component", "result"),
+)
+supervisor_recovery = Histogram(
+    "telegram_supervisor_recovery_seconds",
+    "Tempo entre a detecção de uma falha e a recuperação do componente",
+    ("component",),
+    buckets=LAG_BUCKETS,
+)
+
+
+def automation_label(automation) -> str:
+    automation_id = getattr(automation, "id", None)
+    return str(automation_id) if automation_id is not None else "none"
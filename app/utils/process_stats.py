@@ -0,0 +1,15 @@
+import os
+from typing import Optional
+
+
+def current_rss_bytes() -> Optional[int]:
+    """
+    Memória residente (RSS) atual do processo, lida de /proc/self/statm.
+    Retorna None em sistemas sem /proc (ex: Windows).
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
@@ -0,0 +1,182 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+# Um perfil por vez: dois samplers simultâneos distorceriam um ao outro
+profile_lock = asyncio.Lock()
+
+
+def _frame_label(code) -> str:
+    filename = os.path.join(*code.co_filename.split(os.sep)[-2:])
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({filename}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> str:
+    """Pilha no formato "collapsed" (raiz;...;folha) usado por flamegraphs."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def _await_site(coro) -> Optional[str]:
+    """Segue a cadeia de awaits até a corrotina mais interna (onde está parada)."""
+    site = None
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is not None:
+            site = _frame_label(frame.f_code)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return site
+
+
+class StackSampler(threading.Thread):
+    """
+    Amostra, em uma thread própria, as pilhas de todas as threads (loop do
+    asyncio e executors) e o estado das tasks do loop. Só existe enquanto um
+    perfil está em execução.
+    """
+
+    def __init__(
+        self, loop: asyncio.AbstractEventLoop, interval: float, capture_stacks: bool
+    ):
+        super().__init__(name="profiler-sampler", daemon=True)
+        self.loop = loop
+        self.interval = interval
+        self.capture_stacks = capture_stacks
+        self.samples = 0
+        self.stacks: Dict[str, int] = defaultdict(int)
+        self.thread_samples: Dict[str, int] = defaultdict(int)
+        self.coroutines: Dict[str, Dict[str, Any]] = {}
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def run(self):
+        own_ident = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            if self.capture_stacks:
+                self._sample_stacks(own_ident)
+            self._sample_tasks(elapsed)
+            self.samples += 1
+
+    def _sample_stacks(self, own_ident: int):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            thread_name = names.get(ident, str(ident))
+            self.thread_samples[thread_name] += 1
+            self.stacks[f"{thread_name};{_collapse(frame)}"] += 1
+
+    def _sample_tasks(self, elapsed: float):
+        try:
+            tasks = asyncio.all_tasks(self.loop)
+            current = asyncio.current_task(self.loop)
+        except RuntimeError:
+            return  # Conjunto de tasks mudou durante a leitura; pula a amostra
+        for task in tasks:
+            coro = task.get_coro()
+            name = getattr(coro, "__qualname__", type(coro).__name__)
+            entry = self.coroutines.get(name)
+            if entry is None:
+                entry = self.coroutines[name] = {
+                    "running_s": 0.0,
+                    "waiting_s": 0.0,
+                    "tasks": set(),
+                    "await_sites": defaultdict(float),
+                }
+            entry["tasks"].add(id(task))
+            if task is current:
+                entry["running_s"] += elapsed
+            else:
+                entry["waiting_s"] += elapsed
+                site = _await_site(coro)
+                if site:
+                    entry["await_sites"][site] += elapsed
+
+    def collapsed(self) -> str:
+        return "\n".join(
+            f"{stack} {count}"
+            for stack, count in sorted(self.stacks.items(), key=lambda i: -i[1])
+        )
+
+    def coroutine_breakdown(self, limit: int):
+        rows = [
+            {
+                "coroutine": name,
+                "tasks": len(entry["tasks"]),
+                "running_s": round(entry["running_s"], 4),
+                "waiting_s": round(entry["waiting_s"], 4),
+                "await_sites": {
+                    site: round(seconds, 4)
+                    for site, seconds in sorted(
+                        entry["await_sites"].items(), key=lambda i: -i[1]
+                    )[:5]
+                },
+            }
+            for name, entry in self.coroutines.items()
+        ]
+        rows.sort(key=lambda row: (row["running_s"], row["waiting_s"]), reverse=True)
+        return rows[:limit]
+
+
+async def run_profile(
+    seconds: float,
+    mode: str = "sampling",
+    interval: float = 0.005,
+    sort: str = "cumulative",
+    limit: int = 50,
+) -> Dict[str, Any]:
+    """
+    Perfila o processo em execução por `seconds` segundos.
+
+    - sampling: pilhas de todas as threads (collapsed stacks) e tempo de
+      parede por corrotina, sem instrumentar o código
+    - cprofile: perfil determinístico da thread do event loop (pstats), com o
+      detalhamento por corrotina em paralelo
+    """
+    loop = asyncio.get_running_loop()
+    sampler = StackSampler(loop, interval, capture_stacks=(mode == "sampling"))
+    profiler = cProfile.Profile() if mode == "cprofile" else None
+
+    started = time.perf_counter()
+    sampler.start()
+    if profiler:
+        profiler.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        if profiler:
+            profiler.disable()
+        sampler.stop()
+    elapsed = time.perf_counter() - started
+
+    result: Dict[str, Any] = {
+        "mode": mode,
+        "seconds": round(elapsed, 3),
+        "interval_ms": interval * 1000,
+        "samples": sampler.samples,
+        "coroutines": sampler.coroutine_breakdown(limit),
+    }
+    if mode == "sampling":
+        result["threads"] = dict(sampler.thread_samples)
+        result["collapsed"] = sampler.collapsed()
+    if profiler:
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats(sort).print_stats(limit)
+        result["pstats"] = output.getvalue()
+    return result
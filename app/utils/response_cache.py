@@ -0,0 +1,138 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from app.config.config import settings
+
+
+def serialize_json(content: Any) -> bytes:
+    """Serializa no mesmo formato compacto do JSONResponse do FastAPI."""
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class CachedResponse:
+    """Corpo JSON já serializado, com ETag e cabeçalhos extras."""
+
+    __slots__ = ("body", "etag", "headers", "expires_at")
+
+    def __init__(
+        self,
+        body: bytes,
+        headers: Optional[Dict[str, str]] = None,
+        ttl: Optional[float] = None,
+    ):
+        self.body = body
+        self.etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        self.headers = headers or {}
+        self.expires_at = time.monotonic() + ttl if ttl else None
+
+    def is_expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Compara o cabeçalho If-None-Match com o ETag atual."""
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*" or tag.removeprefix("W/") == self.etag:
+                return True
+        return False
+
+    def to_response(self, request: Request) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache", **self.headers}
+        if self.matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        return Response(
+            content=self.body, media_type="application/json", headers=headers
+        )
+
+
+class ResponseCache:
+    """
+    Cache de respostas de leitura, por namespace (ex: "automations") e
+    parâmetros da requisição. As rotas de escrita invalidam o namespace
+    explicitamente; entradas também podem expirar por TTL.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, Hashable], CachedResponse]" = (
+            OrderedDict()
+        )
+        self._generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, namespace: str, key: Hashable) -> Optional[CachedResponse]:
+        """Retorna a entrada válida do cache ou None."""
+        cache_key = (namespace, key)
+        entry = self._entries.get(cache_key)
+        if entry is None or entry.is_expired():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(cache_key)
+        self.hits += 1
+        return entry
+
+    def generation(self, namespace: str) -> int:
+        return self._generations.get(namespace, 0)
+
+    def put(
+        self,
+        namespace: str,
+        key: Hashable,
+        entry: CachedResponse,
+        generation: Optional[int] = None,
+    ):
+        """
+        Armazena uma entrada. Se `generation` for informado e o namespace tiver
+        sido invalidado desde então, a entrada (possivelmente velha) é descartada.
+        """
+        if generation is not None and self.generation(namespace) != generation:
+            return
+        cache_key = (namespace, key)
+        self._entries[cache_key] = entry
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_build(
+        self,
+        namespace: str,
+        key: Hashable,
+        builder: Callable[[], Awaitable[CachedResponse]],
+    ) -> CachedResponse:
+        entry = self.get(namespace, key)
+        if entry is not None:
+            return entry
+
+        generation = self.generation(namespace)
+        entry = await builder()
+        # Só armazena se nenhuma escrita invalidou o namespace durante o build
+        self.put(namespace, key, entry, generation)
+        return entry
+
+    def invalidate(self, *namespaces: str):
+        for namespace in namespaces:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            for cache_key in [k for k in self._entries if k[0] == namespace]:
+                del self._entries[cache_key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Instância global compartilhada pelas rotas
+response_cache = ResponseCache(max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES)
@@ -0,0 +1,195 @@
+import asyncio
+import collections
+import hashlib
+import math
+import re
+import time
+import unicodedata
+from typing import Any, Dict, Optional, Tuple
+
+from app.config.config import settings
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def content_key(media_info: Optional[Dict[str, Any]], text: Optional[str]):
+    """
+    Chave do conteúdo de uma mensagem: o file_unique_id da mídia (o mesmo
+    arquivo repostado em outro canal mantém o id) ou o hash do texto
+    normalizado (NFKC, sem diferença de caixa e de espaços). None quando não
+    há nada para comparar.
+    """
+    if media_info and media_info.get("file_unique_id"):
+        return f"media:{media_info['file_unique_id']}"
+    if not text:
+        return None
+    normalized = _WHITESPACE.sub(
+        " ", unicodedata.normalize("NFKC", str(text)).casefold()
+    ).strip()
+    if not normalized:
+        return None
+    return "text:" + hashlib.blake2b(normalized.encode(), digest_size=16).hexdigest()
+
+
+class RollingBloomFilter:
+    """
+    Filtro de Bloom com duas gerações de tamanho fixo. Inserções vão para a
+    geração atual; consultas olham as duas. A geração atual é rotacionada
+    (a anterior é descartada) quando completa `ttl` segundos ou recebe
+    `capacity` itens, então um item é lembrado por pelo menos `ttl`
+    segundos enquanto o tráfego couber na capacidade, e a memória não
+    passa de 2 * bits / 8 bytes. Cada geração usa metade de `error_rate`,
+    para que a taxa de falsos positivos das duas juntas fique no alvo.
+    """
+
+    GENERATIONS = 2
+
+    def __init__(self, capacity: int, error_rate: float, ttl: float):
+        self.capacity = max(1, capacity)
+        self.ttl = ttl
+        rate = error_rate / self.GENERATIONS
+        # Tamanho e número de hashes ótimos para `capacity` itens com `rate`
+        self.bits = max(
+            8, math.ceil(-self.capacity * math.log(rate) / (math.log(2) ** 2))
+        )
+        self.hashes = max(1, round(self.bits / self.capacity * math.log(2)))
+        self._current = bytearray((self.bits + 7) // 8)
+        self._previous = bytearray(len(self._current))
+        self._count = 0
+        self._started_at = time.monotonic()
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._current) + len(self._previous)
+
+    def _positions(self, key: str):
+        # Hashing duplo (Kirsch-Mitzenmacher): k posições a partir de 2 hashes
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def _rotate_if_due(self):
+        if (
+            self._count >= self.capacity
+            or time.monotonic() - self._started_at >= self.ttl
+        ):
+            self._previous = self._current
+            self._current = bytearray(len(self._previous))
+            self._count = 0
+            self._started_at = time.monotonic()
+
+    def __contains__(self, key: str) -> bool:
+        self._rotate_if_due()
+        positions = self._positions(key)
+        for generation in (self._current, self._previous):
+            if all(generation[p >> 3] & (1 << (p & 7)) for p in positions):
+                return True
+        return False
+
+    def add(self, key: str):
+        self._rotate_if_due()
+        for p in self._positions(key):
+            self._current[p >> 3] |= 1 << (p & 7)
+        self._count += 1
+
+
+class ContentIndex:
+    """
+    Índice de conteúdo publicado recentemente em cada destino, comum a
+    todas as automações com dedup_content. Um filtro por destino; acima de
+    `max_destinations`, o filtro do destino usado há mais tempo é
+    descartado, então a memória é limitada independente do tráfego.
+
+    Como em SendWindow, claim() separa os destinos em leading (quem envia e
+    depois chama settle()) e following (o mesmo conteúdo já publicado, ou
+    em envio por outra automação, com o future do resultado).
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        error_rate: float,
+        ttl: float,
+        max_destinations: int,
+    ):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.ttl = ttl
+        self.max_destinations = max(1, max_destinations)
+        self._filters: "collections.OrderedDict[str, RollingBloomFilter]" = (
+            collections.OrderedDict()
+        )
+        # Envios em andamento: (destino, chave) -> future(entregue)
+        self._pending: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    def __len__(self):
+        return len(self._filters)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(bloom.nbytes for bloom in self._filters.values())
+
+    def _filter(self, dest_id: str) -> RollingBloomFilter:
+        bloom = self._filters.get(dest_id)
+        if bloom is None:
+            bloom = self._filters[dest_id] = RollingBloomFilter(
+                self.capacity, self.error_rate, self.ttl
+            )
+            if len(self._filters) > self.max_destinations:
+                self._filters.popitem(last=False)
+        else:
+            self._filters.move_to_end(dest_id)
+        return bloom
+
+    def claim(self, key: str, destination_ids):
+        """Sem await: atômico em relação às outras automações."""
+        loop = asyncio.get_running_loop()
+        leading: Dict[Any, Tuple[Tuple[str, str], asyncio.Future]] = {}
+        following: Dict[Any, asyncio.Future] = {}
+        for dest_id in destination_ids:
+            pending_key = (str(dest_id), key)
+            future = self._pending.get(pending_key)
+            if future is None and key in self._filter(str(dest_id)):
+                future = loop.create_future()
+                future.set_result(True)  # Já publicado
+            if future is not None:
+                following[dest_id] = future
+                continue
+            future = self._pending[pending_key] = loop.create_future()
+            leading[dest_id] = (pending_key, future)
+        return leading, following
+
+    def settle(
+        self, pending_key: Tuple[str, str], future: asyncio.Future, delivered: bool
+    ):
+        if future.done():
+            return
+        future.set_result(delivered)
+        if self._pending.get(pending_key) is future:
+            del self._pending[pending_key]
+        if delivered:
+            dest_id, key = pending_key
+            self._filter(dest_id).add(key)
+
+
+_index: Optional[ContentIndex] = None
+
+
+def content_index() -> ContentIndex:
+    """Índice do processo, criado no primeiro uso com os valores de settings."""
+    global _index
+    if _index is None:
+        _index = ContentIndex(
+            settings.CONTENT_DEDUP_CAPACITY,
+            settings.CONTENT_DEDUP_ERROR_RATE,
+            settings.CONTENT_DEDUP_WINDOW_SECONDS,
+            settings.CONTENT_DEDUP_MAX_DESTINATIONS,
+        )
+    return _index
+
+
+def index_status() -> Dict[str, Any]:
+    if _index is None:
+        return {"destinations": 0, "bytes": 0}
+    return {"destinations": len(_index), "bytes": _index.nbytes}
@@ -0,0 +1,92 @@
+import asyncio
+import collections
+import hashlib
+import time
+import weakref
+from typing import Any, Dict, Optional, Tuple
+
+from app.config.config import settings
+
+# Chave de uma entrega: (chat de origem, id da mensagem, destino, hash da legenda)
+DeliveryKey = Tuple[str, int, str, str]
+
+
+def _caption_key(caption: Optional[str]) -> str:
+    if not caption:
+        return ""
+    return hashlib.blake2b(caption.encode(), digest_size=8).hexdigest()
+
+
+class SendWindow:
+    """
+    Janela de deduplicação das entregas de uma sessão, compartilhada por
+    todas as automações dela. A primeira automação que reivindica uma
+    entrega faz o envio; as demais aguardam o resultado em vez de repetir
+    a chamada. Entregas bem-sucedidas ficam na janela por `ttl` segundos;
+    falhas saem na hora, para que a próxima tentativa envie de novo.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[DeliveryKey, asyncio.Future] = {}
+        self._expiry = collections.deque()  # (expira_em, chave, future)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def claim(self, message, destination_ids, caption: Optional[str]):
+        """
+        Separa os destinos em (leading, following): leading mapeia o destino
+        para (chave, future) que o chamador deve resolver com settle();
+        following mapeia o destino para o future de quem já está enviando.
+        Não há await aqui, então a reivindicação de todos os destinos de uma
+        mensagem é atômica em relação às outras automações.
+        """
+        self._purge()
+        loop = asyncio.get_running_loop()
+        caption_key = _caption_key(caption)
+        leading: Dict[Any, Tuple[DeliveryKey, asyncio.Future]] = {}
+        following: Dict[Any, asyncio.Future] = {}
+        for dest_id in destination_ids:
+            if dest_id in leading or dest_id in following:
+                continue
+            key = (str(message.chat.id), message.id, str(dest_id), caption_key)
+            future = self._entries.get(key)
+            if future is not None:
+                following[dest_id] = future
+                continue
+            future = self._entries[key] = loop.create_future()
+            leading[dest_id] = (key, future)
+        return leading, following
+
+    def settle(self, key: DeliveryKey, future: asyncio.Future, delivered: bool):
+        if future.done():
+            return
+        future.set_result(delivered)
+        if delivered:
+            self._expiry.append((time.monotonic() + self.ttl, key, future))
+        elif self._entries.get(key) is future:
+            del self._entries[key]
+
+    def _purge(self):
+        now = time.monotonic()
+        while self._expiry and self._expiry[0][0] <= now:
+            _, key, future = self._expiry.popleft()
+            if self._entries.get(key) is future:
+                del self._entries[key]
+
+
+# Uma janela por cliente (sessão); some junto com o cliente
+_windows: "weakref.WeakKeyDictionary[Any, SendWindow]" = weakref.WeakKeyDictionary()
+
+
+def window_for(client) -> Optional[SendWindow]:
+    """Janela da sessão do cliente, ou None com a deduplicação desligada."""
+    if settings.SEND_DEDUP_WINDOW_SECONDS <= 0:
+        return None
+    # Com pool de envio, a janela é a da sessão principal
+    client = getattr(client, "primary", client)
+    window = _windows.get(client)
+    if window is None:
+        window = _windows[client] = SendWindow(settings.SEND_DEDUP_WINDOW_SECONDS)
+    return window
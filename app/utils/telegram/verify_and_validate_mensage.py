@@ -1,14 +1,132 @@
+import asyncio
 import logging
+import time
 from typing import List
 import app.services.telegram_services as TelegramService
+from app.config.config import settings
+from app.services.media_relay import is_forward_restricted, media_relay
+from app.utils import metrics, tracing
+from app.utils.telegram import content_dedup, send_dedup
 
 
 class VerifyAndValidateMessage:
     """Classe para verificar, validar e reenviar mensagens do Telegram."""
 
-    def __init__(self, client, telegram_service: TelegramService):
+    def __init__(
+        self,
+        client,
+        telegram_service: TelegramService,
+        automation=None,
+        message_date=None,
+        message=None,
+    ):
         self.client = client
+        self.message = message  # Origem do download quando o conteúdo é protegido
         self.telegram_service = telegram_service
+        self.automation_label = metrics.automation_label(automation)
+        self.message_date = message_date
+        self._window = None
+        self._claims = {}
+        self._content_index = None
+        self._content_claims = {}
+        # (texto, entidades) da mensagem após as regras de reescrita
+        self.rewritten = None
+
+    # =========================
+    # MÉTRICAS
+    # =========================
+    def _record_delivery(self, dest_id, success: bool):
+        """Contabiliza o resultado do envio para um destino."""
+        self._settle(dest_id, success)
+        labels = (self.automation_label, str(dest_id))
+        if not success:
+            metrics.messages_failed.inc(labels)
+            return
+        metrics.messages_forwarded.inc(labels)
+        if self.message_date is not None:
+            metrics.forward_lag.observe(
+                max(time.time() - self.message_date.timestamp(), 0.0),
+                (self.automation_label,),
+            )
+
+    def _record_skip(self, dest_id, reason: str):
+        self._settle(dest_id, True)
+        metrics.messages_skipped.inc((self.automation_label, str(dest_id), reason))
+
+    # =========================
+    # DEDUPLICAÇÃO ENTRE AUTOMAÇÕES
+    # =========================
+    def claim_deliveries(self, window, message, destination_ids, caption_override):
+        """
+        Reivindica as entregas na janela da sessão. Retorna os destinos que
+        este envio deve fazer e os que já estão com outra automação.
+        """
+        leading, following = window.claim(message, destination_ids, caption_override)
+        self._window = window
+        self._claims = leading
+        return list(leading), following
+
+    def claim_content(self, index, key, destination_ids):
+        """
+        Reivindica o conteúdo nos destinos (dedup_content). Retorna os destinos
+        em que ele ainda não foi publicado e os que já o têm, publicado ou em
+        envio por outra automação.
+        """
+        leading, following = index.claim(key, destination_ids)
+        self._content_index = index
+        self._content_claims = leading
+        return list(leading), following
+
+    def _settle(self, dest_id, delivered: bool):
+        claim = self._claims.pop(dest_id, None)
+        if claim:
+            self._window.settle(*claim, delivered)
+        claim = self._content_claims.pop(dest_id, None)
+        if claim:
+            self._content_index.settle(*claim, delivered)
+
+    def release_claims(self, keep=()):
+        """Entregas reivindicadas e não concluídas (erro no caminho) contam como falha."""
+        for dest_id in list(self._claims) + list(self._content_claims):
+            if dest_id not in keep:
+                self._settle(dest_id, False)
+
+    async def await_duplicates(self, following, reason: str = "duplicate") -> List:
+        """
+        Aguarda as entregas feitas por outra automação. Retorna os destinos em
+        que ela falhou ou que não terminaram em SEND_DEDUP_WAIT_SECONDS (ex.:
+        FloodWait longo), para que este envio tente por conta própria.
+        """
+        retry = []
+        deadline = time.monotonic() + settings.SEND_DEDUP_WAIT_SECONDS
+        for dest_id, future in following.items():
+            try:
+                # shield: cancelar esta espera não cancela o envio da outra
+                delivered = await asyncio.wait_for(
+                    asyncio.shield(future), max(0.0, deadline - time.monotonic())
+                )
+            except asyncio.TimeoutError:
+                logging.warning(
+                    f"[DEDUP] Envio para {dest_id} feito por outra automação não "
+                    f"terminou em {settings.SEND_DEDUP_WAIT_SECONDS:g}s; "
+                    f"enviando por conta própria"
+                )
+                retry.append(dest_id)
+                continue
+            if delivered:
+                self._record_skip(dest_id, reason)
+            else:
+                retry.append(dest_id)
+        return retry
+
+    def _media_caption(self, caption_override):
+        """
+        Legenda e entidades do envio de mídia: a legenda da automação
+        substitui a original; sem ela, vale a original reescrita.
+        """
+        if caption_override or self.rewritten is None:
+            return caption_override, None
+        return self.rewritten
 
     async def only_text_message(
         self, media_info, message, caption_override, destination_ids
@@ -17,25 +135,75 @@ class VerifyAndValidateMessage:
         if media_info:
             return  # Se tiver mídia, sai do método
 
-        text_to_send = self.telegram_service.build_caption(
-            getattr(message, "text", ""), caption_override
-        )
+        text, entities = self.rewritten or (getattr(message, "text", ""), None)
+        # A legenda da automação vai no fim: as entidades do texto continuam valendo
+        text_to_send = self.telegram_service.build_caption(text, caption_override)
 
         if not text_to_send or not text_to_send.strip():
             logging.warning(
                 f"[TEXTO] Mensagem {message.id} está vazia. Ignorando envio."
             )
+            for dest_id in destination_ids:
+                self._record_skip(dest_id, "empty")
             return
 
         for dest_id in destination_ids:
             try:
-                await self.client.send_message(dest_id, text_to_send)
+                await self.telegram_service.send_text(
+                    self.client, dest_id, text_to_send, entities
+                )
+                self._record_delivery(dest_id, True)
                 logging.info(f"[TEXTO] Mensagem {message.id} enviada para {dest_id}")
             except Exception as e:
+                self._record_delivery(dest_id, False)
                 logging.error(
                     f"[TEXTO] Erro ao enviar msg {message.id} para {dest_id}: {e}"
                 )
 
+    @staticmethod
+    def _is_file_reference_error(error: Exception) -> bool:
+        return any(
+            x in str(error)
+            for x in [
+                "FILE_REFERENCE_EXPIRED",
+                "FILE_ID_INVALID",
+                "file_reference",
+            ]
+        )
+
+    async def _recover_and_resend(
+        self, media_ref, file_unique_id, dest_id, caption_override
+    ) -> bool:
+        """Atualiza o file_id expirado e tenta reenviar para o destino."""
+        logging.info(
+            f"[RECUPERAR] File_id expirado para {file_unique_id}, atualizando..."
+        )
+        with tracing.span(
+            "recover_file_reference", file_unique_id=file_unique_id
+        ) as recover_span:
+            updated_media = await self.telegram_service.update_media_info(
+                self.client, media_ref
+            )
+            if not updated_media:
+                recover_span.set_attribute("recovered", False)
+                return False
+            caption, entities = self._media_caption(caption_override)
+            try:
+                await self.telegram_service.send_media_from_cache(
+                    self.client, updated_media, [dest_id], caption, entities
+                )
+                logging.info(
+                    f"[SUCESSO] Mídia {updated_media.file_unique_id} reenviada após atualização"
+                )
+                recover_span.set_attribute("recovered", True)
+                return True
+            except Exception as e2:
+                logging.error(
+                    f"[FALHA] Mesmo após atualização não foi possível enviar: {e2}"
+                )
+                recover_span.set_attribute("recovered", False)
+                return False
+
     async def resend_cached_media(self, media_info, caption_override, destination_ids):
         """Verifica cache e reenvia mídia, atualizando file_id expirado."""
         cached_media = await self.telegram_service.get_cached_media(
@@ -49,40 +217,31 @@ class VerifyAndValidateMessage:
             f"[CACHE] Mídia {cached_media.file_unique_id} encontrada. Reenviando."
         )
 
+        caption, entities = self._media_caption(caption_override)
         for dest_id in destination_ids:
             try:
                 await self.telegram_service.send_media_from_cache(
-                    self.client, cached_media, [dest_id], caption_override
+                    self.client, cached_media, [dest_id], caption, entities
                 )
+                self._record_delivery(dest_id, True)
             except Exception as e:
-                if any(
-                    x in str(e)
-                    for x in [
-                        "FILE_REFERENCE_EXPIRED",
-                        "FILE_ID_INVALID",
-                        "file_reference",
-                    ]
-                ):
-                    logging.info(
-                        f"[RECUPERAR] File_id expirado para {cached_media.file_unique_id}, atualizando..."
+                if self._is_file_reference_error(e):
+                    self._record_delivery(
+                        dest_id,
+                        await self._recover_and_resend(
+                            cached_media,
+                            cached_media.file_unique_id,
+                            dest_id,
+                            caption_override,
+                        ),
                     )
-                    updated_media = await self.telegram_service.update_media_info(
-                        self.client, cached_media
+                elif is_forward_restricted(e) and self.message is not None:
+                    self._record_delivery(
+                        dest_id,
+                        await self._relay(media_info, caption_override, dest_id),
                     )
-                    if updated_media:
-                        try:
-                            await self.telegram_service.send_media_from_cache(
-                                self.client, updated_media, [dest_id], caption_override
-                            )
-                            logging.info(
-                                f"[SUCESSO] Mídia {updated_media.file_unique_id} reenviada após atualização"
-                            )
-                        except Exception as e2:
-                            logging.error(
-                                f"[FALHA] Mesmo após atualização não foi possível enviar: {e2}"
-                            )
-                    continue
                 else:
+                    self._record_delivery(dest_id, False)
                     logging.error(
                         f"[CACHE] Erro ao reenviar mídia {cached_media.file_unique_id}: {e}"
                     )
@@ -92,44 +251,63 @@ class VerifyAndValidateMessage:
         self, new_media, media_info, caption_override, destination_ids
     ):
         """Envia mídia normalmente e atualiza file_id expirado se necessário."""
+        caption, entities = self._media_caption(caption_override)
         for dest_id in destination_ids:
             try:
                 await self.telegram_service.send_media_by_type(
-                    self.client, dest_id, media_info, caption_override
+                    self.client, dest_id, media_info, caption, entities
                 )
+                self._record_delivery(dest_id, True)
                 logging.info(
                     f"[MÍDIA] Mídia {media_info['file_unique_id']} enviada para {dest_id}"
                 )
             except Exception as e:
-                if any(
-                    x in str(e)
-                    for x in [
-                        "FILE_REFERENCE_EXPIRED",
-                        "FILE_ID_INVALID",
-                        "file_reference",
-                    ]
-                ):
-                    logging.info(
-                        f"[RECUPERAR] File_id expirado para {media_info['file_unique_id']}, atualizando..."
+                if self._is_file_reference_error(e):
+                    self._record_delivery(
+                        dest_id,
+                        await self._recover_and_resend(
+                            new_media,
+                            media_info["file_unique_id"],
+                            dest_id,
+                            caption_override,
+                        ),
                     )
-                    updated_media = await self.telegram_service.update_media_info(
-                        self.client, new_media
+                elif is_forward_restricted(e) and self.message is not None:
+                    self._record_delivery(
+                        dest_id,
+                        await self._relay(media_info, caption_override, dest_id),
                     )
-                    if updated_media:
-                        try:
-                            await self.telegram_service.send_media_from_cache(
-                                self.client, updated_media, [dest_id], caption_override
-                            )
-                            logging.info(
-                                f"[SUCESSO] Mídia {updated_media.file_unique_id} reenviada após atualização"
-                            )
-                        except Exception as e2:
-                            logging.error(
-                                f"[FALHA] Mesmo após atualização não foi possível enviar: {e2}"
-                            )
                 else:
+                    self._record_delivery(dest_id, False)
                     logging.error(f"[MÍDIA] Erro ao enviar mídia para {dest_id}: {e}")
 
+    async def _relay(self, media_info, caption_override, dest_id) -> bool:
+        """Baixa a mídia protegida da origem e envia como novo upload."""
+        caption, entities = self._media_caption(caption_override)
+        if caption is None:
+            caption = media_info.get("caption")
+        try:
+            await media_relay(self.telegram_service).send(
+                self.client, self.message, media_info, dest_id, caption, entities
+            )
+            logging.info(
+                f"[RELAY] Mídia protegida {media_info['file_unique_id']} enviada "
+                f"para {dest_id}"
+            )
+            return True
+        except Exception as e:
+            logging.error(f"[RELAY] Erro ao enviar mídia protegida para {dest_id}: {e}")
+            return False
+
+    async def relay_protected_media(
+        self, media_info, caption_override, destination_ids
+    ):
+        """Origem com conteúdo protegido: file_id não serve, vai direto ao upload."""
+        for dest_id in destination_ids:
+            self._record_delivery(
+                dest_id, await self._relay(media_info, caption_override, dest_id)
+            )
+
     async def should_skip_message(self, message, automation) -> bool:
         """Retorna True se a mensagem deve ser ignorada (serviço ou stop_flag)."""
         if getattr(automation, "stop_flag", False):
@@ -138,6 +316,9 @@ class VerifyAndValidateMessage:
             )
             return True
         if getattr(message, "service", False):
+            metrics.messages_skipped.inc(
+                (metrics.automation_label(automation), "all", "service")
+            )
             return True
         return False
 
@@ -160,25 +341,160 @@ async def process_and_forward_message(
     from app.services.telegram_services import TelegramService
 
     telegram_service = TelegramService()
-    verifier = VerifyAndValidateMessage(client, telegram_service)
+    verifier = VerifyAndValidateMessage(
+        client,
+        telegram_service,
+        automation=automation,
+        message_date=getattr(message, "date", None),
+        message=message,
+    )
+    caption_override = (automation.caption if automation else None) or None
 
-    caption_override = automation.caption if automation else None
-    media_info = await telegram_service.get_media_info(message)
-    new_media = await telegram_service.save_media_to_cache(media_info)
+    # Um trace por mensagem; cada estágio abaixo vira um span
+    with tracing.span(
+        "forward_message",
+        message_id=message.id,
+        chat_id=str(message.chat.id),
+        automation_id=getattr(automation, "id", None),
+        destinations=len(destination_ids),
+    ) as root:
+        with tracing.span("extract_media"):
+            media_info = await telegram_service.get_media_info(message)
+        root.set_attribute(
+            "media_type", media_info["media_type"] if media_info else "text"
+        )
+        new_media = await telegram_service.save_media_to_cache(media_info)
 
-    logging.info(f"[PROCESS] Processando mensagem {message.id} de {message.chat.id}")
+        # Regras de reescrita da automação (texto ou legenda original)
+        dedup_caption = caption_override
+        rewriter = getattr(automation, "rewriter", None)
+        source_text = getattr(message, "text", None) or getattr(
+            message, "caption", None
+        )
+        if rewriter is not None and source_text:
+            entities = getattr(message, "entities", None) or getattr(
+                message, "caption_entities", None
+            )
+            with tracing.span("rewrite_text", rules=rewriter.size):
+                verifier.rewritten = rewriter.rewrite(str(source_text), entities)
+            # Textos reescritos de forma diferente não são entregas idênticas
+            dedup_caption = f"{caption_override or ''}\0{verifier.rewritten[0]}"
 
-    await verifier.only_text_message(
-        media_info, message, caption_override, destination_ids
-    )
+        logging.info(
+            f"[PROCESS] Processando mensagem {message.id} de {message.chat.id}"
+        )
 
-    if await verifier.resend_cached_media(
-        media_info, caption_override, destination_ids
-    ):
+        # Entregas idênticas de outras automações da sessão viram um só envio
+        following = {}
+        window = send_dedup.window_for(client)
+        if window is not None:
+            destination_ids, following = verifier.claim_deliveries(
+                window, message, destination_ids, dedup_caption
+            )
+            root.set_attribute("deduplicated", len(following))
+
+        # Conteúdo já publicado no destino, vindo de qualquer origem
+        content_following = {}
+        key = None
+        if getattr(automation, "dedup_content", False) and destination_ids:
+            key = content_dedup.content_key(
+                media_info,
+                (
+                    verifier.rewritten[0]
+                    if verifier.rewritten
+                    else getattr(message, "text", None)
+                ),
+            )
+        if key is not None:
+            destination_ids, content_following = verifier.claim_content(
+                content_dedup.content_index(), key, destination_ids
+            )
+            root.set_attribute("content_duplicates", len(content_following))
+        try:
+            if destination_ids:
+                await _deliver(
+                    verifier,
+                    telegram_service,
+                    message,
+                    media_info,
+                    new_media,
+                    caption_override,
+                    destination_ids,
+                )
+        finally:
+            # As entregas repetidas só se resolvem com o resultado de quem publicou
+            verifier.release_claims(keep=content_following)
+
+        if content_following:
+            try:
+                with tracing.span(
+                    "await_content_duplicates", destinations=len(content_following)
+                ):
+                    retry_ids = await verifier.await_duplicates(
+                        content_following, "content_duplicate"
+                    )
+                if retry_ids:
+                    await _deliver(
+                        verifier,
+                        telegram_service,
+                        message,
+                        media_info,
+                        new_media,
+                        caption_override,
+                        retry_ids,
+                    )
+            finally:
+                verifier.release_claims()
+
+        if following:
+            with tracing.span("await_duplicates", destinations=len(following)):
+                retry_ids = await verifier.await_duplicates(following)
+            if retry_ids:
+                await _deliver(
+                    verifier,
+                    telegram_service,
+                    message,
+                    media_info,
+                    new_media,
+                    caption_override,
+                    retry_ids,
+                )
+
+
+async def _deliver(
+    verifier,
+    telegram_service,
+    message,
+    media_info,
+    new_media,
+    caption_override,
+    destination_ids,
+):
+    """Estágios de envio: texto, reenvio do cache ou mídia nova."""
+    if not media_info:
+        with tracing.span("send_text"):
+            await verifier.only_text_message(
+                media_info, message, caption_override, destination_ids
+            )
+        return
+
+    if media_info.get("protected"):
+        with tracing.span("relay_protected"):
+            await verifier.relay_protected_media(
+                media_info, caption_override, destination_ids
+            )
+        return
+
+    with tracing.span("resend_cached"):
+        resent = await verifier.resend_cached_media(
+            media_info, caption_override, destination_ids
+        )
+    if resent:
         return
 
     logging.info(f"[CACHE] Mídia salva com id={new_media.id}")
 
-    await verifier.send_media_with_recovery(
-        new_media, media_info, caption_override, destination_ids
-    )
+    with tracing.span("send_media"):
+        await verifier.send_media_with_recovery(
+            new_media, media_info, caption_override, destination_ids
+        )
@@ -0,0 +1,321 @@
+import bisect
+import copy
+import re
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+RULE_KINDS = ("literal", "regex")
+
+# Entidades que o Telegram detecta sozinho no texto: se o trecho delas foi
+# reescrito, deixam de valer (uma URL trocada por texto comum não é mais URL)
+_DETECTED_ENTITY_TYPES = {
+    "MENTION",
+    "HASHTAG",
+    "CASHTAG",
+    "BOT_COMMAND",
+    "URL",
+    "EMAIL",
+    "PHONE_NUMBER",
+    "BANK_CARD",
+}
+
+_URL_SCHEME = re.compile(r"^(?:[a-zA-Z][a-zA-Z0-9+.-]*://|tg:|t\.me/)")
+
+# Referências a grupos no substituto de uma regra regex: \g<1>, \g<nome>, \1
+_TEMPLATE_REF = re.compile(r"\\(?:g<(\d+)>|g<(\w+)>|([1-9]\d?)|.)", re.DOTALL)
+
+
+def check_regex_rule(pattern: str, replacement: str = ""):
+    """
+    Compila o padrão e valida as referências a grupos do substituto
+    (\1, \g<1>, \g<nome>). Levanta re.error se alguma não existir.
+    """
+    regex = re.compile(pattern)
+    for match in _TEMPLATE_REF.finditer(replacement or ""):
+        number = match.group(1) or match.group(3)
+        if number is not None and int(number) > regex.groups:
+            raise re.error(f"referência a grupo inexistente: {match.group(0)}")
+        name = match.group(2)
+        if name is not None and name not in regex.groupindex:
+            raise re.error(f"referência a grupo inexistente: {match.group(0)}")
+    return regex
+
+
+def _shift_refs(template: str, offset: int) -> str:
+    """Renumera as referências numéricas para os grupos na regex combinada."""
+
+    def shift(match):
+        number = match.group(1) or match.group(3)
+        if number is None:
+            return match.group(0)
+        return f"\\g<{int(number) + offset}>"
+
+    return _TEMPLATE_REF.sub(shift, template)
+
+
+class AhoCorasick:
+    """
+    Autômato de Aho-Corasick: encontra todas as ocorrências de todos os
+    padrões em uma única passada pelo texto, independente de quantos sejam.
+    """
+
+    def __init__(self, patterns: Sequence[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        self._lengths = [len(pattern) for pattern in patterns]
+
+        for index, pattern in enumerate(patterns):
+            node = 0
+            for char in pattern:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = self._goto[node][char] = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                node = next_node
+            self._out[node] += (index,)
+
+        # Links de falha em largura: o nó aponta para o maior sufixo próprio
+        # que também é prefixo de algum padrão
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] += self._out[self._fail[child]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """(início, fim, índice do padrão) de cada ocorrência."""
+        goto, fail, out, lengths = self._goto, self._fail, self._out, self._lengths
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for index in out[node]:
+                yield position + 1 - lengths[index], position + 1, index
+
+
+def _fold(text: str) -> str:
+    """Minúsculas preservando o comprimento (as posições continuam valendo)."""
+    folded = text.lower()
+    if len(folded) == len(text):
+        return folded
+    return "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+
+
+def _utf16_len(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+class TextRewriter:
+    """
+    Regras de reescrita de uma automação, compiladas uma vez. As regras
+    literais viram um único autômato de Aho-Corasick e as regex uma única
+    alternação, então o custo por mensagem é linear no tamanho do texto,
+    mesmo com milhares de regras.
+
+    Cada regra tem kind ("literal" ou "regex"), pattern, replacement (vazio
+    remove o trecho; em regex aceita \\1 e \\g<nome>) e ignore_case. Em
+    trechos sobrepostos vale o que começa antes; no mesmo início, o mais
+    longo e depois a ordem das regras (entre regex, a primeira que casar).
+    """
+
+    def __init__(self, rules: Iterable):
+        literals, regexes = [], []
+        for priority, rule in enumerate(rules):
+            entry = (
+                priority,
+                rule.pattern,
+                rule.replacement or "",
+                bool(rule.ignore_case),
+            )
+            (literals if rule.kind == "literal" else regexes).append(entry)
+        self.size = len(literals) + len(regexes)
+
+        self._literals = literals
+        self._fold_text = any(ignore_case for *_, ignore_case in literals)
+        self._automaton = (
+            AhoCorasick(
+                [
+                    _fold(pattern) if self._fold_text else pattern
+                    for _, pattern, _, _ in literals
+                ]
+            )
+            if literals
+            else None
+        )
+
+        self._regexes = [
+            (
+                priority,
+                re.compile(pattern, re.IGNORECASE if ignore_case else 0),
+                replacement,
+            )
+            for priority, pattern, replacement, ignore_case in regexes
+        ]
+        self._combined = None
+        if len(self._regexes) > 1:
+            alternatives = [
+                f"(?P<_r{i}>{'(?i:' if ignore_case else '(?:'}{pattern}))"
+                for i, (_, pattern, _, ignore_case) in enumerate(regexes)
+            ]
+            try:
+                self._combined = re.compile("|".join(alternatives))
+            except re.error:
+                # Ex.: o mesmo nome de grupo em duas regras; uma passada por regra
+                self._combined = None
+        if self._combined is not None:
+            # Na regex combinada os grupos da regra i vêm logo depois de _r{i}:
+            # \1 da regra vira \g<número de _r{i} + 1>, \g<0> vira _r{i}
+            self._combined_replacements = [
+                _shift_refs(replacement, self._combined.groupindex[f"_r{i}"])
+                for i, (_, _, replacement) in enumerate(self._regexes)
+            ]
+
+    def __bool__(self):
+        return self.size > 0
+
+    # =========================
+    # OCORRÊNCIAS
+    # =========================
+    def _literal_matches(self, text: str) -> Iterator[Tuple[int, int, int, str]]:
+        haystack = _fold(text) if self._fold_text else text
+        for start, end, index in self._automaton.iter_matches(haystack):
+            priority, pattern, replacement, ignore_case = self._literals[index]
+            if self._fold_text and not ignore_case and text[start:end] != pattern:
+                continue
+            yield start, end, priority, replacement
+
+    def _regex_matches(self, text: str) -> Iterator[Tuple[int, int, int, str]]:
+        if self._combined is not None:
+            for match in self._combined.finditer(text):
+                if match.start() == match.end():
+                    continue
+                index = int(match.lastgroup[2:])
+                priority = self._regexes[index][0]
+                # Expande \1 etc. com os grupos da regra dentro da combinada
+                replacement = self._combined_replacements[index]
+                yield match.start(), match.end(), priority, match.expand(replacement)
+            return
+        for priority, regex, replacement in self._regexes:
+            for match in regex.finditer(text):
+                if match.start() != match.end():
+                    yield match.start(), match.end(), priority, match.expand(
+                        replacement
+                    )
+
+    def _select(self, text: str) -> List[Tuple[int, int, str]]:
+        """Ocorrências sem sobreposição, da esquerda para a direita."""
+        candidates = []
+        if self._automaton is not None:
+            candidates.extend(self._literal_matches(text))
+        if self._regexes:
+            candidates.extend(self._regex_matches(text))
+        candidates.sort(key=lambda c: (c[0], c[0] - c[1], c[2]))
+
+        selected, last_end = [], 0
+        for start, end, _, replacement in candidates:
+            if start >= last_end:
+                selected.append((start, end, replacement))
+                last_end = end
+        return selected
+
+    # =========================
+    # REESCRITA
+    # =========================
+    def rewrite(self, text: str, entities: Optional[Sequence] = None):
+        """
+        Aplica as regras e retorna (texto, entidades). As entidades (offset e
+        length em unidades UTF-16, como no Telegram) são deslocadas para o
+        texto novo; as que cobrem um trecho reescrito passam a cobrir o
+        substituto, e as que ficam vazias são descartadas.
+        """
+        matches = self._select(text)
+        if not matches:
+            if not entities:
+                return text, entities
+            entities = [self._rewrite_entity_url(entity) for entity in entities]
+            return text, [entity for entity in entities if entity is not None]
+
+        pieces, edits = [], []  # edits: (início, fim, novo comprimento) em UTF-16
+        position = utf16_position = 0
+        for start, end, replacement in matches:
+            pieces.append(text[position:start])
+            pieces.append(replacement)
+            utf16_start = utf16_position + _utf16_len(text[position:start])
+            utf16_end = utf16_start + _utf16_len(text[start:end])
+            edits.append((utf16_start, utf16_end, _utf16_len(replacement)))
+            position, utf16_position = end, utf16_end
+        pieces.append(text[position:])
+
+        return "".join(pieces), (
+            self._remap_entities(entities, edits) if entities else entities
+        )
+
+    def _rewrite_entity_url(self, entity):
+        """
+        Links ocultos (text_link) também passam pelas regras. Se o resultado
+        não for mais uma URL (link removido), a entidade é descartada.
+        """
+        url = getattr(entity, "url", None)
+        if not url:
+            return entity
+        new_url, _ = self.rewrite(url)
+        if new_url == url:
+            return entity
+        if not _URL_SCHEME.match(new_url):
+            return None
+        entity = copy.copy(entity)
+        entity.url = new_url
+        return entity
+
+    def _remap_entities(self, entities: Sequence, edits) -> List:
+        starts = [start for start, _, _ in edits]
+        shifts = [0]  # Deslocamento acumulado antes de cada edição
+        for start, end, length in edits:
+            shifts.append(shifts[-1] + length - (end - start))
+
+        def remap(offset: int, is_end: bool) -> Tuple[int, bool]:
+            k = bisect.bisect_left(starts, offset)  # Edições que começam antes
+            if k and edits[k - 1][1] > offset:
+                start, _, length = edits[k - 1]
+                return start + shifts[k - 1] + (length if is_end else 0), True
+            return offset + shifts[k], False
+
+        result = []
+        for entity in entities:
+            end = entity.offset + entity.length
+            new_start, cut_start = remap(entity.offset, False)
+            new_end, cut_end = remap(end, True)
+            if new_end <= new_start:
+                continue
+            touched = (
+                cut_start
+                or cut_end
+                or bisect.bisect_left(starts, end)
+                > bisect.bisect_left(starts, entity.offset)
+            )
+            entity_type = getattr(getattr(entity, "type", None), "name", "")
+            if touched and entity_type in _DETECTED_ENTITY_TYPES:
+                continue
+            entity = self._rewrite_entity_url(entity)
+            if entity is None:
+                continue
+            entity = copy.copy(entity)
+            entity.offset, entity.length = new_start, new_end - new_start
+            result.append(entity)
+        return result
+
+
+def compile_rules(rules: Iterable) -> Optional[TextRewriter]:
+    """TextRewriter das regras, ou None quando não há regras."""
+    rewriter = TextRewriter(rules)
+    return rewriter if rewriter else None
@@ -0,0 +1,305 @@
+import contextvars
+import heapq
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from app.config.config import settings
+
+SERVICE_NAME = "telegram-automation-api"
+SCOPE_NAME = "app.forwarding"
+
+# OTLP: SPAN_KIND_INTERNAL e códigos de status
+SPAN_KIND_INTERNAL = 1
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+class Span:
+    """Um estágio cronometrado de um trace (ex: cache.select, send)."""
+
+    __slots__ = (
+        "trace",
+        "span_id",
+        "parent_id",
+        "name",
+        "attributes",
+        "start_ns",
+        "end_ns",
+        "status",
+        "error",
+    )
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = STATUS_OK
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns or time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+
+class Trace:
+    """
+    Conjunto de spans de uma mensagem; exportado quando o span raiz termina.
+    Spans de tasks filhas que terminam depois disso são descartados: o trace
+    já exportado não muda mais.
+    """
+
+    __slots__ = ("trace_id", "spans", "root", "closed")
+
+    def __init__(self):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.spans: List[Span] = []
+        self.root: Optional[Span] = None
+        self.closed = False
+
+
+class _NoopSpan:
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Cronometra um estágio. Sem trace ativo no contexto, inicia um novo trace
+    com este span como raiz (se a mensagem cair na amostragem).
+    """
+    if not settings.TRACING_ENABLED:
+        yield _NOOP_SPAN
+        return
+
+    parent = _current_span.get()
+    if parent is _NOOP_SPAN or (parent is not None and parent.trace.closed):
+        # Trace fora da amostragem, ou já exportado
+        if parent is not _NOOP_SPAN:
+            tracer.late_dropped += 1
+        yield _NOOP_SPAN
+        return
+    if parent is None and random.random() >= settings.TRACE_SAMPLE_RATE:
+        token = _current_span.set(_NOOP_SPAN)
+        try:
+            yield _NOOP_SPAN
+        finally:
+            _current_span.reset(token)
+        return
+
+    trace = parent.trace if parent is not None else Trace()
+    current = Span(trace, name, parent.span_id if parent else None, attributes)
+    trace.spans.append(current)
+    if parent is None:
+        trace.root = current
+
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = STATUS_ERROR
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+        if parent is None:
+            tracer.finish(trace)
+        elif trace.closed:
+            tracer.late_dropped += 1
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current_span.get()
+    return current.trace.trace_id if isinstance(current, Span) else None
+
+
+# =========================
+# EXPORTAÇÃO (OTLP JSON)
+# =========================
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(trace: Trace, item: Span) -> Dict[str, Any]:
+    data = {
+        "traceId": trace.trace_id,
+        "spanId": item.span_id,
+        "name": item.name,
+        "kind": SPAN_KIND_INTERNAL,
+        "startTimeUnixNano": str(item.start_ns),
+        "endTimeUnixNano": str(item.end_ns),
+        "attributes": [
+            {"key": key, "value": _otlp_value(value)}
+            for key, value in item.attributes.items()
+            if value is not None
+        ],
+        "status": {"code": item.status},
+    }
+    if item.parent_id:
+        data["parentSpanId"] = item.parent_id
+    if item.error:
+        data["status"]["message"] = item.error
+    return data
+
+
+def to_otlp(trace: Trace) -> Dict[str, Any]:
+    """Converte um trace para o formato ExportTraceServiceRequest do OTLP/JSON."""
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        {"key": "service.name", "value": {"stringValue": SERVICE_NAME}}
+                    ]
+                },
+                "scopeSpans": [
+                    {
+                        "scope": {"name": SCOPE_NAME},
+                        "spans": [_otlp_span(trace, item) for item in trace.spans],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+class _RawQueueHandler(logging.handlers.QueueHandler):
+    """Enfileira o trace sem formatar: a serialização fica na thread do listener."""
+
+    def prepare(self, record):
+        return record
+
+
+class _OTLPFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(to_otlp(record.msg), separators=(",", ":"))
+
+
+class Tracer:
+    """Exporta traces concluídos e mantém em memória os mais lentos."""
+
+    def __init__(self, keep: int):
+        self.keep = keep
+        self._slowest: List = []  # min-heap de (duração, seq, trace)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        self._file_handler: Optional[logging.Handler] = None
+        self._logger = logging.getLogger("app.tracing.export")
+        self._logger.propagate = False
+        self.exported = 0
+        self.late_dropped = 0
+
+    def _ensure_exporter(self):
+        if self._listener is not None:
+            return
+        with self._lock:
+            if self._listener is not None:
+                return
+            file_handler = logging.handlers.RotatingFileHandler(
+                settings.TRACE_FILE,
+                maxBytes=settings.TRACE_FILE_MAX_BYTES,
+                backupCount=settings.TRACE_FILE_BACKUP_COUNT,
+                encoding="utf-8",
+                delay=True,
+            )
+            file_handler.setFormatter(_OTLPFormatter())
+            trace_queue: queue.SimpleQueue = queue.SimpleQueue()
+            self._logger.addHandler(_RawQueueHandler(trace_queue))
+            self._logger.setLevel(logging.INFO)
+            self._listener = logging.handlers.QueueListener(trace_queue, file_handler)
+            self._listener.start()
+            self._file_handler = file_handler
+
+    def finish(self, trace: Trace):
+        # Exporta só o que já terminou; o que ainda roda em outras tasks fica
+        # de fora (e é descartado ao terminar)
+        trace.closed = True
+        trace.spans = [item for item in trace.spans if item.end_ns is not None]
+        self._ensure_exporter()
+        self._logger.info(trace)
+        self.exported += 1
+
+        duration_ms = trace.root.duration_ms
+        entry = (duration_ms, next(self._seq), trace)
+        with self._lock:
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, entry)
+            elif duration_ms > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def slowest(self, limit: int = 20, name: Optional[str] = None) -> List[Dict]:
+        """Traces mais lentos (do mais lento ao mais rápido) com seus spans."""
+        with self._lock:
+            entries = sorted(self._slowest, key=lambda e: e[0], reverse=True)
+        result = []
+        for duration_ms, _, trace in entries:
+            if name and trace.root.name != name:
+                continue
+            root_start = trace.root.start_ns
+            result.append(
+                {
+                    "trace_id": trace.trace_id,
+                    "name": trace.root.name,
+                    "duration_ms": round(duration_ms, 3),
+                    "attributes": trace.root.attributes,
+                    "spans": [
+                        {
+                            "span_id": item.span_id,
+                            "parent_span_id": item.parent_id,
+                            "name": item.name,
+                            "offset_ms": round((item.start_ns - root_start) / 1e6, 3),
+                            "duration_ms": round(item.duration_ms, 3),
+                            "attributes": item.attributes,
+                            "error": item.error,
+                        }
+                        for item in trace.spans
+                    ],
+                }
+            )
+            if len(result) >= limit:
+                break
+        return result
+
+    def shutdown(self):
+        """Descarrega a fila de exportação (encerramento da aplicação)."""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+            for handler in list(self._logger.handlers):
+                self._logger.removeHandler(handler)
+            self._file_handler.close()
+            self._file_handler = None
+
+
+tracer = Tracer(keep=settings.TRACE_SLOWEST_KEEP)
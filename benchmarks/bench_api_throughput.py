@@ -0,0 +1,171 @@
+"""
+Benchmark de vazão da API sob carga concorrente.
+
+Sobe o app FastAPI em processo (httpx.ASGITransport) sobre um banco SQLite
+temporário, dispara requisições concorrentes contra os endpoints de listagem
+e mede requisições/segundo, latências e o atraso do event loop durante a carga
+(um loop bloqueado por chamadas síncronas ao banco aparece como lag alto).
+
+Uso:
+    python -m benchmarks.bench_api_throughput --concurrency 50 --requests 2000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+_TMP_DIR = tempfile.mkdtemp(prefix="bench_api_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{Path(_TMP_DIR) / 'bench.db'}")
+
+import httpx  # noqa: E402
+
+from app.models.database import (  # noqa: E402
+    AutomationModel,
+    Chat,
+    Log,
+    SessionLocal,
+    UserSession,
+    create_tables,
+    dispose_engines,
+)
+
+ENDPOINTS = ["/api/automations/", "/api/sessions/", "/api/logs?limit=100"]
+
+
+def seed(sessions: int, automations: int, channels: int, logs: int):
+    """Popula o banco com sessões, automações (origens/destinos) e logs."""
+    create_tables()
+    with SessionLocal() as db:
+        user_sessions = [
+            UserSession(session_file=f"{i}.session", phone_number=f"+55{i:09d}")
+            for i in range(sessions)
+        ]
+        db.add_all(user_sessions)
+        chats = [Chat(chat_id=f"-100{i:010d}") for i in range(channels * 2)]
+        db.add_all(chats)
+        db.flush()
+        for i in range(automations):
+            automation = AutomationModel(
+                name=f"automation-{i}",
+                session_id=user_sessions[i % sessions].id,
+            )
+            automation.source_channels = chats[:channels]
+            automation.destination_channels = chats[channels:]
+            db.add(automation)
+        db.bulk_save_objects(
+            [
+                Log(
+                    timestamp=datetime.utcnow(),
+                    level="INFO",
+                    message=f"log {i}",
+                    source="bench",
+                )
+                for i in range(logs)
+            ]
+        )
+        db.commit()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def measure_loop_lag(stop: asyncio.Event, samples: list, interval=0.01):
+    """Mede o quanto o event loop atrasa para acordar um sleep curto."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - start - interval)
+
+
+async def run(concurrency: int, total_requests: int):
+    from app.api.main import app
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    transport = httpx.ASGITransport(app=app)
+    latencies = {endpoint: [] for endpoint in ENDPOINTS}
+    errors = 0
+    counter = iter(range(total_requests))
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                endpoint = ENDPOINTS[i % len(ENDPOINTS)]
+                start = time.perf_counter()
+                response = await client.get(endpoint)
+                latencies[endpoint].append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        stop = asyncio.Event()
+        lag_samples: list = []
+        lag_task = asyncio.create_task(measure_loop_lag(stop, lag_samples))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await lag_task
+
+    await dispose_engines()
+
+    report = {
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total_requests / elapsed, 1),
+        "loop_lag_ms": {
+            "p50": round(percentile(lag_samples, 50) * 1000, 2),
+            "p99": round(percentile(lag_samples, 99) * 1000, 2),
+            "max": round(max(lag_samples) * 1000, 2),
+        },
+        "endpoints": {
+            endpoint: {
+                "count": len(values),
+                "mean_ms": round(statistics.mean(values) * 1000, 2),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+            }
+            for endpoint, values in latencies.items()
+            if values
+        },
+    }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--automations", type=int, default=200)
+    parser.add_argument("--channels", type=int, default=5)
+    parser.add_argument("--logs", type=int, default=10000)
+    parser.add_argument("--output", help="Salva o relatório em JSON")
+    args = parser.parse_args(argv)
+
+    seed(args.sessions, args.automations, args.channels, args.logs)
+    report = asyncio.run(run(args.concurrency, args.requests))
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+Benchmark da listagem de automações.
+
+Popula um banco SQLite temporário com N automações, cada uma com origens e
+destinos (padrão: 5000 automações x 50 canais) e compara:
+
+- joinedload: a consulta original, com JOIN de origens, destinos e sessão
+  (produto cartesiano origens x destinos por automação)
+- selectinload: get_automations, com origens e destinos em consultas IN
+- page: list_automations_page, a listagem usada pela rota (sem objetos ORM),
+  completa, paginada por cursor e com projeção de campos
+
+Uso:
+    python -m benchmarks.bench_automation_listing --automations 5000 --channels 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_TMP_DIR = tempfile.mkdtemp(prefix="bench_listing_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{Path(_TMP_DIR) / 'bench.db'}")
+
+from sqlalchemy import insert, select  # noqa: E402
+from sqlalchemy.orm import joinedload  # noqa: E402
+
+from app.models.database import (  # noqa: E402
+    AsyncSessionLocal,
+    AutomationModel,
+    Chat,
+    UserSession,
+    automation_destinations,
+    automation_sources,
+    create_tables,
+    dispose_engines,
+    engine,
+)
+from app.schemas.automation import Automation as AutomationSchema  # noqa: E402
+from app.utils.data_base_utils.automation import (  # noqa: E402
+    get_automations,
+    list_automations_page,
+)
+
+
+def seed(automations: int, channels: int, chat_pool: int):
+    """Insere automações e associações em lote pelo engine síncrono."""
+    create_tables()
+    rng = random.Random(42)
+    sources_per_automation = channels // 2
+    destinations_per_automation = channels - sources_per_automation
+    with engine.begin() as conn:
+        conn.execute(
+            insert(UserSession),
+            [
+                {"session_file": f"{i}.session", "phone_number": f"+55{i:09d}"}
+                for i in range(10)
+            ],
+        )
+        chat_ids = [f"-100{i:010d}" for i in range(chat_pool)]
+        conn.execute(insert(Chat), [{"chat_id": chat_id} for chat_id in chat_ids])
+        conn.execute(
+            insert(AutomationModel),
+            [
+                {"name": f"automation-{i}", "session_id": i % 10 + 1}
+                for i in range(automations)
+            ],
+        )
+        sources, destinations = [], []
+        for automation_id in range(1, automations + 1):
+            picked = rng.sample(chat_ids, channels)
+            sources += [
+                {"automation_id": automation_id, "chat_id": chat_id}
+                for chat_id in picked[:sources_per_automation]
+            ]
+            destinations += [
+                {"automation_id": automation_id, "chat_id": chat_id}
+                for chat_id in picked[-destinations_per_automation:]
+            ]
+        conn.execute(insert(automation_sources), sources)
+        conn.execute(insert(automation_destinations), destinations)
+
+
+async def legacy_joinedload():
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(AutomationModel).options(
+                joinedload(AutomationModel.source_channels),
+                joinedload(AutomationModel.destination_channels),
+                joinedload(AutomationModel.session),
+            )
+        )
+        automations = result.unique().scalars().all()
+        return [AutomationSchema.from_orm(a).model_dump() for a in automations]
+
+
+async def orm_selectinload():
+    async with AsyncSessionLocal() as db:
+        automations = await get_automations(db)
+        return [AutomationSchema.from_orm(a).model_dump() for a in automations]
+
+
+async def page_full():
+    async with AsyncSessionLocal() as db:
+        return await list_automations_page(db)
+
+
+async def page_keyset(after_id: int):
+    async with AsyncSessionLocal() as db:
+        return await list_automations_page(db, after_id=after_id, limit=100)
+
+
+async def page_projected():
+    async with AsyncSessionLocal() as db:
+        return await list_automations_page(
+            db, limit=100, fields=["id", "name", "is_active"]
+        )
+
+
+CASES = {
+    "joinedload_full": legacy_joinedload,
+    "selectinload_full": orm_selectinload,
+    "page_full": page_full,
+    "page_keyset_100": page_keyset,
+    "page_projected_100": page_projected,
+}
+
+
+async def run(repeat: int, skip_legacy: bool, automations: int):
+    # Página no meio da tabela, para o cursor ter custo realista
+    cases = dict(CASES, page_keyset_100=lambda: page_keyset(automations // 2))
+    report = {}
+    for name, case in cases.items():
+        if skip_legacy and name == "joinedload_full":
+            continue
+        timings = []
+        rows = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            rows = len(await case())
+            timings.append(time.perf_counter() - start)
+        report[name] = {
+            "rows": rows,
+            "mean_ms": round(statistics.mean(timings) * 1000, 2),
+            "min_ms": round(min(timings) * 1000, 2),
+        }
+        print(f"{name}: {report[name]}", file=sys.stderr)
+    await dispose_engines()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--automations", type=int, default=5000)
+    parser.add_argument("--channels", type=int, default=50)
+    parser.add_argument("--chat-pool", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--skip-legacy", action="store_true", help="Não executa o caso joinedload"
+    )
+    parser.add_argument("--output", help="Salva o relatório em JSON")
+    args = parser.parse_args(argv)
+
+    seed(args.automations, args.channels, max(args.chat_pool, args.channels))
+    report = {
+        "automations": args.automations,
+        "channels_per_automation": args.channels,
+        "cases": asyncio.run(run(args.repeat, args.skip_legacy, args.automations)),
+    }
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
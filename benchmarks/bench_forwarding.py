@@ -0,0 +1,329 @@
+"""
+Benchmark de vazão do pipeline de encaminhamento.
+
+Executa o pipeline real (process_and_forward_message, VerifyAndValidateMessage,
+TelegramService e o cache de mídia no banco) contra um Client falso em
+processo. O cliente falso simula latência de envio, FloodWait e expiração de
+file_reference; o tráfego sintético mistura texto, mídia e álbuns.
+
+Relata mensagens/segundo, latência p50/p99 por mensagem e consultas ao banco
+por mensagem, e salva o relatório em JSON (com o commit atual) para comparar
+regressões entre versões.
+
+Uso:
+    python -m benchmarks.bench_forwarding --messages 2000 --concurrency 20 \
+        --destinations 3 --send-latency-ms 20 --floodwait-rate 0.01 \
+        --expire-rate 0.05 --output forwarding.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+_TMP_DIR = tempfile.mkdtemp(prefix="bench_forwarding_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{Path(_TMP_DIR) / 'bench.db'}")
+os.environ.setdefault("TRACE_FILE", str(Path(_TMP_DIR) / "spans.jsonl"))
+
+from pyrogram.errors import FileReferenceExpired, FloodWait  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.models.database import (  # noqa: E402
+    async_read_engine,
+    async_write_engine,
+    create_tables_async,
+    dispose_engines,
+)
+from app.utils import metrics  # noqa: E402
+from app.utils.telegram.verify_and_validate_mensage import (  # noqa: E402
+    process_and_forward_message,
+)
+
+MEDIA_TYPES = ["photo", "video", "audio", "document", "voice", "animation"]
+SEND_METHODS = {
+    "send_message",
+    "send_photo",
+    "send_video",
+    "send_audio",
+    "send_document",
+    "send_voice",
+    "send_video_note",
+    "send_sticker",
+    "send_animation",
+}
+SOURCE_CHAT_ID = -1001000000001
+
+
+class FakeMedia:
+    def __init__(self, file_unique_id: str, generation: int = 0):
+        self.file_unique_id = file_unique_id
+        self.file_id = f"{file_unique_id}:{generation}"
+        self.file_size = 1024
+        self.mime_type = "application/octet-stream"
+
+
+class FakeChat:
+    def __init__(self, chat_id: int):
+        self.id = chat_id
+
+
+class FakeMessage:
+    """Mensagem com os atributos lidos pelo pipeline."""
+
+    def __init__(self, message_id: int, text=None, media_type=None, media=None):
+        self.id = message_id
+        self.chat = FakeChat(SOURCE_CHAT_ID)
+        self.date = datetime.now()
+        self.text = text
+        self.caption = "legenda" if media else None
+        self.service = False
+        self.media_group_id = None
+        for name in MEDIA_TYPES + ["video_note", "sticker"]:
+            setattr(self, name, None)
+        if media_type:
+            setattr(self, media_type, media)
+
+
+class FakeClient:
+    """
+    Client falso: cada envio dorme a latência configurada e pode falhar com
+    FloodWait ou FILE_REFERENCE_EXPIRED, conforme as taxas informadas.
+    """
+
+    def __init__(self, rng, latency_ms, jitter_ms, floodwait_rate, expire_rate):
+        self.rng = rng
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.floodwait_rate = floodwait_rate
+        self.expire_rate = expire_rate
+        self.messages = {}  # message_id -> FakeMessage (para get_messages)
+        self.calls = {"send": 0, "floodwait": 0, "expired": 0, "get_messages": 0}
+
+    async def _rpc(self):
+        delay = self.latency + self.rng.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def __getattr__(self, name):
+        if name not in SEND_METHODS:
+            raise AttributeError(name)
+
+        async def send(chat_id, text=None, caption=None, **kwargs):
+            self.calls["send"] += 1
+            await self._rpc()
+            if self.rng.random() < self.floodwait_rate:
+                self.calls["floodwait"] += 1
+                raise FloodWait(value=self.rng.randint(1, 30))
+            if name != "send_message" and self.rng.random() < self.expire_rate:
+                self.calls["expired"] += 1
+                raise FileReferenceExpired()
+
+        return send
+
+    async def get_messages(self, chat_id, message_id):
+        self.calls["get_messages"] += 1
+        await self._rpc()
+        original = self.messages[int(message_id)]
+        for media_type in MEDIA_TYPES:
+            media = getattr(original, media_type)
+            if media:
+                refreshed = FakeMessage(original.id, media_type=media_type)
+                setattr(
+                    refreshed,
+                    media_type,
+                    FakeMedia(media.file_unique_id, self.rng.randint(1, 1 << 30)),
+                )
+                return refreshed
+        return original
+
+
+def generate_traffic(rng, total: int, mix: dict, media_pool: int):
+    """
+    Gera mensagens sintéticas. Mídias vêm de um pool limitado de arquivos,
+    então arquivos repetidos exercitam o caminho de cache do pipeline.
+    """
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    ids = itertools.count(1)
+    messages = []
+    while len(messages) < total:
+        kind = rng.choices(kinds, weights)[0]
+        if kind == "text":
+            message_id = next(ids)
+            messages.append(FakeMessage(message_id, text=f"mensagem {message_id}"))
+            continue
+        group_size = rng.randint(2, 10) if kind == "album" else 1
+        group_id = str(next(ids)) if kind == "album" else None
+        for _ in range(min(group_size, total - len(messages))):
+            media_type = rng.choice(MEDIA_TYPES)
+            media = FakeMedia(f"file-{rng.randrange(media_pool)}")
+            message = FakeMessage(next(ids), media_type=media_type, media=media)
+            message.media_group_id = group_id
+            messages.append(message)
+    return messages
+
+
+class QueryCounter:
+    """Conta as instruções executadas nos engines assíncronos."""
+
+    def __init__(self):
+        self.count = 0
+        self._engines = {async_write_engine.sync_engine, async_read_engine.sync_engine}
+        for engine in self._engines:
+            event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    await create_tables_async()
+
+    client = FakeClient(
+        rng,
+        args.send_latency_ms,
+        args.send_jitter_ms,
+        args.floodwait_rate,
+        args.expire_rate,
+    )
+    mix = {
+        "text": args.text_ratio,
+        "media": args.media_ratio,
+        "album": args.album_ratio,
+    }
+    messages = generate_traffic(rng, args.messages, mix, args.media_pool)
+    client.messages = {message.id: message for message in messages}
+    destinations = [-1002000000000 - i for i in range(args.destinations)]
+
+    class Automation:
+        id = 1
+        caption = args.caption
+
+    queries = QueryCounter()
+    latencies = []
+    errors = 0
+    pending = iter(messages)
+
+    async def worker():
+        nonlocal errors
+        for message in pending:
+            start = time.perf_counter()
+            try:
+                await process_and_forward_message(
+                    client, message, destinations, Automation
+                )
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    await dispose_engines()
+
+    total = len(messages)
+    return {
+        "commit": current_commit(),
+        "config": {
+            "messages": total,
+            "concurrency": args.concurrency,
+            "destinations": args.destinations,
+            "send_latency_ms": args.send_latency_ms,
+            "send_jitter_ms": args.send_jitter_ms,
+            "floodwait_rate": args.floodwait_rate,
+            "expire_rate": args.expire_rate,
+            "media_pool": args.media_pool,
+            "mix": mix,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "messages_per_s": round(total / elapsed, 1),
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 2),
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(max(latencies) * 1000, 2),
+        },
+        "db_queries": queries.count,
+        "db_queries_per_message": round(queries.count / total, 2),
+        "pipeline_errors": errors,
+        "client_calls": client.calls,
+        "deliveries": {
+            "forwarded": metrics.messages_forwarded.total(),
+            "failed": metrics.messages_failed.total(),
+            "skipped": metrics.messages_skipped.total(),
+        },
+        "media_cache": {
+            "hit": metrics.media_cache_requests.value(("hit",)),
+            "miss": metrics.media_cache_requests.value(("miss",)),
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--destinations", type=int, default=3)
+    parser.add_argument("--send-latency-ms", type=float, default=20)
+    parser.add_argument("--send-jitter-ms", type=float, default=10)
+    parser.add_argument("--floodwait-rate", type=float, default=0.0)
+    parser.add_argument("--expire-rate", type=float, default=0.0)
+    parser.add_argument("--text-ratio", type=float, default=0.5)
+    parser.add_argument("--media-ratio", type=float, default=0.4)
+    parser.add_argument("--album-ratio", type=float, default=0.1)
+    parser.add_argument(
+        "--media-pool",
+        type=int,
+        default=500,
+        help="Arquivos distintos; valores menores aumentam os acertos de cache",
+    )
+    parser.add_argument("--caption", default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--log-level",
+        default="CRITICAL",
+        help="Nível dos logs do pipeline durante a medição",
+    )
+    parser.add_argument("--output", help="Salva o relatório em JSON")
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(args.log_level.upper())
+    report = asyncio.run(run(args))
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,11 @@
+import os
+import tempfile
+
+# Os testes não tocam nos dados da aplicação: banco, traces, fila em disco e
+# cache de mídia ficam num diretório temporário. Precisa vir antes de
+# qualquer import de app (settings lê o ambiente na importação)
+_TMP_DIR = tempfile.mkdtemp(prefix="telegram-automation-tests-")
+os.environ["DATA_DIR"] = _TMP_DIR
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP_DIR}/tests.db"
+os.environ["ADMIN_TOKEN"] = "test-token"
+os.environ["TRACING_ENABLED"] = "False"
@@ -0,0 +1,155 @@
+import unittest
+from unittest import mock
+
+import httpx
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from app.api.main import app
+from app.api.routes import automations as automation_routes
+from app.models.database import (
+    AsyncSessionLocal,
+    AutomationModel,
+    Base,
+    UserSession,
+    dispose_engines,
+    get_async_engines,
+)
+from app.services import automation_handler
+from app.utils.data_base_utils.automation import add_automation
+
+
+def item(name, session_id=1):
+    return {
+        "name": name,
+        "session_id": session_id,
+        "source_chats": ["-1001"],
+        "destination_chats": ["-1002"],
+    }
+
+
+class BulkAutomationsTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        async with get_async_engines()[0].begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        async with AsyncSessionLocal() as db:
+            db.add(UserSession(id=1, session_file="a.session", phone_number="+1"))
+            await db.commit()
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        )
+        # Clientes do Telegram: falham para as automações em self.failing
+        self.failing = set()
+        self.started, self.stopped = [], []
+        for name, calls in (
+            ("start_automation_client", self.started),
+            ("stop_automation_client", self.stopped),
+        ):
+            patcher = mock.patch.object(
+                automation_handler, name, self.fake_client_call(calls)
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        await dispose_engines()
+
+    def fake_client_call(self, calls):
+        async def call(automation, *_):
+            calls.append(automation.id)
+            if automation.id in self.failing:
+                raise RuntimeError("cliente indisponível")
+
+        return call
+
+    async def bulk(self, action, **body):
+        response = await self.client.post(
+            "/api/automations/bulk", json={"action": action, **body}
+        )
+        self.assertEqual(response.status_code, 200, response.text)
+        return response.json()
+
+    async def create(self, *names, active=False):
+        ids = []
+        async with AsyncSessionLocal() as db:
+            for name in names:
+                ids.append(await add_automation(db, **item(name)))
+            if active:
+                for automation in (await db.execute(select(AutomationModel))).scalars():
+                    automation.is_active = True
+            await db.commit()
+        return ids
+
+    async def states(self):
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(AutomationModel.name, AutomationModel.is_active).order_by(
+                    AutomationModel.id
+                )
+            )
+            return result.all()
+
+    async def test_create_reports_each_item(self):
+        real_add = automation_routes.add_automation
+
+        async def add(db, **fields):
+            automation_id = await real_add(db, **fields)
+            if fields["name"] == "falha":
+                raise IntegrityError("INSERT", {}, Exception("restrição violada"))
+            return automation_id
+
+        with mock.patch.object(automation_routes, "add_automation", add):
+            body = await self.bulk(
+                "create",
+                automations=[
+                    item("a"),
+                    item("sem sessão", 99),
+                    item("falha"),
+                    item("b"),
+                ],
+            )
+
+        self.assertEqual((body["succeeded"], body["failed"]), (2, 2))
+        self.assertEqual(
+            [(r["index"], r["ok"]) for r in body["results"]],
+            [(0, True), (1, False), (2, False), (3, True)],
+        )
+        self.assertIn("99", body["results"][1]["error"])
+        # O savepoint desfaz só o item que falhou
+        self.assertEqual(await self.states(), [("a", False), ("b", False)])
+
+    async def test_start_rolls_back_failed_clients(self):
+        first, second = await self.create("a", "b")
+        self.failing = {second}
+        body = await self.bulk("start", automation_ids=[first, second, 999])
+
+        self.assertEqual(
+            [(r["automation_id"], r["ok"]) for r in body["results"]],
+            [(first, True), (second, False), (999, False)],
+        )
+        self.assertEqual(body["results"][2]["error"], "Automação não encontrada")
+        self.assertIn(second, self.stopped)
+        self.assertEqual(await self.states(), [("a", True), ("b", False)])
+
+    async def test_delete_keeps_automations_that_did_not_stop(self):
+        first, second = await self.create("a", "b", active=True)
+        self.failing = {second}
+        body = await self.bulk("delete", automation_ids=[first, second])
+
+        self.assertEqual([r["ok"] for r in body["results"]], [True, False])
+        self.assertEqual(self.stopped, [first, second])
+        self.assertEqual(await self.states(), [("b", True)])
+
+    async def test_stop_reports_client_errors(self):
+        first, second = await self.create("a", "b", active=True)
+        self.failing = {first}
+        body = await self.bulk("stop", automation_ids=[first, second])
+
+        self.assertEqual([r["ok"] for r in body["results"]], [False, True])
+        self.assertEqual(body["results"][0]["error"], "cliente indisponível")
+
+
+if __name__ == "__main__":
+    unittest.main()
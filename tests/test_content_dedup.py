@@ -0,0 +1,95 @@
+import asyncio
+import unittest
+
+from app.utils.telegram.content_dedup import (
+    ContentIndex,
+    RollingBloomFilter,
+    content_key,
+)
+
+
+class ContentKeyTest(unittest.TestCase):
+    def test_media_uses_file_unique_id(self):
+        key = content_key({"file_unique_id": "AQAD"}, "legenda")
+        self.assertEqual(key, "media:AQAD")
+
+    def test_text_is_normalized(self):
+        self.assertEqual(
+            content_key(None, "Promoção  HOJE\n"), content_key(None, "promoção hoje")
+        )
+        self.assertEqual(content_key(None, "ｆｕｌｌ"), content_key(None, "full"))
+        self.assertNotEqual(content_key(None, "a b"), content_key(None, "ab"))
+
+    def test_nothing_to_compare(self):
+        self.assertIsNone(content_key(None, None))
+        self.assertIsNone(content_key({"file_unique_id": None}, "   "))
+
+
+class RollingBloomFilterTest(unittest.TestCase):
+    def test_no_false_negatives_and_bounded_false_positives(self):
+        bloom = RollingBloomFilter(capacity=2000, error_rate=0.01, ttl=3600)
+        for i in range(2000):
+            bloom.add(f"in-{i}")
+        self.assertTrue(all(f"in-{i}" in bloom for i in range(2000)))
+        false_positives = sum(f"out-{i}" in bloom for i in range(20000))
+        self.assertLess(false_positives / 20000, 0.02)
+
+    def test_rotation_keeps_one_previous_generation(self):
+        bloom = RollingBloomFilter(capacity=2, error_rate=0.001, ttl=3600)
+        bloom.add("a")
+        bloom.add("b")
+        bloom.add("c")  # Geração cheia: "a" e "b" vão para a anterior
+        self.assertIn("a", bloom)
+        bloom.add("d")
+        bloom.add("e")  # Segunda rotação: a geração de "a" sai
+        self.assertNotIn("a", bloom)
+        self.assertIn("c", bloom)
+
+    def test_memory_is_fixed(self):
+        bloom = RollingBloomFilter(capacity=1000, error_rate=0.001, ttl=3600)
+        nbytes = bloom.nbytes
+        for i in range(10000):
+            bloom.add(str(i))
+        self.assertEqual(bloom.nbytes, nbytes)
+
+
+class ContentIndexTest(unittest.IsolatedAsyncioTestCase):
+    def index(self, max_destinations=10):
+        return ContentIndex(100, 0.001, 3600, max_destinations)
+
+    async def test_concurrent_claim_follows_pending_send(self):
+        index = self.index()
+        leading, following = index.claim("k", ["a", "b"])
+        self.assertEqual((list(leading), following), (["a", "b"], {}))
+
+        _, following = index.claim("k", ["a"])
+        index.settle(*leading["a"], True)
+        self.assertTrue(await asyncio.wait_for(following["a"], 1))
+
+    async def test_published_content_is_remembered(self):
+        index = self.index()
+        leading, _ = index.claim("k", ["a"])
+        index.settle(*leading["a"], True)
+        leading, following = index.claim("k", ["a", "b"])
+        self.assertEqual(list(leading), ["b"])
+        self.assertTrue(following["a"].result())
+
+    async def test_failed_send_is_forgotten(self):
+        index = self.index()
+        leading, _ = index.claim("k", ["a"])
+        index.settle(*leading["a"], False)
+        leading, following = index.claim("k", ["a"])
+        self.assertEqual((list(leading), following), (["a"], {}))
+
+    async def test_least_recent_destination_is_evicted(self):
+        index = self.index(max_destinations=2)
+        for dest_id in ("a", "b", "c"):
+            leading, _ = index.claim("k", [dest_id])
+            index.settle(*leading[dest_id], True)
+        self.assertEqual(len(index), 2)
+        leading, _ = index.claim("k", ["a"])
+        self.assertEqual(list(leading), ["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
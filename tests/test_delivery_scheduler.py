@@ -0,0 +1,162 @@
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from sqlalchemy import delete, select
+
+from app.config.config import settings
+from app.models.database import (
+    AsyncSessionLocal,
+    ScheduledDelivery,
+    create_tables_async,
+    dispose_engines,
+)
+from app.services import delivery_scheduler
+from app.services.delivery_scheduler import DeliveryScheduler
+
+CHAT_ID = "-100"
+
+
+def message(message_id):
+    return SimpleNamespace(id=message_id, chat=SimpleNamespace(id=int(CHAT_ID)))
+
+
+async def stored_ids():
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(ScheduledDelivery.message_id).order_by(ScheduledDelivery.message_id)
+        )
+        return list(result.scalars())
+
+
+class DeliverySchedulerTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Os passos do laço (_flush, _load, _dispatch_due) são chamados direto,
+    sem a task do agendador, para que cada etapa seja verificada.
+    """
+
+    async def asyncSetUp(self):
+        for name, value in (
+            ("SCHEDULER_FLUSH_INTERVAL_SECONDS", 0),
+            ("SCHEDULER_RETRY_SECONDS", 30),
+        ):
+            patcher = mock.patch.object(settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        await create_tables_async()
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(ScheduledDelivery))
+            await db.commit()
+
+        self.result = True
+        self.dispatched = []
+        self.stored_at_dispatch = []
+
+    async def asyncTearDown(self):
+        await dispose_engines()
+
+    async def dispatch(self, automation_id, chat_id, message_ids):
+        self.stored_at_dispatch.append(await stored_ids())
+        if isinstance(self.result, Exception):
+            raise self.result
+        if self.result:
+            self.dispatched.append((automation_id, chat_id, message_ids))
+        return self.result
+
+    def scheduler(self):
+        scheduler = DeliveryScheduler(self.dispatch, lambda: [1])
+        scheduler.ensure_running = lambda: None  # Sem a task: passos manuais
+        return scheduler
+
+    async def test_schedule_survives_restart(self):
+        scheduler = self.scheduler()
+        due_at = time.time() + 3600
+        scheduler.schedule(1, message(10), due_at)
+        await scheduler._flush()
+        self.assertEqual(await stored_ids(), [10])
+
+        restarted = self.scheduler()
+        await restarted._load()
+        self.assertEqual(len(restarted._heap), 1)
+        self.assertAlmostEqual(restarted._heap[0][0], due_at, places=3)
+        self.assertEqual(restarted._heap[0][1:], (1, CHAT_ID, 10))
+
+    async def test_rows_are_deleted_before_dispatch(self):
+        scheduler = self.scheduler()
+        scheduler.schedule(1, message(10), time.time() - 1)
+        scheduler.schedule(1, message(11), time.time() - 1)
+        await scheduler._flush()
+        await scheduler._load()
+        await scheduler._dispatch_due()
+
+        self.assertEqual(self.dispatched, [(1, CHAT_ID, [10, 11])])
+        self.assertEqual(self.stored_at_dispatch, [[]])
+        self.assertEqual(await stored_ids(), [])
+
+    async def test_unsaved_entries_are_not_written_after_dispatch(self):
+        scheduler = self.scheduler()
+        await scheduler._load()
+        scheduler.schedule(1, message(10), time.time() - 1)
+        await scheduler._dispatch_due()
+        await scheduler._flush()
+
+        self.assertEqual(self.dispatched, [(1, CHAT_ID, [10])])
+        self.assertEqual(scheduler._buffer, [])
+        self.assertEqual(await stored_ids(), [])
+
+    async def test_failed_delete_blocks_dispatch(self):
+        scheduler = self.scheduler()
+        scheduler.schedule(1, message(10), time.time() - 1)
+        await scheduler._flush()
+        await scheduler._load()
+        with mock.patch.object(
+            delivery_scheduler,
+            "delete_scheduled_deliveries",
+            side_effect=RuntimeError("database is locked"),
+        ):
+            await scheduler._dispatch_due()
+
+        self.assertEqual(self.stored_at_dispatch, [])
+        self.assertEqual(await stored_ids(), [10])
+        # Tenta de novo depois do intervalo, sem duplicar a entrega
+        self.assertEqual(len(scheduler._heap), 1)
+        self.assertGreater(scheduler._heap[0][0], time.time() + 20)
+
+    async def test_refused_dispatch_pauses_and_saves_again(self):
+        self.result = False
+        scheduler = self.scheduler()
+        scheduler.schedule(1, message(10), time.time() - 1)
+        await scheduler._flush()
+        await scheduler._load()
+        await scheduler._dispatch_due()
+
+        self.assertIn(1, scheduler._paused)
+        self.assertEqual(scheduler._heap, [])
+        await scheduler._flush()
+        self.assertEqual(await stored_ids(), [10])
+
+        # Retomada: a entrega volta do banco e sai uma vez só
+        self.result = True
+        scheduler.reload()
+        await scheduler._load()
+        await scheduler._dispatch_due()
+        self.assertEqual(self.dispatched, [(1, CHAT_ID, [10])])
+        self.assertEqual(await stored_ids(), [])
+
+    async def test_dispatch_error_retries_later(self):
+        self.result = RuntimeError("sem cliente")
+        scheduler = self.scheduler()
+        scheduler.schedule(1, message(10), time.time() - 1)
+        await scheduler._flush()
+        await scheduler._load()
+        await scheduler._dispatch_due()
+
+        self.assertEqual(len(scheduler._heap), 1)
+        self.assertGreater(scheduler._heap[0][0], time.time() + 20)
+        await scheduler._flush()
+        self.assertEqual(await stored_ids(), [10])
+
+
+if __name__ == "__main__":
+    unittest.main()
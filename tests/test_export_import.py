@@ -0,0 +1,179 @@
+import csv
+import io
+import json
+import unittest
+from unittest import mock
+
+import httpx
+from sqlalchemy import select
+
+from app.api.main import app
+from app.config.config import settings
+from app.models.database import (
+    AsyncSessionLocal,
+    Base,
+    CollectedMedia,
+    Log,
+    UserSession,
+    dispose_engines,
+    get_async_engines,
+)
+from app.utils.data_base_utils.automation import add_automation
+
+HEADERS = {"X-Admin-Token": settings.ADMIN_TOKEN}
+
+
+def ndjson(*items):
+    return "".join(json.dumps(item) + "\n" for item in items)
+
+
+def records(text, fmt):
+    """Registros exportados sem o id, que o banco de destino gera de novo."""
+    rows = (
+        csv.DictReader(io.StringIO(text))
+        if fmt == "csv"
+        else map(json.loads, text.splitlines())
+    )
+    return [{k: v for k, v in row.items() if k != "id"} for row in rows]
+
+
+class ExportImportTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        async with get_async_engines()[0].begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        async with AsyncSessionLocal() as db:
+            db.add(UserSession(id=1, session_file="a.session", phone_number="+1"))
+            db.add(
+                CollectedMedia(
+                    id=1, file_unique_id="local", file_id="f1", media_type="photo"
+                )
+            )
+            db.add(Log(id=1, level="INFO", message="local"))
+            await add_automation(
+                db,
+                name="origem",
+                session_id=1,
+                source_chats=["-1001"],
+                destination_chats=["-1002", "-1003"],
+                rewrite_rules=[
+                    {
+                        "kind": "regex",
+                        "pattern": r"(\d+)",
+                        "replacement": r"#\1",
+                        "ignore_case": False,
+                    }
+                ],
+            )
+            await db.commit()
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        )
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        await dispose_engines()
+
+    async def export(self, dataset, fmt="ndjson"):
+        response = await self.client.get(
+            f"/api/export/{dataset}", params={"format": fmt}, headers=HEADERS
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.text
+
+    async def import_(self, dataset, body, fmt="ndjson"):
+        return await self.client.post(
+            f"/api/import/{dataset}",
+            params={"format": fmt},
+            headers=HEADERS,
+            content=body,
+        )
+
+    async def media_rows(self):
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(CollectedMedia.id, CollectedMedia.file_unique_id).order_by(
+                    CollectedMedia.id
+                )
+            )
+            return result.all()
+
+    async def test_requires_admin_token(self):
+        response = await self.client.get("/api/export/media")
+        self.assertEqual(response.status_code, 401)
+
+    async def test_media_import_drops_exported_ids(self):
+        body = ndjson(
+            {"id": 1, "file_unique_id": "new", "file_id": "f2", "media_type": "photo"}
+        )
+        for _ in range(2):
+            response = await self.import_("media", body)
+            self.assertEqual(response.status_code, 200)
+        # id 1 já existia: a mídia importada recebe outro; a repetida é ignorada
+        self.assertEqual(await self.media_rows(), [(1, "local"), (2, "new")])
+
+    async def test_logs_are_appended(self):
+        body = ndjson(
+            {"id": 1, "level": "INFO", "message": "importado", "timestamp": None}
+        )
+        response = await self.import_("logs", body)
+        self.assertEqual(response.json()["rows"], 1)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(Log.id, Log.message).order_by(Log.id))
+            self.assertEqual(result.all(), [(1, "local"), (2, "importado")])
+
+    async def test_media_round_trip(self):
+        for fmt in ("ndjson", "csv"):
+            exported = await self.export("media", fmt)
+            async with get_async_engines()[0].begin() as conn:
+                await conn.execute(CollectedMedia.__table__.delete())
+            response = await self.import_("media", exported, fmt)
+            self.assertEqual(response.status_code, 200, response.text)
+            reimported = await self.export("media", fmt)
+            self.assertEqual(records(reimported, fmt), records(exported, fmt))
+
+    async def test_automation_round_trip_skips_existing(self):
+        for fmt in ("ndjson", "csv"):
+            exported = await self.export("automations", fmt)
+            # Mesma sessão e nome: reimportar não duplica
+            response = await self.import_("automations", exported, fmt)
+            self.assertEqual(response.json()["skipped"], 1)
+
+        record = json.loads(await self.export("automations"))
+        record["name"] = "copia"
+        orphan = dict(record, name="sem sessão", session_id=99)
+        response = await self.import_("automations", ndjson(record, orphan))
+        self.assertEqual(response.json(), {"rows": 2, "batches": 1, "skipped": 1})
+
+        exported = [
+            json.loads(line) for line in (await self.export("automations")).splitlines()
+        ]
+        self.assertEqual([item["name"] for item in exported], ["origem", "copia"])
+        copy = exported[1]
+        self.assertFalse(copy["is_active"])
+        self.assertNotEqual(copy["id"], record["id"])
+        for field in ("source_chats", "destination_chats", "rewrite_rules"):
+            self.assertEqual(copy[field], record[field])
+
+    async def test_conflict_returns_409_and_keeps_earlier_batches(self):
+        body = ndjson(
+            {"file_unique_id": "ok", "file_id": "f3", "media_type": "photo"},
+            {"file_unique_id": "sem_file_id", "media_type": "photo"},
+        )
+        with mock.patch.object(settings, "IMPORT_BATCH_SIZE", 1):
+            response = await self.import_("media", body)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["detail"]["imported"]["rows"], 1)
+        self.assertEqual(await self.media_rows(), [(1, "local"), (2, "ok")])
+
+    async def test_invalid_record_returns_400(self):
+        response = await self.import_("logs", ndjson({"timestamp": "ontem"}))
+        self.assertEqual(response.status_code, 400)
+
+    async def test_unknown_dataset(self):
+        response = await self.client.get("/api/export/users", headers=HEADERS)
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
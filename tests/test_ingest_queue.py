@@ -0,0 +1,97 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+from app.services.ingest_queue import IngestQueue
+
+
+def message(message_id, chat_id=-100):
+    return SimpleNamespace(id=message_id, chat=SimpleNamespace(id=chat_id))
+
+
+class IngestQueueTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.spill_dir = Path(tempfile.mkdtemp())
+        self.fetched = []
+
+    async def fetch_message(self, chat_id, message_id):
+        self.fetched.append(message_id)
+        return message(message_id, chat_id)
+
+    async def drain(self, queue):
+        ids = []
+        while len(queue):
+            item, _ = await queue.get(self.fetch_message)
+            ids.append(item.id)
+        return ids
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            IngestQueue(1, maxsize=2, overflow="discard")
+
+    async def test_drop_oldest_keeps_newest(self):
+        queue = IngestQueue(1, maxsize=2, overflow="drop_oldest")
+        for i in range(1, 5):
+            await queue.put(message(i))
+        self.assertEqual(len(queue), 2)
+        self.assertEqual(await self.drain(queue), [3, 4])
+
+    async def test_spill_preserves_order(self):
+        queue = IngestQueue(1, maxsize=2, overflow="spill", spill_dir=self.spill_dir)
+        for i in range(1, 5):
+            await queue.put(message(i))
+        self.assertEqual((queue.memory_depth, queue.disk_depth), (2, 2))
+
+        item, _ = await queue.get(self.fetch_message)
+        self.assertEqual(item.id, 1)
+        # Com excedente no disco, a nova mensagem vai atrás dele, não para a memória
+        await queue.put(message(5))
+        self.assertEqual((queue.memory_depth, queue.disk_depth), (1, 3))
+
+        self.assertEqual(await self.drain(queue), [2, 3, 4, 5])
+        self.assertEqual(self.fetched, [3, 4, 5])
+        self.assertFalse((self.spill_dir / "automation_1.jsonl").exists())
+
+    async def test_spill_discards_previous_run(self):
+        leftover = self.spill_dir / "automation_1.jsonl"
+        leftover.write_text('{"chat_id": -100, "message_id": 9, "enqueued_at": 0}\n')
+        queue = IngestQueue(1, maxsize=2, overflow="spill", spill_dir=self.spill_dir)
+        self.assertEqual(len(queue), 0)
+        self.assertFalse(leftover.exists())
+
+    async def test_block_waits_for_space(self):
+        queue = IngestQueue(1, maxsize=1, overflow="block")
+        await queue.put(message(1))
+        blocked = asyncio.create_task(queue.put(message(2)))
+        await asyncio.sleep(0.01)
+        self.assertFalse(blocked.done())
+
+        item, _ = await queue.get(self.fetch_message)
+        await asyncio.wait_for(blocked, 1)
+        self.assertEqual(item.id, 1)
+        self.assertEqual(await self.drain(queue), [2])
+
+    async def test_close_releases_blocked_put(self):
+        queue = IngestQueue(1, maxsize=1, overflow="block")
+        await queue.put(message(1))
+        blocked = asyncio.create_task(queue.put(message(2)))
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(await queue.close(), 1)
+        await asyncio.wait_for(blocked, 1)
+        self.assertEqual(len(queue), 0)
+        await queue.put(message(3))  # Fila fechada: ignorada
+        self.assertEqual(len(queue), 0)
+
+    async def test_close_discards_spill(self):
+        queue = IngestQueue(1, maxsize=1, overflow="spill", spill_dir=self.spill_dir)
+        for i in range(1, 4):
+            await queue.put(message(i))
+        self.assertEqual(await queue.close(), 3)
+        self.assertFalse((self.spill_dir / "automation_1.jsonl").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
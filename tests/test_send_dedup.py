@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from app.config.config import settings
+from app.utils.telegram.send_dedup import SendWindow, window_for
+from app.utils.telegram.verify_and_validate_mensage import VerifyAndValidateMessage
+
+
+def message(message_id=1, chat_id=-100):
+    return SimpleNamespace(id=message_id, chat=SimpleNamespace(id=chat_id))
+
+
+class SendWindowTest(unittest.IsolatedAsyncioTestCase):
+    async def test_second_claim_follows_the_first(self):
+        window = SendWindow(ttl=60)
+        leading, following = window.claim(message(), ["a", "b", "a"], None)
+        self.assertEqual((list(leading), following), (["a", "b"], {}))
+
+        leading2, following2 = window.claim(message(), ["a", "c"], None)
+        self.assertEqual(list(leading2), ["c"])
+        self.assertIs(following2["a"], leading["a"][1])
+
+        window.settle(*leading["a"], True)
+        self.assertTrue(await following2["a"])
+
+    async def test_failure_leaves_the_window(self):
+        window = SendWindow(ttl=60)
+        leading, _ = window.claim(message(), ["a"], None)
+        window.settle(*leading["a"], False)
+        leading, following = window.claim(message(), ["a"], None)
+        self.assertEqual((list(leading), following), (["a"], {}))
+
+    async def test_delivery_expires_after_ttl(self):
+        window = SendWindow(ttl=0)
+        leading, _ = window.claim(message(), ["a"], None)
+        window.settle(*leading["a"], True)
+        leading, _ = window.claim(message(), ["a"], None)
+        self.assertEqual(list(leading), ["a"])
+        self.assertEqual(len(window), 1)
+
+    async def test_caption_is_part_of_the_key(self):
+        window = SendWindow(ttl=60)
+        window.claim(message(), ["a"], "legenda 1")
+        leading, following = window.claim(message(), ["a"], "legenda 2")
+        self.assertEqual((list(leading), following), (["a"], {}))
+
+    async def test_window_per_session(self):
+        class Client:
+            pass
+
+        primary, pool = Client(), Client()
+        pool.primary = primary
+        self.assertIs(window_for(pool), window_for(primary))
+        with mock.patch.object(settings, "SEND_DEDUP_WINDOW_SECONDS", 0):
+            self.assertIsNone(window_for(primary))
+
+
+class AwaitDuplicatesTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.validator = VerifyAndValidateMessage(None, None)
+
+    async def test_retries_only_failed_deliveries(self):
+        loop = asyncio.get_running_loop()
+        delivered, failed = loop.create_future(), loop.create_future()
+        delivered.set_result(True)
+        failed.set_result(False)
+        retry = await self.validator.await_duplicates({"a": delivered, "b": failed})
+        self.assertEqual(retry, ["b"])
+
+    async def test_gives_up_after_the_wait_limit(self):
+        loop = asyncio.get_running_loop()
+        stuck, done = loop.create_future(), loop.create_future()
+        done.set_result(True)
+        with mock.patch.object(settings, "SEND_DEDUP_WAIT_SECONDS", 0.05):
+            retry = await asyncio.wait_for(
+                self.validator.await_duplicates({"a": stuck, "b": done}), 1
+            )
+        self.assertEqual(retry, ["a"])
+        # A espera expirou, mas o envio da outra automação continua
+        self.assertFalse(stuck.cancelled())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import re
+import unittest
+from types import SimpleNamespace
+
+from app.utils.text_rewriter import TextRewriter, check_regex_rule, compile_rules
+
+
+def rule(pattern, replacement="", kind="literal", ignore_case=False):
+    return SimpleNamespace(
+        kind=kind, pattern=pattern, replacement=replacement, ignore_case=ignore_case
+    )
+
+
+def entity(offset, length, type_name="BOLD", url=None):
+    return SimpleNamespace(
+        offset=offset, length=length, type=SimpleNamespace(name=type_name), url=url
+    )
+
+
+def spans(entities):
+    return [(e.type.name, e.offset, e.length) for e in entities]
+
+
+class RewriteTextTest(unittest.TestCase):
+    def test_no_rules(self):
+        self.assertIsNone(compile_rules([]))
+
+    def test_literals(self):
+        rewriter = TextRewriter(
+            [rule("foo", "bar"), rule("SPAM", "", ignore_case=True), rule("Baz", "x")]
+        )
+        text, _ = rewriter.rewrite("foo spam Spam baz Baz")
+        self.assertEqual(text, "bar   baz x")
+
+    def test_overlap_prefers_earliest_then_longest(self):
+        rewriter = TextRewriter([rule("ab", "1"), rule("abc", "2"), rule("bcd", "3")])
+        self.assertEqual(rewriter.rewrite("abcd")[0], "2d")
+
+    def test_combined_regex_backreferences(self):
+        rules = [
+            rule(r"(\d+)-(\d+)", r"\2-\1", kind="regex"),
+            rule(r"@(?P<user>\w+)", r"<\g<user>>", kind="regex"),
+            rule(r"x+", r"[\g<0>]", kind="regex"),
+            rule(r"(a)(b)", r"\g<2>\g<1>", kind="regex"),
+        ]
+        rewriter = TextRewriter(rules)
+        self.assertIsNotNone(rewriter._combined)
+        text = "12-34 @ana xx ab"
+        # Mesmo resultado de aplicar cada regra separadamente
+        expected = text
+        for item in rules:
+            expected = re.sub(item.pattern, item.replacement, expected)
+        self.assertEqual(rewriter.rewrite(text)[0], expected)
+        self.assertEqual(expected, "34-12 <ana> [xx] ba")
+
+    def test_invalid_group_references(self):
+        check_regex_rule(r"(a)(?P<b>b)", r"\1\2\g<b>\g<0>")
+        with self.assertRaises(re.error):
+            check_regex_rule(r"(a)", r"\2")
+        with self.assertRaises(re.error):
+            check_regex_rule(r"(a)", r"\g<nome>")
+
+
+class RemapEntitiesTest(unittest.TestCase):
+    def test_entities_shift_with_the_text(self):
+        rewriter = TextRewriter([rule("grande", "g")])
+        text, entities = rewriter.rewrite(
+            "um grande texto", [entity(0, 2), entity(10, 5, "ITALIC")]
+        )
+        self.assertEqual(text, "um g texto")
+        self.assertEqual(spans(entities), [("BOLD", 0, 2), ("ITALIC", 5, 5)])
+
+    def test_entity_over_rewritten_text_covers_the_replacement(self):
+        rewriter = TextRewriter([rule("velho", "novíssimo")])
+        text, entities = rewriter.rewrite("o velho", [entity(2, 5)])
+        self.assertEqual(text, "o novíssimo")
+        self.assertEqual(spans(entities), [("BOLD", 2, 9)])
+
+    def test_removed_text_drops_empty_entities(self):
+        rewriter = TextRewriter([rule("apagar ", "")])
+        text, entities = rewriter.rewrite("apagar isto", [entity(0, 6), entity(7, 4)])
+        self.assertEqual(text, "isto")
+        self.assertEqual(spans(entities), [("BOLD", 0, 4)])
+
+    def test_detected_entities_are_dropped_when_rewritten(self):
+        rewriter = TextRewriter([rule("t.me/canal", "nosso canal")])
+        text, entities = rewriter.rewrite(
+            "veja t.me/canal", [entity(5, 10, "URL"), entity(0, 4, "MENTION")]
+        )
+        self.assertEqual(text, "veja nosso canal")
+        self.assertEqual(spans(entities), [("MENTION", 0, 4)])
+
+    def test_offsets_are_utf16(self):
+        # O emoji ocupa 2 unidades UTF-16
+        rewriter = TextRewriter([rule("a", "xyz")])
+        text, entities = rewriter.rewrite("😀 a b", [entity(5, 1)])
+        self.assertEqual(text, "😀 xyz b")
+        self.assertEqual(spans(entities), [("BOLD", 7, 1)])
+
+    def test_text_link_urls_are_rewritten(self):
+        rewriter = TextRewriter(
+            [rule("https://old.example", "https://new.example"), rule("t.me/x", "")]
+        )
+        _, entities = rewriter.rewrite(
+            "link e outro",
+            [
+                entity(0, 4, "TEXT_LINK", "https://old.example/a"),
+                entity(7, 5, "TEXT_LINK", "t.me/x"),
+            ],
+        )
+        self.assertEqual(spans(entities), [("TEXT_LINK", 0, 4)])
+        self.assertEqual(entities[0].url, "https://new.example/a")
+
+
+if __name__ == "__main__":
+    unittest.main()